@@ -9,8 +9,58 @@ classes (:py:mod:`abc`) representing different algorithm capabilities.
 
 from abc import ABCMeta, abstractmethod
 import inspect
+import threading
+import weakref
 
-__all__ = ["Algorithm", "Recommender", "Predictor", "CandidateSelector"]
+import numpy as np
+import pandas as pd
+
+__all__ = ["Algorithm", "Recommender", "Predictor", "CandidateSelector", "map_positions"]
+
+_vocab_maps = {}
+_vocab_lock = threading.Lock()
+
+
+def map_positions(index, vocab, positions):
+    """
+    Map item positions in one item vocabulary to positions in another index, for the
+    position-space prediction protocol (see :meth:`Predictor.predict_positions`).  The
+    mapping between two index objects is computed once and cached for as long as both
+    objects are alive, so callers should reuse the same vocabulary object across calls.
+
+    Args:
+        index(pandas.Index): the index to map positions into (e.g. a model's item index).
+        vocab(pandas.Index): the vocabulary the positions refer to.
+        positions(numpy.ndarray): positions in ``vocab``; negative positions are unknown.
+
+    Returns:
+        numpy.ndarray: the corresponding positions in ``index`` (-1 for missing items).
+    """
+    positions = np.asarray(positions, dtype=np.intp)
+    if index is vocab:
+        return positions
+
+    key = (id(index), id(vocab))
+    with _vocab_lock:
+        entry = _vocab_maps.get(key)
+    if entry is None or entry[0]() is not index or entry[1]() is not vocab:
+        mapping = index.get_indexer(vocab)
+
+        def drop(ref, key=key):
+            with _vocab_lock:
+                cur = _vocab_maps.get(key)
+                if cur is not None and (cur[0] is ref or cur[1] is ref):
+                    del _vocab_maps[key]
+
+        entry = (weakref.ref(index, drop), weakref.ref(vocab, drop), mapping)
+        with _vocab_lock:
+            _vocab_maps[key] = entry
+
+    mapping = entry[2]
+    result = np.full(len(positions), -1, dtype=mapping.dtype)
+    good = positions >= 0
+    result[good] = mapping[positions[good]]
+    return result
 
 
 class Algorithm(metaclass=ABCMeta):
@@ -90,6 +140,10 @@ class Predictor(Algorithm, metaclass=ABCMeta):
         Compute predictions for user-item pairs.  This method is designed to be compatible with the
         general SciKit paradigm; applications typically want to use :py:meth:`predict_for_user`.
 
+        If the predictor has a vectorized ``predict_pairs(users, items)`` method (such as
+        :meth:`.MFPredictor.predict_pairs`), it is used to predict all pairs at once;
+        otherwise, pairs are grouped by user and passed to :py:meth:`predict_for_user`.
+
         Args:
             pairs(pandas.DataFrame): The user-item pairs, as ``user`` and ``item`` columns.
             ratings(pandas.DataFrame): user-item rating data to replace memorized data.
@@ -100,6 +154,10 @@ class Predictor(Algorithm, metaclass=ABCMeta):
         if ratings is not None:
             raise NotImplementedError()
 
+        if hasattr(self, "predict_pairs"):
+            preds = self.predict_pairs(pairs["user"].values, pairs["item"].values)
+            return pd.Series(preds, index=pairs.index, name="prediction")
+
         def upred(df):
             (user,) = df["user"].unique()
             items = df["item"]
@@ -130,6 +188,41 @@ class Predictor(Algorithm, metaclass=ABCMeta):
         """
         raise NotImplementedError()
 
+    def predict_positions(self, user, vocab, positions, ratings=None):
+        """
+        Compute predictions for a user and items identified by their positions in an item
+        vocabulary, such as a candidate selector's item index.  This lower-level protocol
+        lets selectors, predictors, and rankers be composed without converting between item
+        IDs and positions at every layer; predictors map vocabulary positions to their own
+        item positions with :func:`map_positions`.
+
+        The default implementation looks up the item IDs and calls
+        :meth:`predict_for_user`; predictors can override it to work on positions directly.
+
+        Args:
+            user: the user ID
+            vocab (pandas.Index):
+                the item vocabulary.  Reuse the same object across calls, so that mappings
+                to the predictor's item index can be cached.
+            positions (numpy.ndarray):
+                the positions in ``vocab`` of the items to predict; negative positions
+                denote unknown items.
+            ratings (pandas.Series): the user's ratings, as in :meth:`predict_for_user`.
+
+        Returns:
+            numpy.ndarray: the scores, with NaN for items that cannot be scored.
+        """
+        positions = np.asarray(positions)
+        known = positions >= 0
+        scores = np.full(len(positions), np.nan)
+        if np.any(known):
+            items = vocab[positions[known]]
+            preds = self.predict_for_user(user, items, ratings)
+            if not preds.index.equals(items):
+                preds = preds.reindex(items)
+            scores[known] = preds.values
+        return scores
+
 
 class Recommender(Algorithm, metaclass=ABCMeta):
     """
@@ -189,6 +282,34 @@ class CandidateSelector(Algorithm, metaclass=ABCMeta):
     of this interface.
     """
 
+    def item_vocabulary(self):
+        """
+        Get the item vocabulary that :meth:`candidate_positions` refers to, if the selector
+        supports the position-space protocol (see :meth:`Predictor.predict_positions`).
+
+        Returns:
+            pandas.Index: the item vocabulary, or ``None`` if positions are not supported.
+        """
+        return None
+
+    def candidate_positions(self, user, ratings=None):
+        """
+        Select candidates for the user, as positions in :meth:`item_vocabulary`.  The
+        default implementation looks up the positions of :meth:`candidates`.
+
+        Args:
+            user: The user key or ID.
+            ratings: Ratings or items to use instead of the memorized ones, as in
+                :meth:`candidates`.
+
+        Returns:
+            numpy.ndarray: the candidate positions.
+        """
+        vocab = self.item_vocabulary()
+        if vocab is None:
+            raise NotImplementedError("selector does not support item positions")
+        return vocab.get_indexer(self.candidates(user, ratings))
+
     @abstractmethod
     def candidates(self, user, ratings=None):
         """
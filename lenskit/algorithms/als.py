@@ -1,22 +1,144 @@
+import os
+import sys
 import logging
+import threading
+import queue
 from collections import namedtuple
+from pathlib import Path
 
 import numpy as np
+import numba
 from numba import njit, prange
+from threadpoolctl import threadpool_limits
 
+import binpickle
+import seedbank
 from csr import CSR
 from seedbank import numpy_rng
 
 from .bias import Bias
-from .mf_common import MFPredictor
+from .mf_common import MFPredictor, _train_bias_row_lu, _train_matrix_lu
 from ..data import sparse_ratings
 from .. import util
 from ..math.solve import _dposv
+from ..sharing import persist_shm, SHM_AVAILABLE
+from ..util.log import log_queue
+from ..util.parallel import LKContext, _initialize_worker
 
 _logger = logging.getLogger(__name__)
 
 PartialModel = namedtuple("PartialModel", ["users", "items", "user_matrix", "item_matrix"])
 
+Checkpoint = namedtuple("Checkpoint", ["epoch", "model", "rng_state"])
+Checkpoint.__doc__ = """
+A training checkpoint saved by :class:`BiasedMF` or :class:`ImplicitMF`.
+
+Attributes:
+    epoch(int): the last completed epoch (0-based).
+    model(PartialModel): the user and item indexes and feature matrices.
+    rng_state(dict): the state of the model's random number generator.
+"""
+
+
+def load_checkpoint(path):
+    """
+    Load an ALS training checkpoint.  Checkpoints are stored with :mod:`binpickle` in
+    mappable format; the feature matrices are copied into memory so training can resume.
+
+    Args:
+        path(str or pathlib.Path): the checkpoint file.
+
+    Returns:
+        Checkpoint: the loaded checkpoint.
+    """
+    ckpt = binpickle.load(path)
+    model = ckpt.model
+    model = model._replace(
+        user_matrix=np.array(model.user_matrix), item_matrix=np.array(model.item_matrix)
+    )
+    return ckpt._replace(model=model)
+
+
+class _Checkpointer:
+    """
+    Write training checkpoints on a background thread.  The feature matrices are copied
+    before the write is started, so training can proceed while the checkpoint is saved;
+    at most one write is in flight at a time.  Checkpoints are first written to a temporary
+    file and then renamed into place, so a crash mid-write leaves the previous checkpoint
+    intact.
+    """
+
+    def __init__(self, path, interval):
+        self.path = Path(path)
+        self.interval = interval
+        self._thread = None
+        self._error = None
+
+    def epoch_finished(self, epoch, model, rng):
+        if (epoch + 1) % self.interval:
+            return
+
+        self.wait()
+        model = model._replace(
+            user_matrix=model.user_matrix.copy(), item_matrix=model.item_matrix.copy()
+        )
+        ckpt = Checkpoint(epoch, model, rng.bit_generator.state)
+        self._thread = threading.Thread(
+            target=self._write, args=(ckpt,), name="als-checkpoint", daemon=False
+        )
+        self._thread.start()
+
+    def wait(self):
+        "Wait for an in-progress checkpoint to finish writing."
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            err = self._error
+            self._error = None
+            raise err
+
+    def _write(self, ckpt):
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        try:
+            binpickle.dump(ckpt, tmp, mappable=True)
+            os.replace(tmp, self.path)
+            _logger.debug("saved checkpoint for epoch %d to %s", ckpt.epoch, self.path)
+        except Exception as e:
+            _logger.error("failed to write checkpoint %s: %s", self.path, e)
+            self._error = e
+
+
+def _load_resume(path, rng):
+    """
+    Load a checkpoint to resume training, restoring the random state saved with it.  This
+    is done before the model is initialized, so training continues with the random state
+    it had when the checkpoint was written.
+
+    Returns:
+        Checkpoint: the checkpoint.
+    """
+    ckpt = load_checkpoint(path)
+    rng.bit_generator.state = ckpt.rng_state
+    return ckpt
+
+
+def _resume_model(path, ckpt, current, features):
+    """
+    Check a checkpoint against the model structure built from the training data.
+
+    Returns:
+        tuple: the resumed model and the first epoch to train.
+    """
+    model = ckpt.model
+    if not model.users.equals(current.users) or not model.items.equals(current.items):
+        raise ValueError("checkpoint {} does not match the training data".format(path))
+    if model.user_matrix.shape[1] != features:
+        raise ValueError("checkpoint {} has the wrong feature count".format(path))
+
+    _logger.info("resuming training from %s after epoch %d", path, ckpt.epoch)
+    return model, ckpt.epoch + 1
+
 
 @njit
 def _inplace_axpy(a, x, y):
@@ -87,21 +209,57 @@ def _train_matrix_cd(mat: CSR, this: np.ndarray, other: np.ndarray, reg: float):
     return np.sqrt(frob)
 
 
+@njit
+def _cg_solve_explicit(X, y, w, reg, epochs):
+    """
+    Use preconditioned conjugate gradient to solve the explicit-feedback system
+    :math:`(X^T X + \\lambda I) w = X^T y`, starting from the current value of ``w``.
+    The system matrix is never formed; each iteration costs :math:`O(nk)`.
+    """
+    nf = X.shape[1]
+    # Jacobi preconditioner: the diagonal of X'X + λI
+    Ad = np.full(nf, reg)
+    for i in range(X.shape[0]):
+        for k in range(nf):
+            Ad[k] += X[i, k] * X[i, k]
+
+    iM = np.reciprocal(Ad)
+
+    # compute residuals
+    r = X.T @ (y - X @ w)
+    _inplace_axpy(-reg, w, r)
+
+    z = iM * r
+    p = z
+
+    for i in range(epochs):
+        gam = np.dot(r, z)
+        if gam <= 0:
+            break
+        Ap = X.T @ (X @ p)
+        _inplace_axpy(reg, p, Ap)
+        al = gam / np.dot(p, Ap)
+        _inplace_axpy(al, p, w)
+        _inplace_axpy(-al, Ap, r)
+        z = iM * r
+        bet = np.dot(r, z) / gam
+        p = z + bet * p
+
+
 @njit(parallel=True, nogil=True)
-def _train_matrix_lu(mat, this: np.ndarray, other: np.ndarray, reg: float):
+def _train_matrix_cg(mat, this: np.ndarray, other: np.ndarray, reg: float, iters: int):
     """
-    One half of an explicit ALS training round using LU-decomposition on the normal
-    matrices to solve the least squares problem.
+    One half of an explicit ALS training round using conjugate gradient, warm-started
+    from the current feature values.
 
     Args:
         mat: the :math:`m \\times n` matrix of ratings
         this: the :math:`m \\times k` matrix to train
         other: the :math:`n \\times k` matrix of sample features
         reg: the regularization term
+        iters: the number of CG iterations per row
     """
     nr = mat.nrows
-    nf = other.shape[1]
-    regI = np.identity(nf) * reg
     assert mat.ncols == other.shape[0]
     frob = 0.0
 
@@ -112,43 +270,16 @@ def _train_matrix_lu(mat, this: np.ndarray, other: np.ndarray, reg: float):
 
         vals = mat.row_vs(i)
         M = other[cols, :]
-        MMT = M.T @ M
-        # assert MMT.shape[0] == ctx.n_features
-        # assert MMT.shape[1] == ctx.n_features
-        A = MMT + regI * len(cols)
-        V = M.T @ vals
-        # and solve
-        _dposv(A, V, True)
-        delta = this[i, :] - V
+        w = this[i, :].copy()
+        _cg_solve_explicit(M, vals, w, reg * len(cols), iters)
+
+        delta = this[i, :] - w
         frob += np.dot(delta, delta)
-        this[i, :] = V
+        this[i, :] = w
 
     return np.sqrt(frob)
 
 
-@njit(nogil=True)
-def _train_bias_row_lu(items, ratings, other, reg):
-    """
-    Args:
-        items(np.ndarray[i64]): the item IDs the user has rated
-        ratings(np.ndarray): the user's (normalized) ratings for those items
-        other(np.ndarray): the item-feature matrix
-        reg(float): the regularization term
-    Returns:
-        np.ndarray: the user-feature vector (equivalent to V in the current LU code)
-    """
-    M = other[items, :]
-    nf = other.shape[1]
-    regI = np.identity(nf) * reg
-    MMT = M.T @ M
-    A = MMT + regI * len(items)
-
-    V = M.T @ ratings
-    _dposv(A, V, True)
-
-    return V
-
-
 @njit
 def _cg_a_mult(OtOr, X, y, v):
     """
@@ -243,6 +374,59 @@ def _train_implicit_cg(mat, this: np.ndarray, other: np.ndarray, reg: float):
     return np.sqrt(frob)
 
 
+@njit
+def _bcd_solve(OtOr, X, y, w, block):
+    """
+    Use block coordinate descent to minimize the implicit-feedback loss for a single row,
+    updating ``w`` in place.  Each block of ``block`` features is solved exactly with the
+    others held fixed; the predictions :math:`s = Xw` are maintained incrementally so a block
+    costs :math:`O(|R_u| b^2 + kb + b^3)`.  The parameter OtOr = X'X + λ, for all items.
+    """
+    nf = X.shape[1]
+    s = X @ w
+    c = y + 1.0
+
+    for bs in range(0, nf, block):
+        be = min(bs + block, nf)
+        XB = np.ascontiguousarray(X[:, bs:be])
+        # gradient of the block: X_B'(y+1) - X_B'(y∘s) - (OtOr w)_B
+        g = XB.T @ (c - y * s)
+        g -= np.ascontiguousarray(OtOr[bs:be, :]) @ w
+        A = OtOr[bs:be, bs:be] + (XB.T * y) @ XB
+        _dposv(A, g, True)
+        w[bs:be] += g
+        s += XB @ g
+
+
+@njit(parallel=True, nogil=True)
+def _train_implicit_bcd(mat, this: np.ndarray, other: np.ndarray, reg: float, block: int):
+    "One half of an implicit ALS training round with block coordinate descent."
+    nr = mat.nrows
+    nc = other.shape[0]
+
+    assert mat.ncols == nc
+
+    OtOr = _implicit_otor(other, reg)
+
+    frob = 0.0
+
+    for i in prange(nr):
+        cols = mat.row_cs(i)
+        if len(cols) == 0:
+            continue
+
+        rates = mat.row_vs(i)
+        M = other[cols, :]
+        w = this[i, :].copy()
+        _bcd_solve(OtOr, M, rates, w, block)
+
+        delta = this[i, :] - w
+        frob += np.dot(delta, delta)
+        this[i, :] = w
+
+    return np.sqrt(frob)
+
+
 @njit(parallel=True, nogil=True)
 def _train_implicit_lu(mat, this: np.ndarray, other: np.ndarray, reg: float):
     "One half of an implicit ALS training round."
@@ -308,6 +492,178 @@ def _train_implicit_row_lu(items, ratings, other, otOr):
     return y
 
 
+def _train_epochs(train, current, uctx, ictx, regs, epochs, *, kargs=(), n_jobs=None, timer=None):
+    """
+    Run ALS training epochs, either in-process or across worker processes.
+
+    Args:
+        train: the training kernel for a half-epoch.
+        current(PartialModel): the current model, updated in-place.
+        uctx(CSR): the user-item matrix for training user features.
+        ictx(CSR): the item-user matrix for training item features.
+        regs(tuple): the user and item regularization terms.
+        epochs: the epochs to train (possibly wrapped in a progress bar).
+        kargs(tuple): additional arguments for the training kernel.
+        n_jobs(int): the number of worker processes to use.
+        timer: the training timer, for log messages.
+
+    Returns:
+        iterable: an iterable of ``(epoch, model, du, di)`` tuples.
+    """
+    if n_jobs is not None and n_jobs > 1:
+        if SHM_AVAILABLE:
+            return _train_epochs_mp(train, current, uctx, ictx, regs, epochs, kargs, n_jobs, timer)
+        else:
+            _logger.warning("shared memory unavailable, training in-process")
+
+    return _train_epochs_local(train, current, uctx, ictx, regs, epochs, kargs, timer)
+
+
+def _train_epochs_local(train, current, uctx, ictx, regs, epochs, kargs, timer):
+    ureg, ireg = regs
+    for epoch in epochs:
+        du = train(uctx, current.user_matrix, current.item_matrix, ureg, *kargs)
+        _logger.debug("[%s] finished user epoch %d", timer, epoch)
+        di = train(ictx, current.item_matrix, current.user_matrix, ireg, *kargs)
+        _logger.debug("[%s] finished item epoch %d", timer, epoch)
+        yield epoch, current, du, di
+
+
+def _row_shards(mat, n):
+    "Split the rows of a matrix into ``n`` contiguous shards with similar numbers of entries."
+    targets = np.linspace(0, mat.nnz, n + 1)[1:-1]
+    cuts = np.searchsorted(mat.rowptrs, targets)
+    bounds = np.concatenate([[0], cuts, [mat.nrows]])
+    bounds = np.maximum.accumulate(bounds)
+    return [(int(bounds[i]), int(bounds[i + 1])) for i in range(n)]
+
+
+def _train_epochs_mp(train, current, uctx, ictx, regs, epochs, kargs, n_jobs, timer):
+    """
+    Train ALS across worker processes.  The rating matrices and feature matrices are placed
+    in shared memory, and each worker trains a shard of the user rows and a shard of the item
+    rows; since the training kernels only write the rows they are solving for, the workers
+    can update the shared matrices in place.  Workers synchronize with a barrier between the
+    user and item half-epochs, and wait for the parent to start each epoch so the parent can
+    snapshot the model between epochs.
+    """
+    ctx = LKContext.INSTANCE
+    n_epochs = len(epochs)
+    threads = max(numba.config.NUMBA_NUM_THREADS // n_jobs, 1)
+    _logger.info("[%s] training with %d worker processes (%d threads each)", timer, n_jobs, threads)
+
+    key = persist_shm((uctx, ictx, current.user_matrix, current.item_matrix))
+    shared = key.get()
+    umat, imat = shared[2], shared[3]
+
+    ushards = _row_shards(uctx, n_jobs)
+    ishards = _row_shards(ictx, n_jobs)
+    barrier = ctx.Barrier(n_jobs)
+    go = ctx.Semaphore(0)
+    stop = ctx.Event()
+    results = ctx.Queue()
+    seed = seedbank.derive_seed()
+
+    procs = []
+    try:
+        for w in range(n_jobs):
+            args = (
+                key,
+                w,
+                train.__name__,
+                regs,
+                kargs,
+                (ushards[w], ishards[w]),
+                n_epochs,
+                threads,
+                (barrier, go, stop, results),
+                log_queue(),
+                seedbank.derive_seed(w, base=seed),
+            )
+            proc = ctx.Process(target=_mp_worker, args=args, name="als-worker-{}".format(w))
+            proc.start()
+            procs.append(proc)
+
+        for epoch in epochs:
+            for w in range(n_jobs):
+                go.release()
+            deltas = _mp_collect(results, procs)
+            du = np.sqrt(np.sum(np.square([d[0] for d in deltas])))
+            di = np.sqrt(np.sum(np.square([d[1] for d in deltas])))
+            _logger.debug("[%s] workers finished epoch %d", timer, epoch)
+            model = current._replace(user_matrix=umat.copy(), item_matrix=imat.copy())
+            yield epoch, model, du, di
+
+    finally:
+        stop.set()
+        for w in range(n_jobs):
+            go.release()
+        for proc in procs:
+            proc.join(10)
+            if proc.exitcode is None:
+                _logger.warning("worker %s did not exit, terminating", proc.name)
+                proc.terminate()
+                proc.join()
+        del shared, umat, imat
+        key.close()
+
+
+def _mp_collect(results, procs):
+    "Collect one epoch's results from the workers, watching for failures."
+    deltas = []
+    while len(deltas) < len(procs):
+        try:
+            wid, res = results.get(timeout=1)
+        except queue.Empty:
+            for proc in procs:
+                if proc.exitcode is not None and proc.exitcode != 0:
+                    msg = "worker {} failed with code {}".format(proc.name, proc.exitcode)
+                    raise RuntimeError(msg)
+            continue
+        if isinstance(res, Exception):
+            raise ChildProcessError("error in ALS worker {}".format(wid), res)
+        deltas.append(res)
+    return deltas
+
+
+def _mp_worker(key, wid, train, regs, kargs, shards, n_epochs, threads, sync, log_queue, seed):
+    "Entry point for ALS worker processes."
+    _initialize_worker(log_queue, seed)
+    barrier, go, stop, results = sync
+    threadpool_limits(1, "blas")
+    numba.set_num_threads(min(threads, numba.config.NUMBA_NUM_THREADS))
+    train = getattr(sys.modules[__name__], train)
+    try:
+        _mp_worker_epochs(key, wid, train, regs, kargs, shards, n_epochs, sync)
+    except threading.BrokenBarrierError:
+        _logger.debug("worker %d: barrier broken, exiting", wid)
+    except Exception as e:
+        _logger.error("worker %d failed: %s", wid, e)
+        results.put((wid, e))
+        barrier.abort()
+    finally:
+        key.close(False)
+
+
+def _mp_worker_epochs(key, wid, train, regs, kargs, shards, n_epochs, sync):
+    barrier, go, stop, results = sync
+    ureg, ireg = regs
+    (us, ue), (ist, ie) = shards
+    uctx, ictx, umat, imat = key.get()
+    u_rows = uctx.subset_rows(us, ue)
+    i_rows = ictx.subset_rows(ist, ie)
+    _logger.debug("worker %d: training users %d:%d and items %d:%d", wid, us, ue, ist, ie)
+
+    for epoch in range(n_epochs):
+        go.acquire()
+        if stop.is_set():
+            break
+        du = train(u_rows, umat[us:ue, :], imat, ureg, *kargs)
+        barrier.wait()
+        di = train(i_rows, imat[ist:ie, :], umat, ireg, *kargs)
+        results.put((wid, (du, di)))
+
+
 class BiasedMF(MFPredictor):
     """
     Biased matrix factorization trained with alternating least squares :cite:p:`Zhou2008-bj`.  This
@@ -315,7 +671,7 @@ class BiasedMF(MFPredictor):
     least squares approach to compute :math:`P` and :math:`Q` to minimize the regularized squared
     reconstruction error of the ratings matrix.
 
-    It provides two solvers for the optimization step (the `method` parameter):
+    It provides three solvers for the optimization step (the `method` parameter):
 
     ``'cd'`` (the default)
         Coordinate descent :cite:p:`Takacs2011-ix`, adapted for a separately-trained bias model and
@@ -323,6 +679,11 @@ class BiasedMF(MFPredictor):
     ``'lu'``
         A direct implementation of the original ALS :cite:p:`Zhou2008-bj` using LU-decomposition
         to solve for the optimized matrices.
+    ``'cg'``
+        Conjugate gradient with a Jacobi preconditioner, warm-started from the previous
+        iteration's features :cite:p:`Takacs2011-ix`.  Each CG step costs :math:`O(|R_u| k)`
+        instead of the :math:`O(k^3)` of the LU solver, so this is the fastest solver for
+        models with many features.
 
     See the base class :class:`.MFPredictor` for documentation on
     the estimated parameters you can extract from a trained model.
@@ -336,9 +697,21 @@ class BiasedMF(MFPredictor):
         bias(bool or :class:`Bias`): the bias model.  If ``True``, fits a :class:`Bias` with
             damping ``damping``.
         method(str): the solver to use (see above).
+        cg_iters(int): the number of conjugate gradient iterations per row for the ``'cg'``
+            solver.
         rng_spec:
             Random number generator or state (see :func:`seedbank.numpy_rng`).
         progress: a :func:`tqdm.tqdm`-compatible progress bar function
+        checkpoint_path(str or pathlib.Path):
+            if provided, periodically save training checkpoints to this file (see
+            :meth:`resume`).  Checkpoints are written on a background thread.
+        checkpoint_interval(int): the number of epochs between checkpoints.
+        n_jobs(int):
+            the number of worker processes for training.  If ``None`` or 1, training runs
+            in-process with Numba threads; otherwise, the user and item rows are split into
+            shards that are trained by separate worker processes over feature matrices in
+            shared memory.  Each worker gets an even share of ``NUMBA_NUM_THREADS``, and
+            single-threaded BLAS.
     """
 
     timer = None
@@ -352,15 +725,20 @@ class BiasedMF(MFPredictor):
         damping=5,
         bias=True,
         method="cd",
+        cg_iters=3,
         rng_spec=None,
         progress=None,
         save_user_features=True,
+        checkpoint_path=None,
+        checkpoint_interval=1,
+        n_jobs=None,
     ):
         self.features = features
         self.iterations = iterations
         self.regularization = reg
         self.damping = damping
         self.method = method
+        self.cg_iters = cg_iters
         if bias is True:
             self.bias = Bias(damping=damping)
         else:
@@ -368,6 +746,9 @@ class BiasedMF(MFPredictor):
         self.progress = progress if progress is not None else util.no_progress
         self.rng = numpy_rng(rng_spec)
         self.save_user_features = save_user_features
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.n_jobs = n_jobs
 
     def fit(self, ratings, **kwargs):
         """
@@ -375,6 +756,7 @@ class BiasedMF(MFPredictor):
 
         Args:
             ratings: the ratings data frame.
+            resume: a checkpoint file from which to resume training (see :meth:`resume`).
 
         Returns:
             The algorithm (for chaining).
@@ -402,12 +784,13 @@ class BiasedMF(MFPredictor):
         del self.timer
         return self
 
-    def fit_iters(self, ratings, **kwargs):
+    def fit_iters(self, ratings, *, resume=None, **kwargs):
         """
         Run ALS to train a model, returning each iteration as a generator.
 
         Args:
             ratings: the ratings data frame.
+            resume: a checkpoint file from which to resume training (see :meth:`resume`).
 
         Returns:
             The algorithm (for chaining).
@@ -417,14 +800,49 @@ class BiasedMF(MFPredictor):
             _logger.info("[%s] fitting bias model", self.timer)
             self.bias.fit(ratings)
 
-        current, uctx, ictx = self._initial_model(ratings)
+        resumed = _load_resume(resume, self.rng) if resume is not None else None
+        current, uctx, ictx = self._initial_model(ratings, resumed is None)
+        start = 0
+        if resumed is not None:
+            current, start = _resume_model(resume, resumed, current, self.features)
+            self._save_params(current)
 
         _logger.info(
             "[%s] training biased MF model with ALS for %d features", self.timer, self.features
         )
-        for epoch, model in enumerate(self._train_iters(current, uctx, ictx)):
-            self._save_params(model)
-            yield self
+        ckpt = None
+        if self.checkpoint_path is not None:
+            ckpt = _Checkpointer(self.checkpoint_path, self.checkpoint_interval)
+        try:
+            for epoch, model in enumerate(self._train_iters(current, uctx, ictx, start), start):
+                self._save_params(model)
+                if ckpt is not None:
+                    ckpt.epoch_finished(epoch, model, self.rng)
+                yield self
+        finally:
+            if ckpt is not None:
+                ckpt.wait()
+
+    def resume(self, ratings, checkpoint=None):
+        """
+        Resume training from a checkpoint saved by a previous (interrupted) call to
+        :meth:`fit`.  The bias model and rating matrices are rebuilt from ``ratings``,
+        which must be the same data used for the original training run; the feature
+        matrices, epoch counter, and random state are restored from the checkpoint and
+        training continues until ``iterations`` epochs have completed.
+
+        Args:
+            ratings: the ratings data frame.
+            checkpoint: the checkpoint file; defaults to ``checkpoint_path``.
+
+        Returns:
+            The algorithm (for chaining).
+        """
+        if checkpoint is None:
+            checkpoint = self.checkpoint_path
+        if checkpoint is None:
+            raise ValueError("no checkpoint file specified")
+        return self.fit(ratings, resume=checkpoint)
 
     def _save_params(self, model):
         "Save the parameters into model attributes."
@@ -436,7 +854,7 @@ class BiasedMF(MFPredictor):
         else:
             self.user_features_ = None
 
-    def _initial_model(self, ratings):
+    def _initial_model(self, ratings, randomize=True):
         # transform ratings using offsets
         if self.bias:
             _logger.info("[%s] normalizing ratings", self.timer)
@@ -450,6 +868,9 @@ class BiasedMF(MFPredictor):
         _logger.debug("setting up contexts")
         trmat = rmat.transpose()
 
+        if not randomize:
+            return PartialModel(users, items, None, None), rmat, trmat
+
         _logger.debug("initializing item matrix")
         imat = self.rng.standard_normal((n_items, self.features))
         imat /= np.linalg.norm(imat, axis=1).reshape((n_items, 1))
@@ -461,7 +882,7 @@ class BiasedMF(MFPredictor):
 
         return PartialModel(users, items, umat, imat), rmat, trmat
 
-    def _train_iters(self, current, uctx, ictx):
+    def _train_iters(self, current, uctx, ictx, start=0):
         """
         Generator of training iterations.
 
@@ -469,6 +890,7 @@ class BiasedMF(MFPredictor):
             current(PartialModel): the current model step.
             uctx(ndarray): the user-item rating matrix for training user features.
             ictx(ndarray): the item-user rating matrix for training item features.
+            start(int): the first epoch to train (when resuming).
         """
         n_items = len(current.items)
         n_users = len(current.users)
@@ -477,10 +899,14 @@ class BiasedMF(MFPredictor):
         assert ictx.nrows == n_items
         assert ictx.ncols == n_users
 
+        kargs = ()
         if self.method == "cd":
             train = _train_matrix_cd
         elif self.method == "lu":
             train = _train_matrix_lu
+        elif self.method == "cg":
+            train = _train_matrix_cg
+            kargs = (self.cg_iters,)
         else:
             raise ValueError("invalid training method " + self.method)
 
@@ -489,11 +915,19 @@ class BiasedMF(MFPredictor):
         else:
             ureg = ireg = self.regularization
 
-        for epoch in self.progress(range(self.iterations), desc="BiasedMF", leave=False):
-            du = train(uctx, current.user_matrix, current.item_matrix, ureg)
-            _logger.debug("[%s] finished user epoch %d", self.timer, epoch)
-            di = train(ictx, current.item_matrix, current.user_matrix, ireg)
-            _logger.debug("[%s] finished item epoch %d", self.timer, epoch)
+        epochs = self.progress(range(start, self.iterations), desc="BiasedMF", leave=False)
+        steps = _train_epochs(
+            train,
+            current,
+            uctx,
+            ictx,
+            (ureg, ireg),
+            epochs,
+            kargs=kargs,
+            n_jobs=self.n_jobs,
+            timer=self.timer,
+        )
+        for epoch, current, du, di in steps:
             _logger.info("[%s] finished epoch %d (|ΔP|=%.3f, |ΔQ|=%.3f)", self.timer, epoch, du, di)
             yield current
 
@@ -515,7 +949,7 @@ class BiasedMF(MFPredictor):
             else:
                 ureg = self.regularization
 
-            u_feat = _train_bias_row_lu(ri_it, ri_val, self.item_features_, ureg)
+            u_feat = _train_bias_row_lu(ri_it, ri_val, self._item_matrix(), ureg)
             scores = self.score_by_ids(user, items, u_feat)
         else:
             # look up user index
@@ -573,10 +1007,29 @@ class ImplicitMF(MFPredictor):
             ``'lu'``
                 A direct implementation of the original implicit-feedback ALS concept :cite:p:`Hu2008-li`
                 using LU-decomposition to solve for the optimized matrices.
+            ``'bcd'``
+                Block coordinate descent over subspaces of ``block_size`` features, as in
+                iALS++ :cite:p:`rendleIALSSpeedingMatrix2021`.  Each block is solved exactly
+                with the rest of the row fixed, so the per-row cost is linear in the number of
+                features for a fixed block size; this makes models with hundreds of features
+                practical.
+
+        block_size(int):
+            the subspace size for the ``'bcd'`` method.
 
         rng_spec:
             Random number generator or state (see :func:`lenskit.util.random.rng`).
         progress: a :func:`tqdm.tqdm`-compatible progress bar function
+        checkpoint_path(str or pathlib.Path):
+            if provided, periodically save training checkpoints to this file (see
+            :meth:`resume`).  Checkpoints are written on a background thread.
+        checkpoint_interval(int): the number of epochs between checkpoints.
+        n_jobs(int):
+            the number of worker processes for training.  If ``None`` or 1, training runs
+            in-process with Numba threads; otherwise, the user and item rows are split into
+            shards that are trained by separate worker processes over feature matrices in
+            shared memory.  Each worker gets an even share of ``NUMBA_NUM_THREADS``, and
+            single-threaded BLAS.
     """
 
     timer = None
@@ -590,9 +1043,13 @@ class ImplicitMF(MFPredictor):
         weight=40,
         use_ratings=False,
         method="cg",
+        block_size=64,
         rng_spec=None,
         progress=None,
         save_user_features=True,
+        checkpoint_path=None,
+        checkpoint_interval=1,
+        n_jobs=None,
     ):
         self.features = features
         self.iterations = iterations
@@ -600,9 +1057,13 @@ class ImplicitMF(MFPredictor):
         self.weight = weight
         self.use_ratings = use_ratings
         self.method = method
+        self.block_size = block_size
         self.rng = numpy_rng(rng_spec)
         self.progress = progress if progress is not None else util.no_progress
         self.save_user_features = save_user_features
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.n_jobs = n_jobs
 
     def fit(self, ratings, **kwargs):
         util.check_env()
@@ -637,8 +1098,13 @@ class ImplicitMF(MFPredictor):
 
         return self
 
-    def fit_iters(self, ratings, **kwargs):
-        current, uctx, ictx = self._initial_model(ratings)
+    def fit_iters(self, ratings, *, resume=None, **kwargs):
+        resumed = _load_resume(resume, self.rng) if resume is not None else None
+        current, uctx, ictx = self._initial_model(ratings, resumed is None)
+        start = 0
+        if resumed is not None:
+            current, start = _resume_model(resume, resumed, current, self.features)
+            self._save_model(current)
 
         _logger.info(
             "[%s] training implicit MF model with ALS for %d features", self.timer, self.features
@@ -646,9 +1112,38 @@ class ImplicitMF(MFPredictor):
         _logger.info(
             "have %d observations for %d users and %d items", uctx.nnz, uctx.nrows, ictx.nrows
         )
-        for model in self._train_iters(current, uctx, ictx):
-            self._save_model(model)
-            yield self
+        ckpt = None
+        if self.checkpoint_path is not None:
+            ckpt = _Checkpointer(self.checkpoint_path, self.checkpoint_interval)
+        try:
+            for epoch, model in enumerate(self._train_iters(current, uctx, ictx, start), start):
+                self._save_model(model)
+                if ckpt is not None:
+                    ckpt.epoch_finished(epoch, model, self.rng)
+                yield self
+        finally:
+            if ckpt is not None:
+                ckpt.wait()
+
+    def resume(self, ratings, checkpoint=None):
+        """
+        Resume training from a checkpoint saved by a previous (interrupted) call to
+        :meth:`fit`.  ``ratings`` must be the same data used for the original training
+        run; the feature matrices, epoch counter, and random state are restored from the
+        checkpoint and training continues until ``iterations`` epochs have completed.
+
+        Args:
+            ratings: the ratings data frame.
+            checkpoint: the checkpoint file; defaults to ``checkpoint_path``.
+
+        Returns:
+            The algorithm (for chaining).
+        """
+        if checkpoint is None:
+            checkpoint = self.checkpoint_path
+        if checkpoint is None:
+            raise ValueError("no checkpoint file specified")
+        return self.fit(ratings, resume=checkpoint)
 
     def _save_model(self, model):
         self.item_index_ = model.items
@@ -659,12 +1154,16 @@ class ImplicitMF(MFPredictor):
         else:
             self.user_features_ = None
 
-    def _train_iters(self, current, uctx, ictx):
+    def _train_iters(self, current, uctx, ictx, start=0):
         "Generator of training iterations."
+        kargs = ()
         if self.method == "lu":
             train = _train_implicit_lu
         elif self.method == "cg":
             train = _train_implicit_cg
+        elif self.method == "bcd":
+            train = _train_implicit_bcd
+            kargs = (min(self.block_size, self.features),)
         else:
             raise ValueError("unknown solver " + self.method)
 
@@ -673,15 +1172,23 @@ class ImplicitMF(MFPredictor):
         else:
             ureg = ireg = self.reg
 
-        for epoch in self.progress(range(self.iterations), desc="ImplicitMF", leave=False):
-            du = train(uctx, current.user_matrix, current.item_matrix, ureg)
-            _logger.debug("[%s] finished user epoch %d", self.timer, epoch)
-            di = train(ictx, current.item_matrix, current.user_matrix, ireg)
-            _logger.debug("[%s] finished item epoch %d", self.timer, epoch)
+        epochs = self.progress(range(start, self.iterations), desc="ImplicitMF", leave=False)
+        steps = _train_epochs(
+            train,
+            current,
+            uctx,
+            ictx,
+            (ureg, ireg),
+            epochs,
+            kargs=kargs,
+            n_jobs=self.n_jobs,
+            timer=self.timer,
+        )
+        for epoch, current, du, di in steps:
             _logger.info("[%s] finished epoch %d (|ΔP|=%.3f, |ΔQ|=%.3f)", self.timer, epoch, du, di)
             yield current
 
-    def _initial_model(self, ratings):
+    def _initial_model(self, ratings, randomize=True):
         "Initialize a model and build contexts."
 
         if not self.use_ratings:
@@ -697,6 +1204,8 @@ class ImplicitMF(MFPredictor):
             rmat.values = np.ones(rmat.nnz)
         rmat.values *= self.weight
         trmat = rmat.transpose()
+        if not randomize:
+            return PartialModel(users, items, None, None), rmat, trmat
 
         imat = self.rng.standard_normal((n_items, self.features)) * 0.01
         imat = np.square(imat)
@@ -715,7 +1224,7 @@ class ImplicitMF(MFPredictor):
             else:
                 ri_val = ratings.values[ri_good]
             ri_val *= self.weight
-            u_feat = _train_implicit_row_lu(ri_it, ri_val, self.item_features_, self.OtOr_)
+            u_feat = _train_implicit_row_lu(ri_it, ri_val, self._item_matrix(), self.OtOr_)
             return self.score_by_ids(user, items, u_feat)
         else:
             # look up user index
@@ -3,19 +3,23 @@ Basic utility algorithms and combiners.
 """
 
 import logging
+import threading
 from collections.abc import Iterable, Sequence
 
 import pandas as pd
 import numpy as np
+from numba import njit, prange
 
 from ..data import sparse_ratings
 from . import Predictor, Recommender, CandidateSelector
 from ..util import derivable_rng
+from ..util.random import splitmix64
 
 from .bias import Bias  # noqa: F401
-from .ranking import TopN  # noqa: F401
+from .ranking import TopN, RecBatch  # noqa: F401
 
 _logger = logging.getLogger(__name__)
+_scratch = threading.local()
 
 
 class Popular(Recommender):
@@ -24,6 +28,12 @@ class Popular(Recommender):
 
     The :py:class:`PopScore` class is more flexible, and recommended for new code.
 
+    Since popularity is fixed after training, the items are ranked once in :meth:`fit`.
+    When the candidate selector can report the positions of a user's rated items (as
+    :class:`UnratedItemCandidateSelector` does), recommendations are produced by walking
+    this ranking and skipping rated items, in time proportional to the number of
+    recommendations and rated items instead of the size of the catalog.
+
     Args:
         selector(CandidateSelector):
             The candidate selector to use. If ``None``, uses a new
@@ -32,6 +42,8 @@ class Popular(Recommender):
     Attributes:
         item_pop_(pandas.Series):
             Item rating counts (popularity)
+        ranking_(pandas.Series):
+            Item rating counts, in decreasing order of popularity.
     """
 
     def __init__(self, selector=None):
@@ -41,14 +53,26 @@ class Popular(Recommender):
         pop = ratings.groupby("item").user.count()
         pop.name = "score"
         self.item_pop_ = pop.astype("float64")
+        order = np.argsort(-self.item_pop_.values, kind="stable")
+        self.ranking_ = self.item_pop_.iloc[order]
 
         if self.selector is None:
             self.selector = UnratedItemCandidateSelector()
         self.selector.fit(ratings)
 
+        if hasattr(self.selector, "rated_positions"):
+            # positions of the ranked items in the selector's item index
+            self.ranking_positions_ = self.selector.items_.get_indexer(self.ranking_.index)
+        else:
+            self.ranking_positions_ = None
+
         return self
 
     def recommend(self, user, n=None, candidates=None, ratings=None):
+        if candidates is None and getattr(self, "ranking_positions_", None) is not None:
+            ranks = self._unrated_ranks(user, n, ratings)
+            return self.ranking_.iloc[ranks].reset_index()
+
         scores = self.item_pop_
         if candidates is None:
             candidates = self.selector.candidates(user, ratings)
@@ -62,6 +86,43 @@ class Popular(Recommender):
         else:
             return scores.nlargest(n).reset_index()
 
+    def recommend_batch(self, users, n=None):
+        """
+        Recommend for many users at once, with each user's default candidates.
+
+        Args:
+            users(array-like): the user IDs.
+            n(int): the number of recommendations per user (``None`` for unlimited).
+
+        Returns:
+            RecBatch: the recommendations, as flat arrays.
+        """
+        users = np.asarray(users)
+        if getattr(self, "ranking_positions_", None) is None:
+            recs = [self.recommend(u, n) for u in users]
+            ranks = [self.ranking_.index.get_indexer(r["item"]) for r in recs]
+        else:
+            ranks = [self._unrated_ranks(u, n) for u in users]
+
+        offsets = np.zeros(len(users) + 1, dtype=np.int64)
+        np.cumsum([len(r) for r in ranks], out=offsets[1:])
+        ranks = np.concatenate(ranks) if ranks else np.zeros(0, dtype=np.intp)
+        return RecBatch(
+            users, offsets, self.ranking_.index.values[ranks], self.ranking_.values[ranks]
+        )
+
+    def _unrated_ranks(self, user, n, ratings=None):
+        """
+        Get the positions in :attr:`ranking_` of the user's top-*n* unrated items.  At
+        most one item per rated item is skipped, so only the first ``n + |rated|``
+        entries of the ranking are examined.
+        """
+        rated = self.selector.rated_positions(user, ratings)
+        end = len(self.ranking_) if n is None else min(n + len(rated), len(self.ranking_))
+        head = self.ranking_positions_[:end]
+        ranks = np.flatnonzero(~np.isin(head, rated))
+        return ranks if n is None else ranks[:n]
+
     def __str__(self):
         return "Popular"
 
@@ -119,6 +180,9 @@ class PopScore(Predictor):
 class Memorized(Predictor):
     """
     The memorized algorithm memorizes socres provided at construction time.
+
+    The scores are indexed by user when the algorithm is constructed, so looking up a
+    user's scores takes time proportional to that user's rows.
     """
 
     def __init__(self, scores):
@@ -128,14 +192,26 @@ class Memorized(Predictor):
         """
 
         self.scores = scores
+        self._index = _PairIndex(scores)
 
     def fit(self, *args, **kwargs):
         return self
 
     def predict_for_user(self, user, items, ratings=None):
-        uscores = self.scores[self.scores.user == user]
-        urates = uscores.set_index("item").rating
-        return urates.reindex(items)
+        return self._index.user_values(user).reindex(items)
+
+    def predict_pairs(self, users, items):
+        """
+        Look up the memorized scores for many user-item pairs at once.
+
+        Args:
+            users(array-like): the user IDs.
+            items(array-like): the item IDs (the same length as ``users``).
+
+        Returns:
+            numpy.ndarray: the scores, with NaN for pairs that have no score.
+        """
+        return self._index.lookup(users, items)
 
 
 class Fallback(Predictor):
@@ -166,22 +242,70 @@ class Fallback(Predictor):
         return self
 
     def predict_for_user(self, user, items, ratings=None):
-        remaining = pd.Index(items)
-        preds = None
+        items = pd.Index(items)
+        preds = self.predict_positions(user, items, np.arange(len(items)), ratings)
+        return pd.Series(preds, index=items)
+
+    def predict_positions(self, user, vocab, positions, ratings=None):
+        """
+        Compute predictions for items identified by position in an item vocabulary (see
+        :meth:`.Predictor.predict_positions`).  Each algorithm predicts only the items
+        that the algorithms before it could not.
+        """
+        positions = np.asarray(positions)
+        preds = np.full(len(positions), np.nan)
+        remaining = np.arange(len(positions))
 
         for algo in self.algorithms:
             _logger.debug("predicting for %d items for user %s", len(remaining), user)
-            aps = algo.predict_for_user(user, remaining, ratings=ratings)
-            aps = aps[aps.notna()]
-            if preds is None:
-                preds = aps
+            aps = algo.predict_positions(user, vocab, positions[remaining], ratings=ratings)
+            remaining = self._fill(preds, remaining, aps)
+            if len(remaining) == 0:
+                break
+
+        return preds
+
+    def predict_pairs(self, users, items):
+        """
+        Predict many user-item pairs at once.  Each algorithm predicts only the pairs that
+        the algorithms before it could not, with its own ``predict_pairs`` method if it
+        has one (and :meth:`Predictor.predict` otherwise), and its predictions are filled
+        into a single result array.
+
+        Args:
+            users(array-like): the user IDs.
+            items(array-like): the item IDs (the same length as ``users``).
+
+        Returns:
+            numpy.ndarray: the predictions, with NaN for pairs no algorithm can predict.
+        """
+        users = np.asarray(users)
+        items = np.asarray(items)
+        preds = np.full(len(users), np.nan)
+        remaining = np.arange(len(users))
+
+        for algo in self.algorithms:
+            _logger.debug("predicting %d pairs with %s", len(remaining), algo)
+            if hasattr(algo, "predict_pairs"):
+                aps = algo.predict_pairs(users[remaining], items[remaining])
             else:
-                preds = pd.concat([preds, aps])
-            remaining = remaining.difference(preds.index)
+                pairs = pd.DataFrame({"user": users[remaining], "item": items[remaining]})
+                aps = algo.predict(pairs).values
+            remaining = self._fill(preds, remaining, aps)
             if len(remaining) == 0:
                 break
 
-        return preds.reindex(items)
+        return preds
+
+    @staticmethod
+    def _fill(preds, remaining, values):
+        """
+        Fill predictions for the ``remaining`` positions from an array of values, and return
+        the positions that are still missing.
+        """
+        missing = np.isnan(values)
+        preds[remaining[~missing]] = values[~missing]
+        return remaining[missing]
 
     def __str__(self):
         str_algos = [str(algo) for algo in self.algorithms]
@@ -207,6 +331,11 @@ class UnratedItemCandidateSelector(CandidateSelector):
     :class:`CandidateSelector` that selects items a user has not rated as
     candidates.  When this selector is fit, it memorizes the rated items.
 
+    In addition to item IDs, the selector can return candidates as positions in its
+    item index (:meth:`candidate_positions`), or the positions to exclude from the
+    full item index (:meth:`rated_positions`), so callers working in position space
+    do not need to map IDs back to positions.
+
     Attributes:
         items_(pandas.Index): All known items.
         users_(pandas.Index): All known users.
@@ -229,22 +358,60 @@ class UnratedItemCandidateSelector(CandidateSelector):
         return self
 
     def candidates(self, user, ratings=None):
+        return self.items_.values[self.candidate_positions(user, ratings)]
+
+    def item_vocabulary(self):
+        return self.items_
+
+    def rated_positions(self, user, ratings=None):
+        """
+        Get the positions (in :attr:`items_`) of the items a user has rated; the user's
+        candidates are all other items.
+
+        Args:
+            user: The user ID.
+            ratings(pandas.Series or array-like):
+                Ratings or items to use instead of the memorized ratings, as in
+                :meth:`candidates`.
+
+        Returns:
+            numpy.ndarray: the rated item positions (empty for unknown users).
+        """
         if ratings is None:
             try:
                 uidx = self.users_.get_loc(user)
-                uis = self.user_items_.row_cs(uidx)
+                return self.user_items_.row_cs(uidx)
             except KeyError:
-                uis = None
+                return np.zeros(0, dtype=np.int32)
         else:
             uis = self.items_.get_indexer(self.rated_items(ratings))
-            uis = uis[uis >= 0]
+            return uis[uis >= 0]
 
-        if uis is not None:
-            mask = np.full(len(self.items_), True)
-            mask[uis] = False
-            return self.items_.values[mask]
-        else:
-            return self.items_.values
+    def candidate_positions(self, user, ratings=None):
+        """
+        Get the positions (in :attr:`items_`) of a user's candidate items.  The
+        positions are in increasing order.
+
+        Args:
+            user: The user ID.
+            ratings(pandas.Series or array-like):
+                Ratings or items to use instead of the memorized ratings, as in
+                :meth:`candidates`.
+
+        Returns:
+            numpy.ndarray: the candidate item positions.
+        """
+        n = len(self.items_)
+        uis = self.rated_positions(user, ratings)
+        if len(uis) == 0:
+            return np.arange(n)
+
+        mask = _scratch_mask(n)
+        mask[uis] = False
+        try:
+            return np.flatnonzero(mask)
+        finally:
+            mask[uis] = True
 
 
 class AllItemsCandidateSelector(CandidateSelector):
@@ -271,6 +438,13 @@ class Random(Recommender):
     """
     A random-item recommender.
 
+    With the default :class:`UnratedItemCandidateSelector`, items are sampled in
+    compiled code from a counter-based random stream for each user (see
+    :func:`lenskit.util.random.splitmix64`), and :meth:`recommend_batch` samples for
+    many users at once.  With ``rng_spec='user'``, each user's recommendations depend
+    only on the seed and the user ID, whether they are produced individually or in a
+    batch.
+
     Attributes:
         selector(CandidateSelector):
             Selects candidate items for recommendation.
@@ -297,6 +471,10 @@ class Random(Recommender):
         return self
 
     def recommend(self, user, n=None, candidates=None, ratings=None):
+        if candidates is None and isinstance(self.selector, UnratedItemCandidateSelector):
+            recs = self._sample_unrated(np.array([user]), n, ratings)
+            return pd.DataFrame({"item": recs.items})
+
         if candidates is None:
             candidates = self.selector.candidates(user, ratings)
         if n is None:
@@ -307,19 +485,188 @@ class Random(Recommender):
         recs = c_df.sample(n, random_state=rng)
         return recs.reset_index(drop=True)
 
+    def recommend_batch(self, users, n=None):
+        """
+        Recommend random items for many users at once, with each user's default
+        candidates.
+
+        Args:
+            users(array-like): the user IDs.
+            n(int): the number of recommendations per user (``None`` for all candidates).
+
+        Returns:
+            RecBatch: the recommendations, as flat arrays (with no scores).
+        """
+        users = np.asarray(users)
+        if isinstance(self.selector, UnratedItemCandidateSelector):
+            return self._sample_unrated(users, n)
+
+        items = [self.recommend(u, n)["item"].values for u in users]
+        offsets = np.zeros(len(users) + 1, dtype=np.int64)
+        np.cumsum([len(i) for i in items], out=offsets[1:])
+        items = np.concatenate(items) if items else np.zeros(0)
+        return RecBatch(users, offsets, items, None)
+
+    def _sample_unrated(self, users, n, ratings=None):
+        "Sample unrated items for users, using the selector's rated-item matrix."
+        sel = self.selector
+        n_items = len(sel.items_)
+        if ratings is None:
+            uidx = sel.users_.get_indexer(users)
+            ptrs = sel.user_items_.rowptrs
+            cols = sel.user_items_.colinds
+        else:
+            cols = np.unique(sel.rated_positions(users[0], ratings))
+            ptrs = np.array([0, len(cols)])
+            uidx = np.zeros(1, dtype=np.intp)
+
+        nrated = np.where(uidx >= 0, ptrs[uidx + 1] - ptrs[uidx], 0)
+        counts = n_items - nrated
+        if n is not None:
+            counts = np.minimum(counts, n)
+        offsets = np.zeros(len(users) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        seeds = self.rng_source.stream_seeds(users)
+        out = np.empty(offsets[-1], dtype=np.int64)
+        _sample_unrated(seeds, uidx, ptrs, cols, n_items, offsets, out)
+        return RecBatch(users, offsets, sel.items_.values[out], None)
+
     def __str__(self):
         return "Random"
 
 
+@njit(parallel=True, nogil=True)
+def _sample_unrated(seeds, uidx, ptrs, cols, n_items, offsets, out):
+    """
+    Sample ``offsets[i+1] - offsets[i]`` unrated item positions for each user without
+    replacement, in random order, from each user's SplitMix64 stream.  Item positions are
+    sampled among the ``n_items - |rated|`` unrated items, and mapped to catalog positions
+    by skipping the (sorted) rated positions.
+    """
+    for i in prange(len(seeds)):
+        if uidx[i] >= 0:
+            rated = np.unique(cols[ptrs[uidx[i]] : ptrs[uidx[i] + 1]])
+        else:
+            rated = np.zeros(0, dtype=cols.dtype)
+        # the j-th unrated item is j + (number of shifted rated positions <= j)
+        shifted = rated - np.arange(len(rated))
+        nc = n_items - len(rated)
+        state = seeds[i]
+        dst = out[offsets[i] : offsets[i + 1]]
+        k = len(dst)
+
+        if k * 4 >= nc:
+            # partial Fisher-Yates shuffle of all candidates
+            perm = np.arange(nc)
+            for j in range(k):
+                state, r = splitmix64(state)
+                x = j + r % (nc - j)
+                t = perm[j]
+                perm[j] = perm[x]
+                perm[x] = t
+            dst[:] = perm[:k]
+        else:
+            # Floyd's algorithm for a sample, then shuffle it
+            chosen = set()
+            for j in range(k):
+                m = nc - k + j
+                state, r = splitmix64(state)
+                t = r % (m + 1)
+                if t in chosen:
+                    t = m
+                chosen.add(t)
+                dst[j] = t
+            for j in range(k - 1, 0, -1):
+                state, r = splitmix64(state)
+                x = r % (j + 1)
+                t = dst[j]
+                dst[j] = dst[x]
+                dst[x] = t
+
+        dst += np.searchsorted(shifted, dst, side="right")
+
+
 class KnownRating(Predictor):
     """
     The known rating algorithm memorizes ratings provided in the fit method.
     """
 
     def fit(self, ratings, **kwargs):
-        self.ratings = ratings.set_index(["user", "item"]).sort_index()
+        self._index = _PairIndex(ratings)
         return self
 
     def predict_for_user(self, user, items, ratings=None):
-        uscores = self.ratings.xs(user, level="user", drop_level=True)
-        return uscores.rating.reindex(items)
+        return self._index.user_values(user).reindex(items)
+
+    def predict_pairs(self, users, items):
+        """
+        Look up the known ratings for many user-item pairs at once.
+
+        Args:
+            users(array-like): the user IDs.
+            items(array-like): the item IDs (the same length as ``users``).
+
+        Returns:
+            numpy.ndarray: the ratings, with NaN for pairs that have not been rated.
+        """
+        return self._index.lookup(users, items)
+
+
+class _PairIndex:
+    """
+    An index of (user, item, rating) rows, sorted by user and then by item, with the
+    start offset of each user's rows (like the row pointers of a CSR matrix).
+    """
+
+    def __init__(self, ratings):
+        ucodes, users = pd.factorize(ratings["user"])
+        icodes, items = pd.factorize(ratings["item"])
+        self.users = pd.Index(users, name="user")
+        self.items = pd.Index(items, name="item")
+
+        keys = ucodes.astype(np.int64) * len(items) + icodes
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.item_ids = ratings["item"].values[order]
+        self.values = ratings["rating"].values[order]
+        bounds = np.arange(len(users) + 1, dtype=np.int64) * len(items)
+        self.offsets = np.searchsorted(self.keys, bounds)
+
+    def user_values(self, user):
+        "Get a user's values as a series indexed by item."
+        try:
+            uidx = self.users.get_loc(user)
+        except KeyError:
+            return pd.Series([], dtype=self.values.dtype, name="rating")
+
+        sp, ep = self.offsets[uidx], self.offsets[uidx + 1]
+        return pd.Series(
+            self.values[sp:ep], index=pd.Index(self.item_ids[sp:ep], name="item"), name="rating"
+        )
+
+    def lookup(self, users, items):
+        "Look up the values for arrays of users and items, with NaN for missing pairs."
+        uidx = self.users.get_indexer(users)
+        iidx = self.items.get_indexer(items)
+        result = np.full(len(uidx), np.nan)
+        if len(self.keys) == 0:
+            return result
+        good = np.flatnonzero((uidx >= 0) & (iidx >= 0))
+        keys = uidx[good].astype(np.int64) * len(self.items) + iidx[good]
+        pos = np.searchsorted(self.keys, keys)
+        pos[pos >= len(self.keys)] = 0
+        found = self.keys[pos] == keys
+        result[good[found]] = self.values[pos[found]]
+        return result
+
+
+def _scratch_mask(n):
+    """
+    Get a thread-local, all-``True`` boolean mask of length ``n`` for marking excluded
+    items.  Callers must restore any entries they clear.
+    """
+    mask = getattr(_scratch, "mask", None)
+    if mask is None or len(mask) < n:
+        mask = _scratch.mask = np.full(n, True)
+    return mask[:n]
@@ -1,8 +1,9 @@
 import logging
 
+import numpy as np
 import pandas as pd
 
-from . import Predictor
+from . import Predictor, map_positions
 
 _logger = logging.getLogger(__name__)
 
@@ -43,6 +44,9 @@ class Bias(Predictor):
         mean_(double): The global mean rating.
         item_offsets_(pandas.Series): The item offsets (:math:`b_i` values)
         user_offsets_(pandas.Series): The item offsets (:math:`b_u` values)
+
+    The model can also be estimated incrementally, one chunk of ratings at a time, with
+    :meth:`partial_fit`.
     """
 
     def __init__(self, items=True, users=True, damping=0.0):
@@ -73,31 +77,89 @@ class Bias(Predictor):
             Bias: the fit bias object.
         """
         _logger.info("building bias model for %d ratings", len(ratings))
+        self._stats = None
         self.mean_ = ratings.rating.mean()
         _logger.info("global mean: %.3f", self.mean_)
-        nrates = ratings.assign(rating=lambda df: df.rating - self.mean_)
+        nrates = ratings["rating"].to_numpy(np.float64) - self.mean_
 
         if self.items:
-            group = nrates.groupby("item").rating
-            self.item_offsets_ = self._mean(group, self.item_damping)
-            self.item_offsets_.name = "i_off"
+            icodes, items = pd.factorize(ratings["item"], sort=True)
+            ioff = self._code_means(icodes, nrates, len(items), self.item_damping)
+            self.item_offsets_ = pd.Series(ioff, index=pd.Index(items, name="item"), name="i_off")
             _logger.info("computed means for %d items", len(self.item_offsets_))
         else:
             self.item_offsets_ = None
 
         if self.users:
             if self.item_offsets_ is not None:
-                nrates = nrates.join(pd.DataFrame(self.item_offsets_), on="item", how="inner")
-                nrates = nrates.assign(rating=lambda df: df.rating - df.i_off)
+                nrates = nrates - _gather(ioff, icodes, np.nan)
 
-            self.user_offsets_ = self._mean(nrates.groupby("user").rating, self.user_damping)
-            self.user_offsets_.name = "u_off"
+            ucodes, users = pd.factorize(ratings["user"], sort=True)
+            uoff = self._code_means(ucodes, nrates, len(users), self.user_damping)
+            self.user_offsets_ = pd.Series(uoff, index=pd.Index(users, name="user"), name="u_off")
             _logger.info("computed means for %d users", len(self.user_offsets_))
         else:
             self.user_offsets_ = None
 
         return self
 
+    def partial_fit(self, ratings, **kwargs):
+        """
+        Update the bias model with a chunk of rating data.  This keeps running sums and
+        counts for the global mean and for each item and user, so a large rating file
+        can be processed chunk by chunk in memory proportional to the number of users and
+        items, and the model can be kept current as new ratings arrive.  The offsets are
+        recomputed from the accumulated statistics after each chunk.
+
+        The global mean and item offsets are exactly those that :meth:`fit` would compute
+        on all ratings seen so far.  The user offsets are approximate: each rating's
+        contribution to its user's offset subtracts the item offset as estimated when its
+        chunk was processed, rather than the final item offset.  They are exact when all
+        ratings are in a single chunk, and converge to the :meth:`fit` values as item
+        offsets stabilize.
+
+        Calling :meth:`fit` discards the accumulated statistics.
+
+        Args:
+            ratings (DataFrame): a chunk of ratings, with `user`, `item`, and `rating`
+                                 columns.
+
+        Returns:
+            Bias: the updated bias object.
+        """
+        stats = getattr(self, "_stats", None)
+        if stats is None:
+            stats = self._stats = _BiasStats()
+
+        values = ratings["rating"].to_numpy(np.float64)
+        good = ~np.isnan(values)
+        values = values[good]
+        if len(values) == 0:
+            _logger.debug("chunk has no ratings, skipping")
+            return self
+
+        stats.total += values.sum()
+        stats.count += len(values)
+        self.mean_ = stats.total / stats.count
+        _logger.debug("added %d ratings, global mean %.3f", len(values), self.mean_)
+
+        if self.items:
+            rows = stats.items.add(ratings["item"].values[good], values)
+            ioff = stats.items.offsets(self.mean_, self.item_damping)
+            self.item_offsets_ = stats.items.series(ioff, "item", "i_off")
+            values = values - ioff[rows]
+        else:
+            self.item_offsets_ = None
+
+        if self.users:
+            stats.users.add(ratings["user"].values[good], values)
+            uoff = stats.users.offsets(self.mean_, self.user_damping)
+            self.user_offsets_ = stats.users.series(uoff, "user", "u_off")
+        else:
+            self.user_offsets_ = None
+
+        return self
+
     def transform(self, ratings, *, indexes=False):
         """
         Transform ratings by removing the bias term.  This method does *not* recompute
@@ -118,18 +180,9 @@ class Bias(Predictor):
                 user-item bias prediction.
         """
         rvps = ratings[["user", "item"]].copy()
-        rvps["rating"] = ratings["rating"] - self.mean_
-        if self.item_offsets_ is not None:
-            rvps = rvps.join(self.item_offsets_, on="item", how="left")
-            rvps["rating"] -= rvps["i_off"].fillna(0)
-            rvps = rvps.drop(columns="i_off")
-        if self.user_offsets_ is not None:
-            rvps = rvps.join(self.user_offsets_, on="user", how="left")
-            rvps["rating"] -= rvps["u_off"].fillna(0)
-            rvps = rvps.drop(columns="u_off")
-        if indexes:
-            rvps["uidx"] = self.user_offsets_.index.get_indexer(rvps["user"])
-            rvps["iidx"] = self.item_offsets_.index.get_indexer(rvps["item"])
+        rvps["rating"] = ratings["rating"].to_numpy(np.float64) - self._offsets(
+            ratings["user"], ratings["item"], rvps if indexes else None
+        )
         return rvps
 
     def inverse_transform(self, ratings):
@@ -137,16 +190,30 @@ class Bias(Predictor):
         Transform ratings by removing the bias term.
         """
         rvps = pd.DataFrame({"user": ratings["user"], "item": ratings["item"]})
-        rvps["rating"] = ratings["rating"] + self.mean_
+        rvps["rating"] = ratings["rating"].to_numpy(np.float64) + self._offsets(
+            ratings["user"], ratings["item"]
+        )
+        return rvps
+
+    def _offsets(self, users, items, index_frame=None):
+        """
+        Compute the total bias (:math:`\\mu + b_i + b_u`) for arrays of users and items, with
+        positional lookups into the offset arrays.  Unknown users and items have zero
+        offsets.  If ``index_frame`` is provided, the user and item positions are stored
+        in its ``uidx`` and ``iidx`` columns.
+        """
+        bias = np.full(len(users), self.mean_)
+        uidx = iidx = np.full(len(users), -1, dtype=np.intp)
         if self.item_offsets_ is not None:
-            rvps = rvps.join(self.item_offsets_, on="item", how="left")
-            rvps["rating"] += rvps["i_off"].fillna(0)
-            del rvps["i_off"]
+            iidx = self.item_offsets_.index.get_indexer(items)
+            bias += _gather(self.item_offsets_.values, iidx)
         if self.user_offsets_ is not None:
-            rvps = rvps.join(self.user_offsets_, on="user", how="left")
-            rvps["rating"] += rvps["u_off"].fillna(0)
-            del rvps["u_off"]
-        return rvps
+            uidx = self.user_offsets_.index.get_indexer(users)
+            bias += _gather(self.user_offsets_.values, uidx)
+        if index_frame is not None:
+            index_frame["uidx"] = uidx
+            index_frame["iidx"] = iidx
+        return bias
 
     def transform_user(self, ratings):
         """
@@ -220,24 +287,83 @@ class Bias(Predictor):
         """
 
         idx = pd.Index(items)
-        preds = pd.Series(self.mean_, idx)
+        if self.item_offsets_ is not None:
+            vocab = self.item_offsets_.index
+            positions = vocab.get_indexer(idx)
+        else:
+            vocab = idx
+            positions = np.arange(len(idx))
+        return pd.Series(self.predict_positions(user, vocab, positions, ratings), index=idx)
+
+    def predict_positions(self, user, vocab, positions, ratings=None):
+        """
+        Compute predictions for items identified by position in an item vocabulary (see
+        :meth:`.Predictor.predict_positions`).  Unknown items have zero bias.
+        """
+        preds = np.full(len(positions), self.mean_)
 
         if self.item_offsets_ is not None:
-            preds = preds + self.item_offsets_.reindex(idx, fill_value=0)
+            ipos = map_positions(self.item_offsets_.index, vocab, positions)
+            preds += _gather(self.item_offsets_.values, ipos)
 
         if self.users and ratings is not None:
-            uoff = ratings - self.mean_
-            if self.item_offsets_ is not None:
-                uoff = uoff - self.item_offsets_
-            umean = uoff.mean()
-            preds = preds + umean
+            codes = np.zeros(len(ratings), dtype=np.intp)
+            (umean,) = self._rated_user_offsets(codes, 1, ratings.index, ratings.values)
+            preds += umean
         elif self.user_offsets_ is not None:
             umean = self.user_offsets_.get(user, 0.0)
             _logger.debug("using mean(user %s) = %.3f", user, umean)
-            preds = preds + umean
+            preds += umean
 
         return preds
 
+    def predict_pairs(self, users, items, ratings=None):
+        """
+        Compute predictions for many user-item pairs at once, with positional lookups
+        into the offset arrays.  Unknown users and items are assumed to have zero bias.
+
+        Args:
+            users (array-like): the user IDs
+            items (array-like): the item IDs, parallel to ``users``
+            ratings (pandas.DataFrame):
+                ratings with ``user``, ``item`` and ``rating`` columns; if provided, the
+                biases of the users in this frame are recomputed from these ratings, as
+                with the ``ratings`` parameter to :meth:`predict_for_user`.
+
+        Returns:
+            numpy.ndarray: the predicted scores.
+        """
+        users = np.asarray(users)
+        bias = self._offsets(users, items)
+
+        if self.users and ratings is not None:
+            codes, rusers = pd.factorize(ratings["user"])
+            ruoff = self._rated_user_offsets(
+                codes, len(rusers), ratings["item"], ratings["rating"].values
+            )
+            rpos = pd.Index(rusers).get_indexer(users)
+            rated = rpos >= 0
+            if self.user_offsets_ is not None:
+                upos = self.user_offsets_.index.get_indexer(users[rated])
+                bias[rated] -= _gather(self.user_offsets_.values, upos)
+            bias[rated] += ruoff[rpos[rated]]
+
+        return bias
+
+    def predict(self, pairs, ratings=None):
+        """
+        Compute predictions for user-item pairs with :meth:`predict_pairs`.
+
+        Args:
+            pairs(pandas.DataFrame): The user-item pairs, as ``user`` and ``item`` columns.
+            ratings(pandas.DataFrame): user-item rating data to replace memorized data.
+
+        Returns:
+            pandas.Series: The predicted scores for each user-item pair.
+        """
+        preds = self.predict_pairs(pairs["user"].values, pairs["item"].values, ratings)
+        return pd.Series(preds, index=pairs.index, name="prediction")
+
     @property
     def user_index(self):
         "Get the user index from this (fit) bias."
@@ -254,5 +380,109 @@ class Bias(Predictor):
         else:
             return series.mean()
 
+    def _code_means(self, codes, values, n, damping):
+        """
+        Compute the (damped) mean of ``values`` for each of ``n`` integer codes, like
+        :meth:`_mean` on a grouped series.  Missing values and codes are skipped.
+        """
+        good = (codes >= 0) & ~np.isnan(values)
+        if not np.all(good):
+            codes = codes[good]
+            values = values[good]
+        sums = np.bincount(codes, weights=values, minlength=n)
+        counts = np.bincount(codes, minlength=n)
+        if damping is not None and damping > 0:
+            return sums / (counts + damping)
+        else:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                return sums / counts
+
+    def _rated_user_offsets(self, codes, n, items, values):
+        """
+        Re-estimate the (undamped) offsets of ``n`` users, identified by integer codes,
+        from their ratings of ``items``.  Ratings of unknown items are skipped.
+        """
+        values = np.asarray(values, dtype=np.float64) - self.mean_
+        if self.item_offsets_ is not None:
+            ipos = self.item_offsets_.index.get_indexer(items)
+            values = values - _gather(self.item_offsets_.values, ipos, np.nan)
+        return self._code_means(codes, values, n, None)
+
     def __str__(self):
         return "Bias(ud={}, id={})".format(self.user_damping, self.item_damping)
+
+
+class _BiasStats:
+    """
+    Sufficient statistics for incremental bias estimation.
+    """
+
+    def __init__(self):
+        self.total = 0.0
+        self.count = 0
+        self.items = _KeyedSums()
+        self.users = _KeyedSums()
+
+
+class _KeyedSums:
+    """
+    Running sums and counts of values, keyed by user or item ID.  Keys are stored in
+    first-seen order.
+    """
+
+    def __init__(self):
+        self.keys = None
+        self.sums = np.zeros(0)
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def add(self, keys, values):
+        """
+        Add values to the sums for their keys, and return the key positions.
+        """
+        codes, uniq = pd.factorize(keys)
+        if self.keys is None:
+            self.keys = pd.Index(uniq)
+            pos = np.arange(len(uniq))
+        else:
+            pos = self.keys.get_indexer(uniq)
+            new = pos < 0
+            if np.any(new):
+                pos[new] = np.arange(len(self.keys), len(self.keys) + np.sum(new))
+                self.keys = self.keys.append(pd.Index(uniq[new]))
+
+        n = len(self.keys)
+        rows = pos[codes]
+        # bincount returns integers for empty input, so force floating-point sums
+        sums = np.bincount(rows, weights=values, minlength=n).astype(np.float64)
+        sums[: len(self.sums)] += self.sums
+        counts = np.bincount(rows, minlength=n)
+        counts[: len(self.counts)] += self.counts
+        self.sums = sums
+        self.counts = counts
+        return rows
+
+    def offsets(self, mean, damping):
+        "Compute the (damped) mean offset from ``mean`` for each key."
+        deltas = self.sums - self.counts * mean
+        if damping is not None and damping > 0:
+            return deltas / (self.counts + damping)
+        else:
+            return deltas / self.counts
+
+    def series(self, values, name, sname):
+        "Create a series of per-key values, sorted by key."
+        s = pd.Series(values, index=pd.Index(self.keys, name=name), name=sname)
+        return s.sort_index()
+
+
+def _gather(values, positions, missing=0.0):
+    """
+    Look up values by position, using ``missing`` for negative positions (and in place of
+    missing values).
+    """
+    result = np.full(len(positions), missing)
+    good = positions >= 0
+    result[good] = values[positions[good]]
+    if missing == 0.0:
+        result[np.isnan(result)] = 0.0
+    return result
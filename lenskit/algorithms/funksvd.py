@@ -4,11 +4,14 @@ FunkSVD (biased MF).
 
 import logging
 import time
+from collections import namedtuple
 
 import pandas as pd
 import numpy as np
 import numba as n
+from numba import prange
 from seedbank import numpy_rng
+from csr import CSR
 
 try:
     from numba.experimental import jitclass
@@ -16,11 +19,24 @@ except ImportError:
     from numba import jitclass
 
 from .bias import Bias
-from .mf_common import MFPredictor
+from .mf_common import MFPredictor, _train_bias_row_lu, _train_matrix_lu
 from .. import util
 
 _logger = logging.getLogger(__name__)
 
+FoldIn = namedtuple("FoldIn", ["user_index", "user_features", "user_offsets"])
+FoldIn.__doc__ = """
+User parameters estimated by :meth:`FunkSVD.fold_in` for users who were not (necessarily)
+in the training data.
+
+Attributes:
+    user_index(pandas.Index): the user IDs.
+    user_features(numpy.ndarray): the user feature matrix, one row per user.
+    user_offsets(numpy.ndarray):
+        the users' bias offsets, computed from their ratings as in
+        :meth:`.Bias.transform_user` (zero if there is no bias model).
+"""
+
 
 @jitclass(
     [
@@ -56,6 +72,14 @@ def _fresh_model(nfeatures, nusers, nitems, init=0.1):
     return model
 
 
+def _random_model(nfeatures, nusers, nitems, rng, scale=0.1):
+    umat = rng.normal(0, scale, size=(nusers, nfeatures))
+    imat = rng.normal(0, scale, size=(nitems, nfeatures))
+    model = Model(umat, imat)
+    model.initial_value = 0.0
+    return model
+
+
 @jitclass(
     [
         ("iter_count", n.int32),
@@ -156,6 +180,47 @@ def _feature_loop(ctx: Context, params: _Params, model: Model, fc: _FeatContext)
     return np.sqrt(sse / ctx.n_samples)
 
 
+@n.njit(parallel=True, nogil=True)
+def _hogwild_loop(users, items, ratings, est, umat, imat, f, trail, params, nchunks):
+    """
+    Lock-free parallel version of :func:`_feature_loop`.  The (shuffled) samples are
+    split into ``nchunks`` contiguous blocks, each walked serially by one thread; threads
+    update the shared feature matrices without synchronization :cite:p:`niuHogwildLockFreeApproach2011`.
+    Since each sample touches only one user and one item feature value, collisions are
+    rare and only perturb the gradient steps slightly.
+    """
+    n_samples = len(users)
+    lrate = params.lrate
+    reg = params.reg_term
+    rmin = params.rmin
+    rmax = params.rmax
+    bounds = np.linspace(0, n_samples, nchunks + 1).astype(np.int64)
+
+    sse = 0.0
+    for c in prange(nchunks):
+        csse = 0.0
+        for s in range(bounds[c], bounds[c + 1]):
+            user = users[s]
+            item = items[s]
+            ufv = umat[user, f]
+            ifv = imat[item, f]
+
+            pred = est[s] + ufv * ifv + trail
+            if pred < rmin:
+                pred = rmin
+            elif pred > rmax:
+                pred = rmax
+
+            error = ratings[s] - pred
+            csse += error * error
+
+            umat[user, f] += (error * ifv - reg * ufv) * lrate
+            imat[item, f] += (error * ufv - reg * ifv) * lrate
+        sse += csse
+
+    return np.sqrt(sse / n_samples)
+
+
 @n.njit
 def _train_feature(ctx, params, model, fc):
     for epoch in range(params.iter_count):
@@ -164,14 +229,41 @@ def _train_feature(ctx, params, model, fc):
     return rmse
 
 
-def train(ctx: Context, params: _Params, model: Model, timer):
+@n.njit
+def _train_feature_parallel(ctx, params, model, fc, nchunks):
+    umat = model.user_features
+    imat = model.item_features
+    for epoch in range(params.iter_count):
+        rmse = _hogwild_loop(
+            ctx.users,
+            ctx.items,
+            ctx.ratings,
+            fc.est,
+            umat,
+            imat,
+            fc.feature,
+            fc.trail,
+            params,
+            nchunks,
+        )
+
+    return rmse
+
+
+def train(ctx: Context, params: _Params, model: Model, timer, parallel=False):
     est = ctx.bias
+    nchunks = n.get_num_threads()
+    if parallel:
+        _logger.info("[%s] training with %d parallel sample blocks", timer, nchunks)
 
     for f in range(model.feature_count):
         start = time.perf_counter()
         trail = model.initial_value * model.initial_value * (model.feature_count - f - 1)
         fc = _FeatContext(est, f, trail)
-        rmse = _train_feature(ctx, params, model, fc)
+        if parallel:
+            rmse = _train_feature_parallel(ctx, params, model, fc, nchunks)
+        else:
+            rmse = _train_feature(ctx, params, model, fc)
         end = time.perf_counter()
         _logger.info("[%s] finished feature %d (RMSE=%f) in %.2fs", timer, f, rmse, end - start)
 
@@ -180,25 +272,213 @@ def train(ctx: Context, params: _Params, model: Model, timer):
         est = np.minimum(est, params.rmax)
 
 
-def _align_add_bias(bias, index, keys, series):
-    "Realign a bias series with an index, and add to a series"
-    # realign bias to make sure it matches
-    bias = bias.reindex(index, fill_value=0)
-    assert len(bias) == len(index)
-    # look up bias for each key
-    ibs = bias.loc[keys]
-    # change index
-    ibs.index = keys.index
-    # and add
-    series = series + ibs
-    return bias, series
+@n.njit(parallel=True, nogil=True)
+def _joint_epoch(users, items, ratings, est, umat, imat, params, lrate, nchunks):
+    """
+    One epoch of joint SGD, updating all features for each sample.  Samples are split
+    into ``nchunks`` blocks trained lock-free in parallel, as in :func:`_hogwild_loop`;
+    with a single chunk, this is ordinary serial SGD.
+    """
+    n_samples = len(users)
+    nf = umat.shape[1]
+    reg = params.reg_term
+    bounds = np.linspace(0, n_samples, nchunks + 1).astype(np.int64)
+
+    sse = 0.0
+    for c in prange(nchunks):
+        csse = 0.0
+        for s in range(bounds[c], bounds[c + 1]):
+            user = users[s]
+            item = items[s]
+
+            pred = est[s] + np.dot(umat[user, :], imat[item, :])
+            if pred < params.rmin:
+                pred = params.rmin
+            elif pred > params.rmax:
+                pred = params.rmax
+
+            error = ratings[s] - pred
+            csse += error * error
+
+            for f in range(nf):
+                ufv = umat[user, f]
+                ifv = imat[item, f]
+                umat[user, f] += (error * ifv - reg * ufv) * lrate
+                imat[item, f] += (error * ufv - reg * ifv) * lrate
+        sse += csse
+
+    return np.sqrt(sse / n_samples)
+
+
+@n.njit(nogil=True)
+def _joint_rmse(users, items, ratings, est, umat, imat, params):
+    "Compute the RMSE of a model on a set of samples."
+    if len(users) == 0:
+        return np.nan
+    sse = 0.0
+    for s in range(len(users)):
+        pred = est[s] + np.dot(umat[users[s], :], imat[items[s], :])
+        pred = min(max(pred, params.rmin), params.rmax)
+        error = ratings[s] - pred
+        sse += error * error
+
+    return np.sqrt(sse / len(users))
+
+
+def train_joint(
+    ctx: Context,
+    params: _Params,
+    model: Model,
+    timer,
+    *,
+    decay=1.0,
+    vctx=None,
+    parallel=False,
+    patience=2,
+):
+    """
+    Train all features jointly with epoch-wise SGD.
+
+    Args:
+        ctx: the training context.
+        params: the training parameters; ``iter_count`` is the maximum number of epochs.
+        model: the model to train, with (randomly) initialized features.
+        timer: the timer for log messages.
+        decay: the multiplicative learning rate decay per epoch.
+        vctx: a validation context for early stopping; if provided, training stops when the
+            validation RMSE has not improved for ``patience`` epochs, and the model is reset
+            to the features with the best validation RMSE.
+        parallel: whether to train blocks of samples in parallel.
+    """
+    nchunks = n.get_num_threads() if parallel else 1
+    best = None
+    best_rmse = np.inf
+    stale = 0
+    lrate = params.lrate
+
+    for epoch in range(params.iter_count):
+        start = time.perf_counter()
+        rmse = _joint_epoch(
+            ctx.users,
+            ctx.items,
+            ctx.ratings,
+            ctx.bias,
+            model.user_features,
+            model.item_features,
+            params,
+            lrate,
+            nchunks,
+        )
+        end = time.perf_counter()
+        lrate *= decay
+
+        if vctx is None:
+            _logger.info(
+                "[%s] finished epoch %d (RMSE=%f) in %.2fs", timer, epoch, rmse, end - start
+            )
+            continue
+
+        v_rmse = _joint_rmse(
+            vctx.users,
+            vctx.items,
+            vctx.ratings,
+            vctx.bias,
+            model.user_features,
+            model.item_features,
+            params,
+        )
+        _logger.info(
+            "[%s] finished epoch %d (RMSE=%f, validation RMSE=%f) in %.2fs",
+            timer,
+            epoch,
+            rmse,
+            v_rmse,
+            end - start,
+        )
+        if v_rmse < best_rmse:
+            best_rmse = v_rmse
+            best = (model.user_features.copy(), model.item_features.copy())
+            stale = 0
+        else:
+            stale += 1
+            if stale >= patience:
+                _logger.info("[%s] validation RMSE stopped improving, stopping", timer)
+                break
+
+    if best is not None:
+        model.user_features[:, :] = best[0]
+        model.item_features[:, :] = best[1]
+
+
+def _prepare_data(ratings, bias, rng, shuf=None):
+    """
+    Prepare rating data for training.  Users and items are coded with :func:`pandas.factorize`,
+    and the samples are shuffled by permuting the code arrays, so the data frame itself is
+    never copied or reindexed.
+
+    Args:
+        ratings(pandas.DataFrame): the rating data.
+        bias(Bias): the (trained) bias model, or ``None``.
+        rng(numpy.random.Generator): the random generator for shuffling.
+        shuf(numpy.ndarray):
+            the sample order to use, if the caller has already shuffled the samples.
+
+    Returns:
+        tuple:
+            the shuffled user codes, item codes, rating values, and initial (bias) estimates,
+            followed by the user and item indexes.
+    """
+    ucodes, uidx = pd.factorize(ratings["user"])
+    icodes, iidx = pd.factorize(ratings["item"])
+    uidx = pd.Index(uidx)
+    iidx = pd.Index(iidx)
+
+    if shuf is None:
+        shuf = np.arange(len(ratings), dtype=np.int_)
+        rng.shuffle(shuf)
+
+    users = ucodes.astype(np.int32)[shuf]
+    del ucodes
+    items = icodes.astype(np.int32)[shuf]
+    del icodes
+    rvals = ratings["rating"].to_numpy(np.float_)[shuf]
+
+    if bias:
+        initial = np.full(len(shuf), bias.mean_, dtype=np.float_)
+        if bias.item_offsets_ is not None:
+            ioff = bias.item_offsets_.reindex(iidx, fill_value=0).to_numpy(np.float_)
+            initial += ioff[items]
+        if bias.user_offsets_ is not None:
+            uoff = bias.user_offsets_.reindex(uidx, fill_value=0).to_numpy(np.float_)
+            initial += uoff[users]
+    else:
+        initial = np.zeros(len(shuf), dtype=np.float_)
+
+    return users, items, rvals, initial, uidx, iidx
 
 
 class FunkSVD(MFPredictor):
     """
     Algorithm class implementing FunkSVD matrix factorization.  FunkSVD is a regularized
-    biased matrix factorization technique trained with featurewise stochastic gradient
-    descent.
+    biased matrix factorization technique trained with stochastic gradient descent, either
+    featurewise (as in the original FunkSVD) or on all features jointly, with optional
+    learning-rate decay and early stopping on held-out ratings.
+
+    Two training methods are supported (the ``method`` parameter):
+
+    ``'feature'`` (the default)
+        Train one feature at a time, running ``iterations`` passes over the data for each
+        feature, as in the original FunkSVD.
+    ``'joint'``
+        Train all features together, updating every feature for each sample.  Each epoch
+        is one pass over the data, so this takes ``features`` times fewer passes than
+        ``'feature'`` for the same number of iterations; features are initialized randomly,
+        ``iterations`` is the maximum number of epochs, and the learning rate is multiplied
+        by ``lrate_decay`` after each epoch.  If ``holdout`` is set, a fraction of the
+        training data is held out, training stops once the RMSE on the held-out data stops
+        improving, and the model with the best held-out RMSE is kept.  The held-out
+        ratings (at least one) are not used to fit the bias model either; with fewer than
+        two ratings, nothing is held out.
 
     See the base class :class:`.MFPredictor` for documentation on the estimated parameters
     you can extract from a trained model.
@@ -208,6 +488,13 @@ class FunkSVD(MFPredictor):
         iterations(int): the number of iterations to train each feature
         lrate(double): the learning rate
         reg(double): the regularization factor
+        method(str): the training method (see above).
+        lrate_decay(double):
+            the multiplicative decay applied to the learning rate after each epoch of
+            ``'joint'`` training.
+        holdout(double):
+            the fraction of ratings to hold out for early stopping of ``'joint'`` training,
+            or ``None`` to train for the full ``iterations``.
         damping(double): damping factor for the underlying mean
         bias(Predictor): the underlying bias model to fit.  If ``True``, then a
             :py:class:`.bias.Bias` model is fit with ``damping``.
@@ -216,6 +503,14 @@ class FunkSVD(MFPredictor):
             predictions unclamped.
         random_state:
             The random state for shuffling the data prior to training.
+        parallel(bool):
+            If ``True``, train each feature with lock-free parallel SGD ("Hogwild")
+            :cite:p:`niuHogwildLockFreeApproach2011`, splitting the shuffled samples into one block per
+            Numba thread.  Parallel training is **not deterministic**: the order in which
+            threads update shared user and item features varies from run to run, so models
+            trained with the same ``random_state`` will differ slightly (they converge to
+            models of equivalent accuracy).  With a single Numba thread, it is equivalent
+            to serial training.
     """
 
     def __init__(
@@ -229,6 +524,10 @@ class FunkSVD(MFPredictor):
         range=None,
         bias=True,
         random_state=None,
+        parallel=False,
+        method="feature",
+        lrate_decay=1.0,
+        holdout=None,
     ):
         self.features = features
         self.iterations = iterations
@@ -243,6 +542,10 @@ class FunkSVD(MFPredictor):
         else:
             self.bias = bias
         self.random = numpy_rng(random_state)
+        self.parallel = parallel
+        self.method = method
+        self.lrate_decay = lrate_decay
+        self.holdout = holdout
 
     def fit(self, ratings, **kwargs):
         """
@@ -257,44 +560,58 @@ class FunkSVD(MFPredictor):
             _logger.warning("no rating column found, assuming rating values of 1.0")
             ratings = ratings.assign(rating=1.0)
 
-        if self.bias:
-            _logger.info("[%s] fitting bias model", timer)
-            self.bias.fit(ratings)
-
-        _logger.info("[%s] preparing rating data for %d samples", timer, len(ratings))
-        _logger.debug("shuffling rating data")
         shuf = np.arange(len(ratings), dtype=np.int_)
         self.random.shuffle(shuf)
-        ratings = ratings.iloc[shuf, :]
-
-        _logger.debug("[%s] indexing users and items", timer)
-        uidx = pd.Index(ratings.user.unique())
-        iidx = pd.Index(ratings.item.unique())
-
-        users = uidx.get_indexer(ratings.user).astype(np.int32)
-        assert np.all(users >= 0)
-        items = iidx.get_indexer(ratings.item).astype(np.int32)
-        assert np.all(items >= 0)
+        n_train = len(ratings)
+        if self.method == "joint" and self.holdout:
+            # hold out the tail of the shuffled data, keeping at least one rating for each
+            n_hold = max(int(len(ratings) * self.holdout), 1)
+            if n_hold < len(ratings):
+                n_train = len(ratings) - n_hold
+            else:
+                _logger.warning("too few ratings to hold out, training without validation")
 
-        _logger.debug("[%s] computing initial estimates", timer)
         if self.bias:
-            initial = pd.Series(self.bias.mean_, index=ratings.index, dtype=np.float_)
-            ibias, initial = _align_add_bias(self.bias.item_offsets_, iidx, ratings.item, initial)
-            ubias, initial = _align_add_bias(self.bias.user_offsets_, uidx, ratings.user, initial)
-        else:
-            initial = pd.Series(0.0, index=ratings.index)
+            _logger.info("[%s] fitting bias model", timer)
+            if n_train < len(ratings):
+                self.bias.fit(ratings.iloc[shuf[:n_train]])
+            else:
+                self.bias.fit(ratings)
 
-        _logger.debug("have %d estimates for %d ratings", len(initial), len(ratings))
-        assert len(initial) == len(ratings)
+        _logger.info("[%s] preparing rating data for %d samples", timer, len(ratings))
+        users, items, rvals, ivals, uidx, iidx = _prepare_data(
+            ratings, self.bias, self.random, shuf
+        )
+        _logger.debug("[%s] prepared %d samples", timer, len(users))
 
-        _logger.debug("[%s] initializing data structures", timer)
-        context = Context(users, items, ratings.rating.astype(np.float_).values, initial.values)
         params = make_params(self.iterations, self.lrate, self.reg, self.range)
 
-        model = _fresh_model(self.features, len(uidx), len(iidx))
-
-        _logger.info("[%s] training biased MF model with %d features", timer, self.features)
-        train(context, params, model, timer)
+        if self.method == "feature":
+            context = Context(users, items, rvals, ivals)
+            model = _fresh_model(self.features, len(uidx), len(iidx))
+            _logger.info("[%s] training biased MF model with %d features", timer, self.features)
+            train(context, params, model, timer, self.parallel)
+        elif self.method == "joint":
+            vctx = None
+            if n_train < len(ratings):
+                vctx = Context(users[n_train:], items[n_train:], rvals[n_train:], ivals[n_train:])
+                _logger.info("[%s] holding out %d ratings for validation", timer, len(vctx.users))
+            context = Context(users[:n_train], items[:n_train], rvals[:n_train], ivals[:n_train])
+            model = _random_model(self.features, len(uidx), len(iidx), self.random)
+            _logger.info(
+                "[%s] training biased MF model with %d joint features", timer, self.features
+            )
+            train_joint(
+                context,
+                params,
+                model,
+                timer,
+                decay=self.lrate_decay,
+                vctx=vctx,
+                parallel=self.parallel,
+            )
+        else:
+            raise ValueError("unknown training method " + self.method)
         _logger.info("finished model training in %s", timer)
 
         self.user_index_ = uidx
@@ -304,12 +621,79 @@ class FunkSVD(MFPredictor):
 
         return self
 
+    def fold_in(self, ratings):
+        """
+        Estimate user features for many users from their ratings, holding the item features
+        fixed.  Each user's features are the regularized least-squares solution against the
+        item features, with the regularization scaled by the number of ratings as in the
+        SGD objective.  This is the point SGD on a single user's ratings converges to.  Users
+        are solved in parallel, and do not need to be in the training data.
+
+        Args:
+            ratings(pandas.DataFrame):
+                the ratings, with ``user``, ``item``, and ``rating`` columns.  Ratings for
+                items that are not in the model are only used for the user bias.
+
+        Returns:
+            FoldIn: the estimated user parameters.
+        """
+        ucodes, uidx = pd.factorize(ratings["user"])
+        uidx = pd.Index(uidx)
+        n_users = len(uidx)
+        icodes = self.item_index_.get_indexer(ratings["item"])
+        vals = ratings["rating"].to_numpy(np.float_)
+        offsets = np.zeros(n_users)
+
+        if self.bias:
+            vals = vals - self.bias.mean_
+            if self.bias.item_offsets_ is not None:
+                ioff = self.bias.item_offsets_.reindex(self.item_index_, fill_value=0)
+                ioff = ioff.to_numpy(np.float_)
+                vals[icodes >= 0] -= ioff[icodes[icodes >= 0]]
+            if self.bias.user_offsets_ is not None:
+                sums = np.bincount(ucodes, vals, minlength=n_users)
+                counts = np.bincount(ucodes, minlength=n_users)
+                damping = self.bias.user_damping
+                if damping is not None and damping > 0:
+                    counts = counts + damping
+                offsets = sums / counts
+                vals -= offsets[ucodes]
+
+        good = icodes >= 0
+        mat = CSR.from_coo(
+            ucodes[good], icodes[good], vals[good], shape=(n_users, len(self.item_index_))
+        )
+        features = np.zeros((n_users, self.features))
+        _train_matrix_lu(mat, features, self._item_matrix(), self.reg)
+
+        return FoldIn(uidx, features, offsets)
+
     def predict_for_user(self, user, items, ratings=None):
-        # look up user index
-        # look up user index
-        preds = self.score_by_ids(user, items)
-        if self.bias is not None:
-            preds = self.bias.inverse_transform_user(user, preds)
+        """
+        Predict ratings for a user.  If ``ratings`` are provided, the user's features (and
+        bias) are re-estimated from them (see :meth:`fold_in`), so users who were not in
+        the training data can receive personalized predictions.
+        """
+        if ratings is not None and len(ratings) > 0:
+            u_offset = None
+            if self.bias:
+                ratings, u_offset = self.bias.transform_user(ratings)
+
+            ri_idxes = self.item_index_.get_indexer_for(ratings.index)
+            ri_good = ri_idxes >= 0
+            if np.any(ri_good):
+                u_feat = _train_bias_row_lu(
+                    ri_idxes[ri_good], ratings.values[ri_good], self._item_matrix(), self.reg
+                )
+            else:
+                u_feat = np.zeros(self.features)
+            preds = self.score_by_ids(user, items, u_feat)
+            if self.bias is not None:
+                preds = self.bias.inverse_transform_user(user, preds, u_offset)
+        else:
+            preds = self.score_by_ids(user, items)
+            if self.bias is not None:
+                preds = self.bias.inverse_transform_user(user, preds)
 
         # clamp if suitable
         if self.range is not None:
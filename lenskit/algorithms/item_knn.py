@@ -20,7 +20,7 @@ from lenskit.data import sparse_ratings
 from lenskit.sharing import in_share_context
 from lenskit.util.parallel import is_mp_worker
 from lenskit.util.accum import kvp_minheap_insert, kvp_minheap_sort
-from . import Predictor
+from . import Predictor, map_positions
 
 _logger = logging.getLogger(__name__)
 
@@ -479,11 +479,22 @@ class ItemItem(Predictor):
         return smat
 
     def predict_for_user(self, user, items, ratings=None):
-        _logger.debug("predicting %d items for user %s", len(items), user)
+        positions = self.item_index_.get_indexer(items)
+        scores = self.predict_positions(user, self.item_index_, positions, ratings)
+        return pd.Series(scores, index=items)
+
+    def predict_positions(self, user, vocab, positions, ratings=None):
+        """
+        Compute predictions for items identified by position in an item vocabulary (see
+        :meth:`.Predictor.predict_positions`).
+        """
+        _logger.debug("predicting %d items for user %s", len(positions), user)
+        t_pos = map_positions(self.item_index_, vocab, positions)
+        results = np.full(len(t_pos), np.nan)
         if ratings is None:
             if user not in self.user_index_:
                 _logger.debug("user %s missing, returning empty predictions", user)
-                return pd.Series(np.nan, index=items)
+                return results
             upos = self.user_index_.get_loc(user)
             ratings = pd.Series(
                 self.rating_matrix_.row_vs(upos),
@@ -515,9 +526,9 @@ class ItemItem(Predictor):
 
         # set up item result vector
         # ipos will be an array of item indices
-        i_pos = self.item_index_.get_indexer(items)
-        i_pos = i_pos[i_pos >= 0]
-        _logger.debug("user %s: %d of %d requested items in model", user, len(i_pos), len(items))
+        t_good = t_pos >= 0
+        i_pos = t_pos[t_good]
+        _logger.debug("user %s: %d of %d requested items in model", user, len(i_pos), len(t_pos))
 
         # now we take a first pass through the data to count _viable_ targets
         # This computes the number of neighbors (and their weight sum) for
@@ -530,7 +541,7 @@ class ItemItem(Predictor):
         i_sums = i_sums[viable]
         i_nbrs = i_nbrs[viable]
         _logger.debug(
-            "user %s: %d of %d requested items possibly reachable", user, len(i_pos), len(items)
+            "user %s: %d of %d requested items possibly reachable", user, len(i_pos), len(t_pos)
         )
 
         # look for some fast paths
@@ -598,11 +609,10 @@ class ItemItem(Predictor):
         if self.center and self.aggregate in self.RATING_AGGS:
             iscores += self.item_means_
 
-        results = pd.Series(iscores, index=self.item_index_)
-        results = results.reindex(items, fill_value=np.nan)
+        results[t_good] = iscores[t_pos[t_good]]
 
         _logger.debug(
-            "user %s: predicted for %d of %d items", user, results.notna().sum(), len(items)
+            "user %s: predicted for %d of %d items", user, np.sum(~np.isnan(results)), len(t_pos)
         )
 
         return results
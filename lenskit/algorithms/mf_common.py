@@ -3,14 +3,209 @@ Common utilities & implementations for matrix factorization.
 """
 
 import logging
+from collections import namedtuple
 
 import numpy as np
 import pandas as pd
+from numba import njit, prange
+from seedbank import numpy_rng
 
-from . import Predictor
+from . import Predictor, map_positions
+from ..math.solve import _dposv
+from ..util.accum import kvp_minheap_insert, kvp_minheap_sort
 
 _logger = logging.getLogger(__name__)
 
+#: The default memory budget (in scores) for a block of users in :meth:`MFPredictor.recommend_topk`.
+TOPK_BLOCK_SCORES = 8 * 1024 * 1024
+
+TopKIndex = namedtuple(
+    "TopKIndex", ["centroids", "item_vectors", "cluster_ptrs", "cluster_items", "n_items"]
+)
+TopKIndex.__doc__ = """
+A clustered inner-product index over an MF model's item vectors, built by
+:meth:`MFPredictor.build_topk_index`.  Items are grouped by k-means clusters of their
+vectors; a search scores the cluster centroids for a user and then only scores the items
+in the best clusters.
+
+Attributes:
+    centroids(numpy.ndarray): the cluster centroids.
+    item_vectors(numpy.ndarray):
+        the item vectors, with an extra column for the item biases (if the model has
+        them).
+    cluster_ptrs(numpy.ndarray):
+        the start offsets of each cluster in ``cluster_items`` (plus the end offset).
+    cluster_items(numpy.ndarray): the item numbers, ordered by cluster.
+    n_items(int):
+        the number of items in the model when the index was built; searching a model whose
+        item set has since changed is an error.
+"""
+
+
+# powers of 2 for decoding half-precision exponents
+_HALF_EXP = np.ldexp(1.0, np.arange(32) - 15)
+
+
+@njit
+def _half_value(bits):
+    "Decode an IEEE half-precision float from its bits (Numba has no float16 support)."
+    sign = -1.0 if bits & 0x8000 else 1.0
+    exp = (bits >> 10) & 0x1F
+    frac = bits & 0x3FF
+    if exp == 0:
+        return sign * frac * 5.9604644775390625e-08  # 2^-24
+    elif exp == 31:
+        return sign * np.inf if frac == 0 else np.nan
+    else:
+        return sign * (1.0 + frac / 1024.0) * _HALF_EXP[exp]
+
+
+@njit(nogil=True)
+def _score_int8(codes, scales, items, uv):
+    "Score items from int8-quantized item features."
+    nf = codes.shape[1]
+    out = np.empty(len(items))
+    for j in range(len(items)):
+        i = items[j]
+        acc = 0.0
+        for k in range(nf):
+            acc += codes[i, k] * uv[k]
+        out[j] = acc * scales[i]
+    return out
+
+
+@njit(nogil=True)
+def _score_half(codes, scales, items, uv):
+    "Score items from half-precision item features, passed as a ``uint16`` view."
+    nf = codes.shape[1]
+    out = np.empty(len(items))
+    for j in range(len(items)):
+        i = items[j]
+        acc = 0.0
+        for k in range(nf):
+            acc += _half_value(codes[i, k]) * uv[k]
+        out[j] = acc * scales[i]
+    return out
+
+
+@njit(parallel=True, nogil=True)
+def _train_matrix_lu(mat, this: np.ndarray, other: np.ndarray, reg: float):
+    """
+    One half of an explicit ALS training round using LU-decomposition on the normal
+    matrices to solve the least squares problem.
+
+    Args:
+        mat: the :math:`m \\times n` matrix of ratings
+        this: the :math:`m \\times k` matrix to train
+        other: the :math:`n \\times k` matrix of sample features
+        reg: the regularization term
+    """
+    nr = mat.nrows
+    nf = other.shape[1]
+    regI = np.identity(nf) * reg
+    assert mat.ncols == other.shape[0]
+    frob = 0.0
+
+    for i in prange(nr):
+        cols = mat.row_cs(i)
+        if len(cols) == 0:
+            continue
+
+        vals = mat.row_vs(i)
+        M = other[cols, :]
+        MMT = M.T @ M
+        # assert MMT.shape[0] == ctx.n_features
+        # assert MMT.shape[1] == ctx.n_features
+        A = MMT + regI * len(cols)
+        V = M.T @ vals
+        # and solve
+        _dposv(A, V, True)
+        delta = this[i, :] - V
+        frob += np.dot(delta, delta)
+        this[i, :] = V
+
+    return np.sqrt(frob)
+
+
+@njit(nogil=True)
+def _train_bias_row_lu(items, ratings, other, reg):
+    """
+    Args:
+        items(np.ndarray[i64]): the item IDs the user has rated
+        ratings(np.ndarray): the user's (normalized) ratings for those items
+        other(np.ndarray): the item-feature matrix
+        reg(float): the regularization term
+    Returns:
+        np.ndarray: the user-feature vector (equivalent to V in the current LU code)
+    """
+    M = other[items, :]
+    nf = other.shape[1]
+    regI = np.identity(nf) * reg
+    MMT = M.T @ M
+    A = MMT + regI * len(items)
+
+    V = M.T @ ratings
+    _dposv(A, V, True)
+
+    return V
+
+
+def _user_item_lists(users, items, n_users):
+    """
+    Build a CSR-like structure of (sorted) item lists for each user, from arrays of user
+    and item numbers.
+    """
+    order = np.lexsort((items, users))
+    counts = np.bincount(users, minlength=n_users)
+    ptrs = np.zeros(n_users + 1, dtype=np.int64)
+    np.cumsum(counts, out=ptrs[1:])
+    return ptrs, items[order].astype(np.int64)
+
+
+def _kmeans(X, k, iterations, rng):
+    "Simple Lloyd's k-means, used to cluster item vectors."
+    n, d = X.shape
+    centroids = X[rng.choice(n, k, replace=False), :].copy()
+    assign = np.zeros(n, dtype=np.int64)
+    chunk = max(1, TOPK_BLOCK_SCORES // k)
+    for i in range(iterations):
+        c_norms = np.sum(np.square(centroids), axis=1)
+        for sp in range(0, n, chunk):
+            ep = min(sp + chunk, n)
+            dists = c_norms - 2 * (X[sp:ep, :] @ centroids.T)
+            assign[sp:ep] = np.argmin(dists, axis=1)
+        counts = np.bincount(assign, minlength=k)
+        sums = np.zeros((k, d))
+        np.add.at(sums, assign, X)
+        filled = counts > 0
+        centroids[filled, :] = sums[filled, :] / counts[filled].reshape(-1, 1)
+
+    return centroids, assign
+
+
+@njit(parallel=True, nogil=True)
+def _ivf_search(U, index, probe, n, ex_ptrs, ex_items, out_items, out_scores, out_counts):
+    centroids, items, cptrs, citems = index
+    for u in prange(U.shape[0]):
+        uv = U[u, :]
+        cscores = centroids @ uv
+        clusters = np.argsort(-cscores)[:probe]
+        ex = ex_items[ex_ptrs[u] : ex_ptrs[u + 1]]
+        sp = u * n
+        ep = sp
+        for c in clusters:
+            for j in range(cptrs[c], cptrs[c + 1]):
+                item = citems[j]
+                if len(ex) > 0:
+                    pos = np.searchsorted(ex, item)
+                    if pos < len(ex) and ex[pos] == item:
+                        continue
+                ep = kvp_minheap_insert(
+                    sp, ep, n, item, np.dot(items[item, :], uv), out_items, out_scores
+                )
+        kvp_minheap_sort(sp, ep, out_items, out_scores)
+        out_counts[u] = ep - sp
+
 
 class MFPredictor(Predictor):
     """
@@ -20,7 +215,13 @@ class MFPredictor(Predictor):
         user_index_(pandas.Index): Users in the model (length=:math:`m`).
         item_index_(pandas.Index): Items in the model (length=:math:`n`).
         user_features_(numpy.ndarray): The :math:`m \\times k` user-feature matrix.
-        item_features_(numpy.ndarray): The :math:`n \\times k` item-feature matrix.
+        item_features_(numpy.ndarray):
+            The :math:`n \\times k` item-feature matrix.  This is ``None`` if the item
+            features have been quantized with :meth:`quantize_items`.
+        item_codes_(numpy.ndarray):
+            The quantized item features (``int8`` or ``float16``), if quantized.
+        item_scales_(numpy.ndarray):
+            The per-item scales of the quantized item features, if quantized.
     """
 
     @property
@@ -81,9 +282,19 @@ class MFPredictor(Predictor):
 
         # get user vector
         uv = self.user_features_[user, :] if u_features is None else u_features
-        # get item matrix
-        im = self.item_features_[items, :]
-        rv = np.matmul(im, uv)
+        if self.item_features_ is None:
+            # quantized features, dequantize as we score
+            uv = np.require(uv, np.float64)
+            items = np.require(items, np.int64)
+            codes = self.item_codes_
+            if codes.dtype == np.float16:
+                rv = _score_half(codes.view(np.uint16), self.item_scales_, items, uv)
+            else:
+                rv = _score_int8(codes, self.item_scales_, items, uv)
+        else:
+            # get item matrix
+            im = self.item_features_[items, :]
+            rv = np.matmul(im, uv)
         assert rv.shape[0] == len(items)
         assert len(rv.shape) == 1
 
@@ -112,3 +323,323 @@ class MFPredictor(Predictor):
         res = pd.Series(rv, index=good_items)
         res = res.reindex(items)
         return res
+
+    def predict_positions(self, user, vocab, positions, ratings=None):
+        """
+        Compute predictions for items identified by position in an item vocabulary (see
+        :meth:`.Predictor.predict_positions`), from the user's trained features plus the
+        model's bias (if it has one).  If ``ratings`` are provided, this uses
+        :meth:`predict_for_user` so the model can fold them in.
+        """
+        if ratings is not None:
+            return super().predict_positions(user, vocab, positions, ratings)
+
+        scores = np.full(len(positions), np.nan)
+        uidx = self.lookup_user(user)
+        if uidx < 0:
+            return scores
+
+        iidx = map_positions(self.item_index_, vocab, positions)
+        good = iidx >= 0
+        scores[good] = self.score(uidx, iidx[good])
+        bias = getattr(self, "bias", None)
+        if bias:
+            scores += bias.predict_positions(user, vocab, positions)
+        return self._clamp(scores)
+
+    def quantize_items(self, mode="int8"):
+        """
+        Quantize the item-feature matrix to reduce the model's memory and storage size.
+        Each item's feature vector is divided by a per-item scale (its largest absolute
+        value, divided by 127 for ``int8``), and stored as ``item_codes_``;
+        ``item_features_`` is then set to ``None``.  Scoring dequantizes item vectors on the
+        fly, and persisting the model (e.g. with :func:`lenskit.sharing.persist`) keeps
+        the compact form.  Operations that need the full matrix, such as folding in new
+        users' ratings, dequantize it temporarily.  Any index built with
+        :meth:`build_topk_index` is discarded, and must be rebuilt from the quantized
+        features.
+
+        Args:
+            mode(str):
+                the quantization mode: ``'int8'`` (1 byte per value) or ``'float16'``
+                (2 bytes per value, more precise).
+
+        Returns:
+            MFPredictor: the model (for chaining).
+        """
+        if self.item_features_ is None:
+            raise ValueError("item features are already quantized")
+
+        feats = self.item_features_
+        scales = np.max(np.abs(feats), axis=1)
+        if mode == "int8":
+            scales /= 127.0
+            scales[scales == 0] = 1.0
+            codes = np.round(feats / scales.reshape(-1, 1)).astype(np.int8)
+        elif mode == "float16":
+            scales[scales == 0] = 1.0
+            codes = (feats / scales.reshape(-1, 1)).astype(np.float16)
+        else:
+            raise ValueError("unknown quantization mode " + mode)
+
+        _logger.info(
+            "quantized %d item features from %d to %d bytes",
+            self.n_items,
+            feats.nbytes,
+            codes.nbytes + scales.nbytes,
+        )
+        self.item_codes_ = codes
+        self.item_scales_ = scales
+        self.item_features_ = None
+        self.topk_index_ = None
+        return self
+
+    def _item_matrix(self):
+        "Get the full item-feature matrix, dequantizing it if necessary."
+        if self.item_features_ is not None:
+            return self.item_features_
+        return self.item_codes_.astype(np.float64) * self.item_scales_.reshape(-1, 1)
+
+    def _item_rows(self, items):
+        "Get the feature vectors for an array of item numbers, dequantizing if necessary."
+        if self.item_features_ is not None:
+            return self.item_features_[items, :]
+        rows = self.item_codes_[items, :].astype(np.float64)
+        rows *= self.item_scales_[items].reshape(-1, 1)
+        return rows
+
+    def predict_pairs(self, users, items):
+        """
+        Predict scores for many (user, item) pairs at once.  The scores are computed as
+        row-wise dot products of the gathered user and item vectors, in chunks, with the
+        bias (if the model has one) added back in the same vectorized pass.
+        :meth:`Predictor.predict` uses this automatically.
+
+        Args:
+            users(array-like): the user IDs.
+            items(array-like): the item IDs (the same length as ``users``).
+
+        Returns:
+            numpy.ndarray:
+                the predictions, with NaN for pairs whose user or item is not in the
+                model.
+        """
+        uidx = self.user_index_.get_indexer(users)
+        iidx = self.item_index_.get_indexer(items)
+        good = np.flatnonzero((uidx >= 0) & (iidx >= 0))
+        _logger.debug("predicting %d pairs (%d valid)", len(uidx), len(good))
+        preds = np.full(len(uidx), np.nan)
+        ibias, ubias = self._bias_vectors()
+
+        chunk = max(1, TOPK_BLOCK_SCORES // max(self.n_features, 1))
+        for sp in range(0, len(good), chunk):
+            pos = good[sp : sp + chunk]
+            cu = uidx[pos]
+            ci = iidx[pos]
+            scores = np.einsum("ij,ij->i", self.user_features_[cu, :], self._item_rows(ci))
+            if ibias is not None:
+                scores += ibias[ci]
+                scores += ubias[cu]
+            preds[pos] = scores
+
+        return self._clamp(preds)
+
+    def _bias_vectors(self):
+        """
+        Get the model's bias terms as arrays aligned with its user and item indexes, for
+        vectorized scoring.
+
+        Returns:
+            tuple:
+                the item biases (including the global mean) and the user biases, or
+                ``(None, None)`` if the model has no bias.
+        """
+        bias = getattr(self, "bias", None)
+        if not bias:
+            return None, None
+
+        ibias = np.full(self.n_items, bias.mean_)
+        if bias.item_offsets_ is not None:
+            ibias += bias.item_offsets_.reindex(self.item_index_, fill_value=0).to_numpy()
+        ubias = np.zeros(self.n_users)
+        if bias.user_offsets_ is not None:
+            ubias += bias.user_offsets_.reindex(self.user_index_, fill_value=0).to_numpy()
+        return ibias, ubias
+
+    def _clamp(self, scores):
+        "Clamp scores to the model's rating range, if it has one."
+        range = getattr(self, "range", None)
+        if range is not None:
+            rmin, rmax = range
+            scores = np.clip(scores, rmin, rmax)
+        return scores
+
+    def build_topk_index(self, clusters=None, *, iterations=10, rng_spec=None):
+        """
+        Build a clustered index for approximate top-*k* retrieval with
+        :meth:`recommend_topk`.  Item vectors (extended with the item biases, if any) are
+        clustered with k-means, so a search only needs to score the items in the clusters
+        whose centroids score best for the user.
+
+        Args:
+            clusters(int):
+                the number of clusters; defaults to the square root of the number of
+                items.
+            iterations(int): the number of k-means iterations.
+            rng_spec: the random seed or generator for initializing the clusters.
+
+        Returns:
+            TopKIndex: the index, which is also stored in ``topk_index_``.
+        """
+        rng = numpy_rng(rng_spec)
+        ibias, _ubias = self._bias_vectors()
+        vectors = self._item_matrix()
+        if ibias is not None:
+            vectors = np.hstack([vectors, ibias.reshape(-1, 1)])
+        vectors = np.require(vectors, np.float64, "C")
+
+        if clusters is None:
+            clusters = int(np.ceil(np.sqrt(self.n_items)))
+        clusters = min(clusters, self.n_items)
+        _logger.info("clustering %d items into %d clusters", self.n_items, clusters)
+        centroids, assign = _kmeans(vectors, clusters, iterations, rng)
+
+        counts = np.bincount(assign, minlength=clusters)
+        ptrs = np.zeros(clusters + 1, dtype=np.int64)
+        np.cumsum(counts, out=ptrs[1:])
+        order = np.argsort(assign, kind="stable")
+
+        self.topk_index_ = TopKIndex(centroids, vectors, ptrs, order, self.n_items)
+        return self.topk_index_
+
+    def recommend_topk(
+        self, users, n, exclude=None, *, approximate=False, probe=None, batch_size=None
+    ):
+        """
+        Recommend the top-*n* items for many users at once.  Items are ranked by their
+        predicted scores (including item biases, if the model has a bias).
+
+        By default, this computes exact scores for blocks of users with a single matrix
+        product and selects the top items with :func:`numpy.argpartition`.  With
+        ``approximate=True``, it instead searches the clustered index built by
+        :meth:`build_topk_index`, which is much faster for very large catalogs but may miss
+        some of the true top items.
+
+        Args:
+            users(array-like): the user IDs to recommend for.  Users not in the model
+                receive no recommendations.
+            n(int): the number of items to recommend for each user.
+            exclude(pandas.DataFrame):
+                (user, item) pairs that should not be recommended, such as the users'
+                training ratings; must have ``user`` and ``item`` columns.
+            approximate(bool): use the approximate index.
+            probe(int):
+                the number of clusters to search for approximate retrieval; defaults to
+                1/8 of the clusters.
+            batch_size(int):
+                the number of users to score at a time in exact retrieval; by default,
+                chosen to keep the score block at about 64MiB.
+
+        Returns:
+            pandas.DataFrame:
+                the recommendations, with columns ``user``, ``item``, ``score``, and
+                ``rank``, sorted by user (in the order of ``users``) and rank.
+        """
+        users = pd.unique(np.asarray(users))
+        uidx = self.user_index_.get_indexer(users)
+        known = uidx >= 0
+        users = users[known]
+        uidx = uidx[known]
+        n_req = len(users)
+        n = min(n, self.n_items)
+
+        if exclude is not None:
+            ex_u = pd.Index(users).get_indexer(exclude["user"])
+            ex_i = self.item_index_.get_indexer(exclude["item"])
+            mask = (ex_u >= 0) & (ex_i >= 0)
+            ex_ptrs, ex_items = _user_item_lists(ex_u[mask], ex_i[mask], n_req)
+        else:
+            ex_ptrs = np.zeros(n_req + 1, dtype=np.int64)
+            ex_items = np.zeros(0, dtype=np.int64)
+
+        if approximate:
+            items, scores, counts = self._topk_approx(uidx, n, ex_ptrs, ex_items, probe)
+        else:
+            items, scores, counts = self._topk_exact(uidx, n, ex_ptrs, ex_items, batch_size)
+
+        ibias, ubias = self._bias_vectors()
+        if ubias is not None:
+            scores += np.repeat(ubias[uidx], counts)
+        scores = self._clamp(scores)
+
+        starts = np.repeat(np.cumsum(counts) - counts, counts)
+        return pd.DataFrame(
+            {
+                "user": np.repeat(users, counts),
+                "item": self.item_index_.values[items],
+                "score": scores,
+                "rank": np.arange(len(items)) - starts + 1,
+            }
+        )
+
+    def _topk_exact(self, uidx, n, ex_ptrs, ex_items, batch_size):
+        n_req = len(uidx)
+        ibias, _ubias = self._bias_vectors()
+        if batch_size is None:
+            batch_size = max(1, TOPK_BLOCK_SCORES // max(self.n_items, 1))
+        Q = self._item_matrix()
+
+        items = np.empty((n_req, n), dtype=np.int64)
+        scores = np.empty((n_req, n))
+        for sp in range(0, n_req, batch_size):
+            ep = min(sp + batch_size, n_req)
+            block = self.user_features_[uidx[sp:ep], :] @ Q.T
+            if ibias is not None:
+                block += ibias
+
+            # mask out excluded items
+            b_ptrs = ex_ptrs[sp : ep + 1]
+            rows = np.repeat(np.arange(ep - sp), np.diff(b_ptrs))
+            block[rows, ex_items[b_ptrs[0] : b_ptrs[-1]]] = -np.inf
+
+            if n < self.n_items:
+                top = np.argpartition(-block, n - 1, axis=1)[:, :n]
+            else:
+                top = np.broadcast_to(np.arange(n), (ep - sp, n))
+            tscores = np.take_along_axis(block, top, axis=1)
+            order = np.argsort(-tscores, axis=1, kind="stable")
+            items[sp:ep, :] = np.take_along_axis(top, order, axis=1)
+            scores[sp:ep, :] = np.take_along_axis(tscores, order, axis=1)
+
+        valid = np.isfinite(scores)
+        return items[valid], scores[valid], np.sum(valid, axis=1)
+
+    def _topk_approx(self, uidx, n, ex_ptrs, ex_items, probe):
+        index = getattr(self, "topk_index_", None)
+        if index is None:
+            raise ValueError("approximate retrieval requires build_topk_index()")
+        if index.n_items != self.n_items:
+            raise ValueError(
+                "top-k index has {} items, but model has {}; rebuild it".format(
+                    index.n_items, self.n_items
+                )
+            )
+        n_clusters = len(index.centroids)
+        if probe is None:
+            probe = max(1, n_clusters // 8)
+        probe = min(probe, n_clusters)
+
+        U = self.user_features_[uidx, :]
+        if index.item_vectors.shape[1] > U.shape[1]:
+            U = np.hstack([U, np.ones((len(uidx), 1))])
+        U = np.require(U, np.float64, "C")
+
+        n_req = len(uidx)
+        items = np.zeros(n_req * n, dtype=np.int64)
+        scores = np.full(n_req * n, -np.inf)
+        counts = np.zeros(n_req, dtype=np.int64)
+        _ivf_search(U, tuple(index[:4]), probe, n, ex_ptrs, ex_items, items, scores, counts)
+
+        valid = np.arange(n).reshape(1, -1) < counts.reshape(-1, 1)
+        valid = valid.ravel()
+        return items[valid], scores[valid], counts
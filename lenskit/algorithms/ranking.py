@@ -3,15 +3,90 @@ Algorithms to rank items based on scores.
 """
 
 import logging
+from collections import namedtuple
 
 import numpy as np
+import pandas as pd
+from numba import njit, prange
 
-from . import Recommender, Predictor
+from . import Recommender, Predictor, map_positions
 from ..util import derivable_rng
+from ..util.accum import kvp_minheap_insert, kvp_minheap_sort
+from ..util.random import splitmix64_uniform
 
 _log = logging.getLogger(__name__)
 
 
+class RecBatch(namedtuple("RecBatch", ["users", "offsets", "items", "scores"])):
+    """
+    Recommendations for a batch of users, stored as flat arrays, as returned by the
+    ``recommend_batch`` methods of recommenders that support it (such as
+    :meth:`.Popular.recommend_batch`).  The recommendations for ``users[i]`` are
+    ``items[offsets[i]:offsets[i+1]]``, in rank order.
+    :func:`lenskit.batch.recommend` uses ``recommend_batch`` when it is available.
+
+    Attributes:
+        users(numpy.ndarray): the user IDs.
+        offsets(numpy.ndarray):
+            the start offset of each user's recommendations (plus the end offset).
+        items(numpy.ndarray): the recommended item IDs.
+        scores(numpy.ndarray): the item scores (or ``None``).
+    """
+
+    __slots__ = ()
+
+    def to_frame(self):
+        """
+        Convert the batch to a data frame with ``item``, ``score`` (if available),
+        ``user``, and ``rank`` columns, in the same layout as :func:`lenskit.batch.recommend`.
+        """
+        counts = np.diff(self.offsets)
+        df = pd.DataFrame({"item": self.items})
+        if self.scores is not None:
+            df["score"] = self.scores
+        df["user"] = np.repeat(self.users, counts)
+        starts = np.repeat(self.offsets[:-1], counts)
+        df["rank"] = np.arange(len(self.items)) - starts + 1
+        return df
+
+
+def top_n_positions(scores, n=None):
+    """
+    Select the positions of the highest scores in an array, in decreasing order of score.
+    NaN scores are skipped, and ties are broken by position (as with
+    :meth:`pandas.Series.nlargest`).  The top *n* are selected with
+    :func:`numpy.argpartition`, so only the selected scores are sorted.
+
+    Args:
+        scores(numpy.ndarray): the scores.
+        n(int): the number of positions to select (``None`` for all non-NaN scores).
+
+    Returns:
+        numpy.ndarray: the positions of the top-*n* scores.
+    """
+    valid = np.flatnonzero(~np.isnan(scores))
+    if len(valid) < len(scores):
+        vals = scores[valid]
+    else:
+        valid = None
+        vals = scores
+
+    if n is not None and n < len(vals):
+        if n <= 0:
+            return np.zeros(0, dtype=np.intp)
+        # the n-th largest score; keep everything above it, and the first ties
+        part = np.argpartition(-vals, n - 1)
+        kth = vals[part[n - 1]]
+        above = part[:n][vals[part[:n]] > kth]
+        ties = np.flatnonzero(vals == kth)[: n - len(above)]
+        sel = np.concatenate([above, ties])
+        sel = sel[np.lexsort((sel, -vals[sel]))]
+    else:
+        sel = np.argsort(-vals, kind="stable")
+
+    return sel if valid is None else valid[sel]
+
+
 class TopN(Recommender, Predictor):
     """
     Basic recommender that implements top-N recommendation using a predictor.
@@ -72,18 +147,35 @@ class TopN(Recommender, Predictor):
         self.predictor = pred
 
     def recommend(self, user, n=None, candidates=None, ratings=None):
+        items, scores = self.recommend_arrays(user, n, candidates, ratings)
+        return pd.DataFrame({"item": items, "score": scores})
+
+    def recommend_arrays(self, user, n=None, candidates=None, ratings=None):
+        """
+        Compute recommendations for a user as arrays, without building a data frame.
+        Takes the same arguments as :meth:`recommend`.
+
+        If no candidates are given and the selector has an item vocabulary (see
+        :meth:`.CandidateSelector.item_vocabulary`), candidates are selected and scored as
+        item positions with :meth:`.Predictor.predict_positions`.
+
+        Returns:
+            tuple: arrays of the recommended items and their scores, in rank order.
+        """
         if candidates is None:
+            vocab = self.selector.item_vocabulary()
+            if vocab is not None:
+                positions = self.selector.candidate_positions(user, ratings)
+                scores = self.predictor.predict_positions(user, vocab, positions, ratings)
+                top = top_n_positions(scores, n)
+                return vocab.values[positions[top]], scores[top]
+
             candidates = self.selector.candidates(user, ratings)
 
         scores = self.predictor.predict_for_user(user, candidates, ratings)
-        scores = scores[scores.notna()]
-        if n is not None:
-            scores = scores.nlargest(n)
-        else:
-            scores = scores.sort_values(ascending=False)
-        scores.name = "score"
-        scores.index.name = "item"
-        return scores.reset_index()
+        values = scores.values
+        top = top_n_positions(values, n)
+        return scores.index.values[top], values[top]
 
     def predict(self, pairs, ratings=None):
         return self.predictor.predict(pairs, ratings)
@@ -91,6 +183,9 @@ class TopN(Recommender, Predictor):
     def predict_for_user(self, user, items, ratings=None):
         return self.predictor.predict_for_user(user, items, ratings)
 
+    def predict_positions(self, user, vocab, positions, ratings=None):
+        return self.predictor.predict_positions(user, vocab, positions, ratings)
+
     def __str__(self):
         return "TopN/" + str(self.predictor)
 
@@ -101,6 +196,12 @@ class PlackettLuce(Recommender):
     This uses the Gumbel trick :cite:p:`Grover2019-nc` to efficiently simulate from a Plackett-Luce
     distribution.
 
+    Rankings are sampled in compiled code, with Gumbel noise drawn from a SplitMix64 stream
+    for each user (see :func:`lenskit.util.random.splitmix64`).  :meth:`rerank_batch`
+    samples rankings for a whole block of users at once, optionally several per user, and
+    :meth:`recommend_batch` uses it to recommend for many users.  With a ``'user'``
+    RNG spec, each user's rankings depend only on the seed and the user ID.
+
     Args:
         predictor(Predictor):
             A predictor that can score candidate items.
@@ -111,6 +212,11 @@ class PlackettLuce(Recommender):
             A random number generator specification; see :py:func:`derivable_rng`.
     """
 
+    BLOCK_VALUES = 8 * 1024 * 1024
+    """
+    The maximum number of scores in a user-by-item block in :meth:`recommend_batch`.
+    """
+
     def __init__(self, predictor, selector=None, *, rng_spec=None):
         from .basic import UnratedItemCandidateSelector, Popular
 
@@ -130,20 +236,375 @@ class PlackettLuce(Recommender):
         return self
 
     def recommend(self, user, n=None, candidates=None, ratings=None):
-        if candidates is None:
-            candidates = self.selector.candidates(user, ratings)
+        vocab = self.selector.item_vocabulary() if candidates is None else None
+        if vocab is not None:
+            positions = self.selector.candidate_positions(user, ratings)
+            items = vocab.values[positions]
+            scores = self.predictor.predict_positions(user, vocab, positions)
+        else:
+            if candidates is None:
+                candidates = self.selector.candidates(user, ratings)
+            scores = self.predictor.predict_for_user(user, candidates)
+            items = scores.index.values
+            scores = scores.values
+
+        recs = self.rerank_batch([user], items, scores.reshape(1, -1), n)
+        return pd.DataFrame({"item": recs.items, "score": recs.scores})
 
-        rng = self.rng_(user)
+    def recommend_batch(self, users, n=None, samples=1):
+        """
+        Recommend for many users at once, with each user's default candidates.
 
-        scores = self.predictor.predict_for_user(user, candidates)
-        scores = scores.dropna()
-        adjs = rng.gumbel(size=len(scores))
-        scores = np.log(scores) + adjs
+        Args:
+            users(array-like): the user IDs.
+            n(int): the number of recommendations per ranking (``None`` for unlimited).
+            samples(int): the number of rankings to sample for each user.
+
+        Returns:
+            RecBatch:
+                the recommendations; with multiple samples, each user appears ``samples``
+                times in a row (see :meth:`rerank_batch`).
+        """
+        users = np.asarray(users)
+        vocab = self.selector.item_vocabulary()
+        if vocab is None:
+            batches = []
+            for u in users:
+                scores = self.predictor.predict_for_user(u, self.selector.candidates(u))
+                batches.append(
+                    self.rerank_batch(
+                        [u], scores.index.values, scores.values.reshape(1, -1), n, samples
+                    )
+                )
+            return _concat_batches(batches, users)
+
+        n_items = len(vocab)
+        bsize = max(self.BLOCK_VALUES // max(n_items, 1), 1)
+        batches = []
+        for start in range(0, len(users), bsize):
+            b_users = users[start : start + bsize]
+            block = np.full((len(b_users), n_items), np.nan)
+            for i, u in enumerate(b_users):
+                positions = self.selector.candidate_positions(u)
+                block[i, positions] = self.predictor.predict_positions(u, vocab, positions)
+            batches.append(self.rerank_batch(b_users, vocab.values, block, n, samples))
+
+        return _concat_batches(batches, users)
+
+    def rerank_batch(self, users, items, scores, n=None, samples=1):
+        """
+        Sample Plackett-Luce rankings for a block of users from their candidate scores.
+        The Gumbel noise for all users is drawn in one pass of compiled code, from each
+        user's random stream, and each ranking is selected with a bounded heap.
 
+        Args:
+            users(array-like): the user IDs (one per row of ``scores``).
+            items(array-like): the candidate item IDs (one per column of ``scores``).
+            scores(numpy.ndarray):
+                a user-by-candidate score matrix, with NaN for items that are not
+                candidates for a user.
+            n(int): the number of items per ranking (``None`` for all candidates).
+            samples(int): the number of rankings to sample for each user.
+
+        Returns:
+            RecBatch:
+                the sampled rankings, with the perturbed log scores as their scores.  Each
+                user appears ``samples`` times in a row, once per ranking.
+        """
+        users = np.asarray(users)
+        items = np.asarray(items)
+        # items with negative scores have no Plackett-Luce probability, and are skipped
+        with np.errstate(invalid="ignore", divide="ignore"):
+            scores = np.log(np.asarray(scores, dtype=np.float64))
+        n_users, n_cands = scores.shape
+        if len(users) != n_users or len(items) != n_cands:
+            raise ValueError("score block does not match users and items")
+
+        counts = np.sum(~np.isnan(scores), axis=1)
         if n is not None:
-            scores = scores.nlargest(n)
+            counts = np.minimum(counts, n)
+        counts = np.repeat(counts, samples)
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        seeds = self.rng_.stream_seeds(users)
+        positions = np.empty(offsets[-1], dtype=np.int64)
+        values = np.empty(offsets[-1])
+        _pl_sample(scores, seeds, samples, offsets, positions, values)
+        return RecBatch(np.repeat(users, samples), offsets, items[positions], values)
+
+
+def _concat_batches(batches, users):
+    "Concatenate batches of recommendations for consecutive blocks of users."
+    if not batches:
+        return RecBatch(users, np.zeros(1, dtype=np.int64), np.zeros(0), np.zeros(0))
+
+    offsets = [np.zeros(1, dtype=np.int64)]
+    base = 0
+    for b in batches:
+        offsets.append(b.offsets[1:] + base)
+        base += b.offsets[-1]
+    return RecBatch(
+        np.concatenate([b.users for b in batches]),
+        np.concatenate(offsets),
+        np.concatenate([b.items for b in batches]),
+        np.concatenate([b.scores for b in batches]),
+    )
+
+
+@njit(parallel=True, nogil=True)
+def _pl_sample(scores, seeds, samples, offsets, positions, values):
+    """
+    Sample Plackett-Luce rankings with the Gumbel trick.  Each user's row of log scores is
+    perturbed with Gumbel noise from the user's SplitMix64 stream, and the top
+    ``offsets[r+1] - offsets[r]`` perturbed scores for each ranking ``r`` are selected
+    with a min-heap.  NaN scores are skipped.
+    """
+    n_users, n_cands = scores.shape
+    for i in prange(n_users):
+        state = seeds[i]
+        for s in range(samples):
+            r = i * samples + s
+            sp = offsets[r]
+            limit = offsets[r + 1] - sp
+            ep = sp
+            for j in range(n_cands):
+                v = scores[i, j]
+                if np.isnan(v):
+                    continue
+                state, u = splitmix64_uniform(state)
+                # shift to (0, 1) so the noise is finite
+                g = -np.log(-np.log(u + 2.0**-53))
+                if limit > 0:
+                    ep = kvp_minheap_insert(sp, ep, limit, j, v + g, positions, values)
+            kvp_minheap_sort(sp, ep, positions, values)
+
+
+def mmr_positions(scores, n, vectors, lambda_=0.5, rows=None, bound=None):
+    """
+    Select positions by maximal marginal relevance (MMR)
+    :cite:p:`carbonellUseMMRDiversitybased1998`.  Positions are selected greedily, each
+    maximizing
+
+    .. math::
+        \\lambda s_i - (1 - \\lambda) \\max \\left(0, \\max_{j \\in S} \\mathrm{sim}(i, j)\\right)
+
+    where :math:`S` is the set of positions selected so far.  NaN scores are skipped, and
+    ties are broken by position.
+
+    Selection runs in compiled code.  Each candidate's maximum similarity to the selected
+    items is updated incrementally as items are selected, and candidates whose MMR score
+    falls below a bound that some unselected candidate always meets are pruned, since MMR
+    scores never increase.
+
+    Args:
+        scores(numpy.ndarray): the candidate relevance scores.
+        n(int): the number of positions to select (``None`` for all non-NaN scores).
+        vectors(numpy.ndarray or csr.CSR):
+            the item similarity source: either a dense matrix of item vectors, whose dot
+            products are the similarities (normalize the rows for cosine similarity), or a
+            sparse item-item similarity matrix (such as :attr:`.ItemItem.sim_matrix_`),
+            where :math:`\\mathrm{sim}(i, j)` is the entry for :math:`i` in the row of
+            :math:`j`.
+        lambda_(float): the relevance weight :math:`\\lambda`, between 0 and 1.
+        rows(numpy.ndarray):
+            the row of ``vectors`` for each score (defaults to the score's position).
+            Items with negative rows are not similar to any item.
+        bound(float):
+            an upper bound on the similarities, used for pruning; if ``None``, it is
+            computed from ``vectors``.  Pass it when re-ranking many lists with large
+            similarity matrices.
+
+    Returns:
+        numpy.ndarray: the selected positions, in order of selection.
+    """
+    if not 0 <= lambda_ <= 1:
+        raise ValueError("MMR relevance weight must be between 0 and 1")
+
+    scores = np.asarray(scores, dtype=np.float64)
+    rows = np.arange(len(scores)) if rows is None else np.asarray(rows, dtype=np.int64)
+    valid = np.flatnonzero(~np.isnan(scores))
+    rel = scores[valid]
+    rows = rows[valid]
+    if n is None or n > len(rel):
+        n = len(rel)
+
+    if isinstance(vectors, np.ndarray):
+        vecs = np.require(vectors, np.float64, "C")
+        if bound is None:
+            known = rows[rows >= 0]
+            bound = np.max(np.sum(np.square(vecs[known]), axis=1)) if len(known) else 0.0
+        update = _mmr_dense_update
+        sdata = (vecs, rows)
+    else:
+        slots = np.full(vectors.nrows, -1, dtype=np.int64)
+        slots[rows[rows >= 0]] = np.flatnonzero(rows >= 0)
+        values = vectors.values
+        if values is None:
+            values = np.ones(vectors.nnz)
+        if bound is None:
+            bound = np.max(values) if len(values) else 0.0
+        update = _mmr_sparse_update
+        sdata = (vectors.rowptrs, vectors.colinds, values, rows, slots)
+
+    out = np.empty(n, dtype=np.int64)
+    _mmr_select(rel, n, lambda_, max(bound, 0.0), update, sdata, out)
+    return valid[out]
+
+
+class MMR(Recommender):
+    """
+    Re-ranking algorithm that diversifies recommendations with maximal marginal relevance
+    (see :func:`mmr_positions`).  Item similarities are taken from the predictor when it
+    is fit: an :class:`.ItemItem` predictor's similarity matrix, or the cosine similarities
+    of a matrix factorization predictor's item feature vectors.
+
+    Relevance scores are the predictor's scores, so ``lambda_`` should account for their
+    scale relative to the similarities (at most 1).
+
+    Args:
+        predictor(Predictor):
+            A predictor that can score candidate items, with item feature vectors or an
+            item similarity matrix.
+        selector(CandidateSelector):
+            The candidate selector.
+            If ``None``, defaults to :py:class:`UnratedItemsCandidateSelector`.
+        lambda_(float):
+            The relevance weight, between 0 and 1; the weight of the diversity penalty is
+            ``1 - lambda_``.
+
+    Attributes:
+        item_index_(pandas.Index): the items with similarity information.
+        item_vectors_(numpy.ndarray or csr.CSR):
+            the normalized item vectors, or the item similarity matrix.
+    """
+
+    def __init__(self, predictor, selector=None, *, lambda_=0.5):
+        from .basic import UnratedItemCandidateSelector
+
+        if not 0 <= lambda_ <= 1:
+            raise ValueError("MMR relevance weight must be between 0 and 1")
+
+        self.predictor = predictor
+        self.selector = selector if selector is not None else UnratedItemCandidateSelector()
+        self.lambda_ = lambda_
+
+    def fit(self, ratings, **kwargs):
+        from .mf_common import MFPredictor
+
+        self.predictor.fit(ratings, **kwargs)
+        self.selector.fit(ratings, **kwargs)
+
+        pred = self.predictor
+        if hasattr(pred, "sim_matrix_"):
+            self.item_vectors_ = pred.sim_matrix_
+            values = pred.sim_matrix_.values
+            self._sim_bound = np.max(values) if values is not None and len(values) else 1.0
+        elif isinstance(pred, MFPredictor):
+            vecs = pred._item_matrix()
+            norms = np.linalg.norm(vecs, axis=1)
+            norms[norms == 0] = 1
+            self.item_vectors_ = vecs / norms.reshape(-1, 1)
+            self._sim_bound = np.max(np.sum(np.square(self.item_vectors_), axis=1))
+        else:
+            raise ValueError("MMR requires an item similarity matrix or item features")
+        self.item_index_ = pred.item_index_
+
+        return self
+
+    def recommend(self, user, n=None, candidates=None, ratings=None):
+        vocab = self.selector.item_vocabulary() if candidates is None else None
+        if vocab is not None:
+            positions = self.selector.candidate_positions(user, ratings)
+            items = vocab.values[positions]
+            scores = self.predictor.predict_positions(user, vocab, positions, ratings)
+            rows = map_positions(self.item_index_, vocab, positions)
         else:
-            scores = scores.sort_values(ascending=False)
-        scores.name = "score"
-        scores.index.name = "item"
-        return scores.reset_index()
+            if candidates is None:
+                candidates = self.selector.candidates(user, ratings)
+            scores = self.predictor.predict_for_user(user, candidates, ratings)
+            items = scores.index.values
+            scores = scores.values
+            rows = self.item_index_.get_indexer(items)
+
+        sel = mmr_positions(
+            scores, n, self.item_vectors_, self.lambda_, rows, bound=self._sim_bound
+        )
+        return pd.DataFrame({"item": items[sel], "score": scores[sel]})
+
+    def __str__(self):
+        return "MMR/" + str(self.predictor)
+
+
+@njit(nogil=True)
+def _mmr_select(rel, n, lam, bound, update, sdata, out):
+    """
+    Greedily select ``n`` candidates by MMR.  ``update(sdata, s, active, maxsim)`` raises
+    the max-similarity of the active candidates to their similarity to a newly-selected
+    candidate ``s``; ``bound`` is an upper bound on similarities.
+    """
+    n_c = len(rel)
+    maxsim = np.zeros(n_c)
+    active = np.arange(n_c)
+    n_act = n_c
+
+    # Some candidate in the top n by score lower bound is always unselected, so every
+    # selection scores at least the n-th largest lower bound; since MMR scores never
+    # increase, a candidate scoring below that can be dropped.
+    if n < n_c:
+        lbs = lam * rel - (1 - lam) * bound
+        floor = np.partition(lbs, n_c - n)[n_c - n]
+    else:
+        floor = -np.inf
+
+    for k in range(n):
+        best = -1
+        best_j = -1
+        best_v = -np.inf
+        j = 0
+        for a in range(n_act):
+            c = active[a]
+            v = lam * rel[c] - (1 - lam) * maxsim[c]
+            if v < floor:
+                continue
+            active[j] = c
+            if best < 0 or v > best_v:
+                best = c
+                best_j = j
+                best_v = v
+            j += 1
+
+        out[k] = best
+        for a in range(best_j + 1, j):
+            active[a - 1] = active[a]
+        n_act = j - 1
+        update(sdata, best, active[:n_act], maxsim)
+
+
+@njit(nogil=True)
+def _mmr_dense_update(sdata, s, active, maxsim):
+    vecs, rows = sdata
+    rs = rows[s]
+    if rs < 0:
+        return
+    vs = vecs[rs]
+    for c in active:
+        rc = rows[c]
+        if rc >= 0:
+            sim = 0.0
+            for f in range(len(vs)):
+                sim += vs[f] * vecs[rc, f]
+            if sim > maxsim[c]:
+                maxsim[c] = sim
+
+
+@njit(nogil=True)
+def _mmr_sparse_update(sdata, s, active, maxsim):
+    rowptrs, colinds, values, rows, slots = sdata
+    rs = rows[s]
+    if rs < 0:
+        return
+    for k in range(rowptrs[rs], rowptrs[rs + 1]):
+        c = slots[colinds[k]]
+        if c >= 0 and values[k] > maxsim[c]:
+            maxsim[c] = values[k]
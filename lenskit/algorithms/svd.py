@@ -1,7 +1,7 @@
 import logging
 
-import pandas as pd
 import numpy as np
+import pandas as pd
 
 try:
     from sklearn.decomposition import TruncatedSVD
@@ -11,20 +11,32 @@ except ImportError:
     TruncatedSVD = None
     SKL_AVAILABLE = False
 
-from . import Predictor
 from .bias import Bias
+from .mf_common import MFPredictor
 from ..data import sparse_ratings
 from ..util import Stopwatch
 
 _log = logging.getLogger(__name__)
 
+#: The memory budget (in values) for a dense block of new users' residuals in
+#: :meth:`BiasedSVD.partial_fit`.
+UPDATE_BLOCK_VALUES = 8 * 1024 * 1024
 
-class BiasedSVD(Predictor):
+
+class BiasedSVD(MFPredictor):
     """
     Biased matrix factorization for implicit feedback using SciKit-Learn's SVD
     solver (:class:`sklearn.decomposition.TruncatedSVD`).  It operates by first
     computing the bias, then computing the SVD of the bias residuals.
 
+    The transformed user rows and the SVD components (transposed to an item-feature
+    matrix) are stored as the user and item features of an :class:`.MFPredictor`, so
+    predictions only compute the requested items' scores, and the batch scoring and
+    top-*N* methods of :class:`.MFPredictor` are available.
+
+    New users (and new items they rate) can be added between full refits with
+    :meth:`partial_fit`, which updates the truncated SVD in place.
+
     You'll generally want one of the iterative SVD implementations such as
     :class:`lennskit.algorithms.als.BiasedMF`; this is here primarily as an
     example and for cases where you want to evaluate a pure SVD implementation.
@@ -49,38 +61,150 @@ class BiasedSVD(Predictor):
         i_bias = self.bias.item_offsets_
 
         _log.info("[%s] sparsifying and normalizing matrix", timer)
-        r_mat, users, items = sparse_ratings(ratings, users=u_bias.index, items=i_bias.index)
+        r_mat, users, items = sparse_ratings(
+            ratings,
+            users=u_bias.index if u_bias is not None else None,
+            items=i_bias.index if i_bias is not None else None,
+        )
         # global
         r_mat.values -= g_bias
-        r_mat.values -= i_bias.values[r_mat.colinds]
-        r_mat.values -= u_bias.values[r_mat.rowinds()]
+        if i_bias is not None:
+            r_mat.values -= i_bias.values[r_mat.colinds]
+        if u_bias is not None:
+            r_mat.values -= u_bias.values[r_mat.rowinds()]
         r_mat = r_mat.to_scipy()
-        assert r_mat.shape == (len(u_bias), len(i_bias))
+        assert r_mat.shape == (len(users), len(items))
 
         _log.info("[%s] training SVD (k=%d)", timer, self.factorization.n_components)
         Xt = self.factorization.fit_transform(r_mat)
-        self.user_components_ = Xt
+        self.user_index_ = users
+        self.item_index_ = items
+        self.user_features_ = Xt
+        self.item_features_ = np.ascontiguousarray(self.factorization.components_.T)
         _log.info("finished model training in %s", timer)
+        return self
+
+    def partial_fit(self, ratings, **kwargs):
+        """
+        Add new users to a trained model without recomputing the SVD.  The new users'
+        residuals are appended to the factorized matrix as new rows (with new columns for
+        previously-unseen items), and the rank-*k* SVD is updated with the thin SVD
+        row-update of :cite:t:`brandFastLowrankModifications2006`, in blocks of users.
+
+        The bias model is extended rather than re-estimated: new users and items get
+        (damped) offsets computed from these ratings, and existing item offsets and the
+        global mean are unchanged.  The result therefore drifts from what :meth:`fit`
+        would compute as more users are added; refit periodically.  If the model has not
+        been trained, this calls :meth:`fit`.
+
+        Args:
+            ratings(pandas.DataFrame):
+                ratings from users who are not in the model, with ``user``, ``item``, and
+                ``rating`` columns.
+
+        Returns:
+            BiasedSVD: the updated model.
+        """
+        if not hasattr(self, "user_index_"):
+            return self.fit(ratings)
+        if self.item_features_ is None:
+            raise ValueError("cannot update a model with quantized item features")
+
+        known = self.user_index_.get_indexer(ratings["user"].unique()) >= 0
+        if np.any(known):
+            raise ValueError("{} users are already in the model".format(np.sum(known)))
+
+        timer = Stopwatch()
+        users, items, iidx, resid = self._extend_bias(ratings)
+        ucodes = pd.Index(users).get_indexer(ratings["user"])
+        n_items = len(items)
+        _log.info(
+            "[%s] adding %d users and %d items to SVD",
+            timer,
+            len(users),
+            n_items - self.n_items,
+        )
+
+        Xt = self.user_features_
+        S = self.factorization.singular_values_
+        V = np.zeros((n_items, self.n_features))
+        V[: self.n_items, :] = self.item_features_
+
+        block = max(1, UPDATE_BLOCK_VALUES // n_items)
+        order = np.argsort(ucodes, kind="stable")
+        bounds = np.searchsorted(ucodes[order], np.arange(0, len(users) + block, block))
+        for bi, ustart in enumerate(range(0, len(users), block)):
+            pos = order[bounds[bi] : bounds[bi + 1]]
+            A = np.zeros((min(block, len(users) - ustart), n_items))
+            A[ucodes[pos] - ustart, iidx[pos]] = resid[pos]
+            Xt, S, V = _brand_append_rows(Xt, S, V, A)
+
+        self.user_index_ = self.user_index_.append(pd.Index(users, name="user"))
+        self.item_index_ = items
+        self.user_features_ = Xt
+        self.item_features_ = V
+        self.factorization.components_ = V.T
+        self.factorization.singular_values_ = S
+        # the clustered index no longer covers the items
+        self.topk_index_ = None
+        _log.info("[%s] updated SVD", timer)
+        return self
+
+    def _extend_bias(self, ratings):
+        """
+        Add offsets for new users and items to the bias model.  Offsets the bias model
+        does not learn (users or items disabled) are left disabled.
+
+        Returns:
+            tuple:
+                the new user IDs, the extended item index, the item position of each
+                rating, and the residual of each rating after subtracting the bias.
+        """
+        bias = self.bias
+        nrates = ratings["rating"].to_numpy(np.float64) - bias.mean_
+
+        icodes, items = pd.factorize(ratings["item"])
+        ipos = self.item_index_.get_indexer(items)
+        new = ipos < 0
+        ipos[new] = np.arange(self.n_items, self.n_items + np.sum(new))
+        new_items = pd.Index(items[new], name="item")
+        if bias.item_offsets_ is not None:
+            ioff = bias._code_means(icodes, nrates, len(items), bias.item_damping)
+            ioff[~new] = bias.item_offsets_.reindex(items[~new], fill_value=0).values
+            new_ioff = pd.Series(ioff[new], index=new_items, name="i_off")
+            bias.item_offsets_ = pd.concat([bias.item_offsets_, new_ioff])
+            nrates -= ioff[icodes]
+
+        ucodes, users = pd.factorize(ratings["user"])
+        if bias.user_offsets_ is not None:
+            uoff = bias._code_means(ucodes, nrates, len(users), bias.user_damping)
+            new_uoff = pd.Series(uoff, index=pd.Index(users, name="user"), name="u_off")
+            bias.user_offsets_ = pd.concat([bias.user_offsets_, new_uoff])
+            nrates -= uoff[ucodes]
+
+        return users, self.item_index_.append(new_items), ipos[icodes], nrates
+
+    @property
+    def user_components_(self):
+        "The transformed user rows (the user-feature matrix)."
+        return self.user_features_
 
     def predict_for_user(self, user, items, ratings=None):
         items = np.array(items)
-        if user not in self.bias.user_offsets_.index:
-            return pd.Series(np.nan, index=items)
-
-        # Get index for user & usable items
-        uidx = self.bias.user_offsets_.index.get_loc(user)
-        iidx = self.bias.item_offsets_.index.get_indexer(items)
-        good_iidx = iidx[iidx >= 0]
-
-        _log.debug("reverse-transforming user %s (idx=%d)", user, uidx)
-        Xt = self.user_components_[[uidx], :]
-        X = self.factorization.inverse_transform(Xt)
-        # restrict to usable desired items
-        Xsel = X[0, good_iidx]
-        # convert to output format and de-normalize
-        scores = pd.Series(Xsel, index=items[iidx >= 0]).reindex(items)
-        scores += self.bias.predict_for_user(user, items, ratings)
-        return scores
+        scores = self.score_by_ids(user, items)
+        bias = self.bias.predict_for_user(user, items, ratings)
+        return scores + bias.values
+
+    def __setstate__(self, state):
+        state = dict(state)
+        if "user_components_" in state:
+            # models pickled before BiasedSVD stored its features as an MFPredictor
+            state["user_features_"] = state.pop("user_components_")
+        self.__dict__.update(state)
+        if hasattr(self, "user_features_") and not hasattr(self, "user_index_"):
+            self.user_index_ = self.bias.user_offsets_.index
+            self.item_index_ = self.bias.item_offsets_.index
+            self.item_features_ = np.ascontiguousarray(self.factorization.components_.T)
 
     def get_params(self, deep=True):
         params = {
@@ -96,3 +220,40 @@ class BiasedSVD(Predictor):
 
     def __str__(self):
         return f"BiasedSVD({self.factorization})"
+
+
+def _brand_append_rows(Xt, S, V, A):
+    """
+    Update a rank-*k* thin SVD with new rows, following
+    :cite:t:`brandFastLowrankModifications2006`.
+
+    Args:
+        Xt(numpy.ndarray): the transformed rows (:math:`U \\Sigma`) of the current matrix.
+        S(numpy.ndarray): the singular values.
+        V(numpy.ndarray): the right singular vectors, as an item-feature matrix.
+        A(numpy.ndarray): the dense rows to append.
+
+    Returns:
+        tuple: the updated ``Xt``, ``S``, and ``V``.
+    """
+    k = len(S)
+    p = A.shape[0]
+    L = A @ V
+    H = A - L @ V.T
+    # with more new rows than items, the residual basis has only n_items columns
+    J, K = np.linalg.qr(H.T)
+    r = K.shape[0]
+
+    M = np.zeros((k + p, k + r))
+    M[:k, :k] = np.diag(S)
+    M[k:, :k] = L
+    M[k:, k:] = K.T
+    Up, Sp, Vpt = np.linalg.svd(M, full_matrices=False)
+    Sp = Sp[:k]
+
+    # rescale existing rows from U Sigma to the new U Sigma
+    scale = np.divide(1.0, S, out=np.zeros(k), where=S > 0)
+    top = Xt @ (scale.reshape(-1, 1) * Up[:k, :k] * Sp)
+    bottom = Up[k:, :k] * Sp
+    V = V @ Vpt[:k, :k].T + J @ Vpt[:k, k:].T
+    return np.vstack([top, bottom]), Sp, V
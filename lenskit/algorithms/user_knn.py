@@ -12,7 +12,7 @@ from numba import njit
 
 from .. import util
 from ..data import sparse_ratings
-from . import Predictor
+from . import Predictor, map_positions
 from ..util.accum import kvp_minheap_insert
 
 _logger = logging.getLogger(__name__)
@@ -202,12 +202,23 @@ class UserUser(Predictor):
             pandas.Series: scores for the items, indexed by item id.
         """
 
-        watch = util.Stopwatch()
         items = pd.Index(items, name="item")
+        positions = self.item_index_.get_indexer(items.values)
+        results = self.predict_positions(user, self.item_index_, positions, ratings)
+        return pd.Series(results, index=items, name="prediction")
+
+    def predict_positions(self, user, vocab, positions, ratings=None):
+        """
+        Compute predictions for items identified by position in an item vocabulary (see
+        :meth:`.Predictor.predict_positions`).
+        """
+        watch = util.Stopwatch()
+        ri_pos = map_positions(self.item_index_, vocab, positions)
+        results = np.full(len(ri_pos), np.nan, dtype=np.float_)
 
         ratings, umean = self._get_user_data(user, ratings)
         if ratings is None:
-            return pd.Series(index=items, dtype="float64")
+            return results
         assert len(ratings) == len(self.item_index_)  # ratings is a dense vector
 
         # now ratings is normalized to be a mean-centered unit vector
@@ -220,8 +231,6 @@ class UserUser(Predictor):
 
         _logger.debug("computed user similarities")
 
-        results = np.full(len(items), np.nan, dtype=np.float_)
-        ri_pos = self.item_index_.get_indexer(items.values)
         if self.aggregate == self.AGG_WA:
             agg = _agg_weighted_avg
         elif self.aggregate == self.AGG_SUM:
@@ -242,10 +251,12 @@ class UserUser(Predictor):
         if self.aggregate in self.RATING_AGGS:
             results += umean
 
-        results = pd.Series(results, index=items, name="prediction")
-
         _logger.debug(
-            "scored %d of %d items for %s in %s", results.notna().sum(), len(items), user, watch
+            "scored %d of %d items for %s in %s",
+            np.sum(~np.isnan(results)),
+            len(ri_pos),
+            user,
+            watch,
         )
         return results
 
@@ -67,11 +67,23 @@ def predict(algo, pairs, *, n_jobs=None, **kwargs):
             a frame with columns ``user``, ``item``, and ``prediction`` containing
             the prediction results. If ``pairs`` contains a `rating` column, this
             result will also contain a `rating` column.
+
+    If the algorithm has a vectorized ``predict_pairs(users, items)`` method (such as
+    :meth:`.Bias.predict_pairs` or :meth:`.MFPredictor.predict_pairs`), all pairs are
+    predicted at once in this process instead of user by user.
     """
     if n_jobs is None and "nprocs" in kwargs:
         n_jobs = kwargs["nprocs"]
         warnings.warn("nprocs is deprecated, use n_jobs", DeprecationWarning)
 
+    if hasattr(algo, "predict_pairs"):
+        timer = util.Stopwatch()
+        preds = algo.predict_pairs(pairs["user"].values, pairs["item"].values)
+        _logger.info("generated %d predictions in %s", len(pairs), timer)
+        if "rating" in pairs:
+            return pairs.assign(prediction=preds)
+        return pd.DataFrame({"user": pairs["user"], "item": pairs["item"], "prediction": preds})
+
     nusers = pairs["user"].nunique()
 
     timer = util.Stopwatch()
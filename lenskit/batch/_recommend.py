@@ -60,6 +60,10 @@ def recommend(algo, users, n, candidates=None, *, n_jobs=None, **kwargs):
     Returns:
         A frame with at least the columns ``user``, ``rank``, and ``item``; possibly also
         ``score``, and any other columns returned by the recommender.
+
+    If no candidates are provided and the algorithm has a ``recommend_batch`` method
+    (such as :meth:`.Popular.recommend_batch`), it is used to recommend for all users at
+    once in this process.
     """
 
     if n_jobs is None and "nprocs" in kwargs:
@@ -76,6 +80,13 @@ def recommend(algo, users, n, candidates=None, *, n_jobs=None, **kwargs):
     if "ratings" in kwargs:
         warnings.warn("Providing ratings to recommend is not supported", DeprecationWarning)
 
+    if candidates is None and hasattr(algo, "recommend_batch"):
+        _logger.info("batch-recommending with %s for %d users", str(algo), len(users))
+        timer = util.Stopwatch()
+        results = algo.recommend_batch(users, n).to_frame()
+        _logger.info("recommended for %d users in %s", len(users), timer)
+        return results
+
     candidates = __standard_cand_fun(candidates)
 
     with util.parallel.invoker(algo, _recommend_user, n_jobs=n_jobs) as worker:
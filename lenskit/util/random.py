@@ -3,9 +3,68 @@ Utilities to manage randomness in LensKit and LensKit experiments.
 """
 
 import numpy as np
+import pandas as pd
+from numba import njit
 
 import seedbank
 
+# SplitMix64 constants
+_SM_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+_SM_MUL1 = np.uint64(0xBF58476D1CE4E5B9)
+_SM_MUL2 = np.uint64(0x94D049BB133111EB)
+_SM_S30 = np.uint64(30)
+_SM_S27 = np.uint64(27)
+_SM_S31 = np.uint64(31)
+_U1 = np.uint64(1)
+_U11 = np.uint64(11)
+
+
+@njit(nogil=True)
+def splitmix64(state):
+    """
+    Advance a SplitMix64 counter-based random stream.  Streams are cheap to create (the
+    state is a single 64-bit integer), so they can be used to give each user in a batch
+    an independent, reproducible stream inside Numba-compiled code.
+
+    Args:
+        state(numpy.uint64): the stream state.
+
+    Returns:
+        tuple: the new state, and a non-negative random 63-bit integer.
+    """
+    state = state + _SM_GAMMA
+    z = state
+    z = (z ^ (z >> _SM_S30)) * _SM_MUL1
+    z = (z ^ (z >> _SM_S27)) * _SM_MUL2
+    z = z ^ (z >> _SM_S31)
+    return state, np.int64(z >> _U1)
+
+
+@njit(nogil=True)
+def splitmix64_uniform(state):
+    """
+    Draw a uniform random float in :math:`[0, 1)` from a SplitMix64 stream.
+
+    Returns:
+        tuple: the new state and the random value.
+    """
+    state, r = splitmix64(state)
+    return state, (np.uint64(r) >> _U11) * (1.0 / 2**52)
+
+
+@njit
+def _mix_seeds(keys, base):
+    seeds = np.empty(len(keys), dtype=np.uint64)
+    for i in range(len(keys)):
+        _s, r = splitmix64(keys[i] ^ base)
+        seeds[i] = np.uint64(r)
+    return seeds
+
+
+def _key_seeds(base, keys):
+    hashes = pd.util.hash_array(np.asarray(keys))
+    return _mix_seeds(hashes, np.uint64(base))
+
 
 class FixedRNG:
     "RNG provider that always provides the same RNG"
@@ -16,6 +75,14 @@ class FixedRNG:
     def __call__(self, *keys) -> np.random.Generator:
         return self.rng
 
+    def stream_seeds(self, keys):
+        """
+        Get initial states for :func:`splitmix64` streams for an array of keys.  The base
+        seed is drawn from the fixed RNG, so the streams differ from call to call.
+        """
+        base = self.rng.integers(np.iinfo(np.int64).max, dtype=np.int64)
+        return _key_seeds(base, keys)
+
     def __str__(self):
         return "Fixed({})".format(self.rng)
 
@@ -30,6 +97,15 @@ class DerivingRNG:
         seed = seedbank.derive_seed(*keys, base=self.seed)
         return seedbank.numpy_rng(seed)
 
+    def stream_seeds(self, keys):
+        """
+        Get initial states for :func:`splitmix64` streams for an array of keys (such as
+        user IDs).  Each key's stream depends only on the key and this provider's seed,
+        so results are reproducible per key regardless of batch composition.
+        """
+        (base,) = seedbank.derive_seed(base=self.seed).generate_state(1, np.uint64)
+        return _key_seeds(base, keys)
+
     def __str__(self):
         return "Derive({})".format(self.seed)
 
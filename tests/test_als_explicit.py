@@ -6,6 +6,7 @@ from pickletools import dis as pickle_dis
 
 from lenskit.algorithms import als
 from lenskit import util
+from lenskit.sharing import SHM_AVAILABLE
 
 import pandas as pd
 import numpy as np
@@ -27,7 +28,7 @@ simple_df = pd.DataFrame(
     {"item": [1, 1, 2, 3], "user": [10, 12, 10, 13], "rating": [4.0, 3.0, 5.0, 2.0]}
 )
 
-methods = mark.parametrize("m", ["lu", "cd"])
+methods = mark.parametrize("m", ["lu", "cd", "cg"])
 
 
 @methods
@@ -286,6 +287,47 @@ def test_als_binpickle(tmp_path):
         assert len(preds) == 50
 
 
+def test_als_checkpoint_resume(tmp_path):
+    "Test that resuming from a checkpoint matches uninterrupted training."
+    ratings = lktu.ml_test.ratings
+    ckpt = tmp_path / "als.ckpt"
+
+    full = als.BiasedMF(5, iterations=6, method="lu", rng_spec=42)
+    full.fit(ratings)
+
+    first = als.BiasedMF(5, iterations=3, method="lu", rng_spec=42, checkpoint_path=ckpt)
+    first.fit(ratings)
+    assert ckpt.exists()
+    saved = als.load_checkpoint(ckpt)
+    assert saved.epoch == 2
+    assert np.all(saved.model.item_matrix == first.item_features_)
+
+    resumed = als.BiasedMF(5, iterations=6, method="lu", rng_spec=7)
+    resumed.resume(ratings, ckpt)
+    assert np.all(resumed.user_index_ == full.user_index_)
+    assert resumed.user_features_ == approx(full.user_features_)
+    assert resumed.item_features_ == approx(full.item_features_)
+    # the random state continues from the checkpoint, not the new seed
+    assert resumed.rng.bit_generator.state == full.rng.bit_generator.state
+
+
+@mark.slow
+@mark.skipif(not SHM_AVAILABLE, reason="shared memory not available")
+def test_als_train_multiprocess():
+    "Test that multi-process training matches in-process training."
+    ratings = lktu.ml_test.ratings
+
+    local = als.BiasedMF(10, iterations=3, method="cd", rng_spec=42)
+    local.fit(ratings)
+
+    mp = als.BiasedMF(10, iterations=3, method="cd", rng_spec=42, n_jobs=2)
+    mp.fit(ratings)
+
+    assert np.all(mp.user_index_ == local.user_index_)
+    assert mp.user_features_ == approx(local.user_features_)
+    assert mp.item_features_ == approx(local.item_features_)
+
+
 @lktu.wantjit
 @mark.slow
 def test_als_method_match():
@@ -338,6 +380,32 @@ def test_als_method_match():
     assert np.quantile(adiff, 0.9) <= 0.27
 
 
+@lktu.wantjit
+@mark.slow
+@mark.parametrize("features", [50, 100, 200])
+def test_als_solver_benchmark(features):
+    "Compare training speed and accuracy of the explicit solvers."
+    from lenskit.metrics.predict import rmse
+
+    ratings = lktu.ml_test.ratings
+    iters = 5
+    results = {}
+    for method in ["cd", "lu", "cg"]:
+        algo = als.BiasedMF(features, iterations=iters, method=method, rng_spec=42)
+        # warm up the JIT
+        algo.fit(ratings.iloc[:1000])
+        timer = Stopwatch()
+        algo.fit(ratings)
+        timer.stop()
+        preds = algo.predict(ratings[["user", "item"]])
+        results[method] = (iters / timer.elapsed(), rmse(preds, ratings.rating))
+        _log.info(
+            "%s with %d features: %.2f epochs/sec, RMSE %.4f", method, features, *results[method]
+        )
+
+    assert results["cg"][1] == approx(results["lu"][1], abs=0.01)
+
+
 @mark.slow
 @mark.eval
 @mark.skipif(not lktu.ml100k.available, reason="ML100K data not present")
@@ -2,6 +2,7 @@ import logging
 
 from lenskit import util
 from lenskit.algorithms import als
+from lenskit.sharing import SHM_AVAILABLE
 
 import pandas as pd
 import numpy as np
@@ -9,7 +10,7 @@ from scipy import stats
 import binpickle
 from seedbank import numpy_rng
 
-from pytest import mark, approx
+from pytest import mark, approx, raises
 
 import lenskit.util.test as lktu
 from lenskit.algorithms import Recommender
@@ -21,7 +22,7 @@ simple_df = pd.DataFrame({"item": [1, 1, 2, 3], "user": [10, 12, 10, 13]})
 
 simple_dfr = simple_df.assign(rating=[4.0, 3.0, 5.0, 2.0])
 
-methods = mark.parametrize("m", ["lu", "cg"])
+methods = mark.parametrize("m", ["lu", "cg", "bcd"])
 
 
 @methods
@@ -243,6 +244,60 @@ def test_als_save_load(tmp_path):
     assert np.all(restored.user_index_ == algo.user_index_)
 
 
+def test_als_checkpoint_interval(tmp_path):
+    "Test checkpoint intervals and resuming implicit training."
+    ratings = lktu.ml_test.ratings
+    ckpt = tmp_path / "als.ckpt"
+
+    full = als.ImplicitMF(5, iterations=5, method="lu", rng_spec=42)
+    full.fit(ratings)
+
+    first = als.ImplicitMF(
+        5, iterations=5, method="lu", rng_spec=42, checkpoint_path=ckpt, checkpoint_interval=2
+    )
+    for epoch, _algo in enumerate(first.fit_iters(ratings)):
+        if epoch == 2:
+            # simulate a crash after the third epoch
+            break
+
+    saved = als.load_checkpoint(ckpt)
+    assert saved.epoch == 1
+    assert saved.model.user_matrix.shape == (ratings.user.nunique(), 5)
+
+    resumed = als.ImplicitMF(5, iterations=5, method="lu", checkpoint_path=ckpt)
+    resumed.resume(ratings)
+    assert resumed.user_features_ == approx(full.user_features_)
+    assert resumed.item_features_ == approx(full.item_features_)
+    assert resumed.OtOr_ == approx(full.OtOr_)
+
+
+def test_als_resume_mismatch(tmp_path):
+    ckpt = tmp_path / "als.ckpt"
+    algo = als.ImplicitMF(5, iterations=2, checkpoint_path=ckpt)
+    algo.fit(simple_df)
+
+    with raises(ValueError):
+        als.ImplicitMF(5, iterations=4).resume(lktu.ml_test.ratings, ckpt)
+
+
+@mark.slow
+@mark.skipif(not SHM_AVAILABLE, reason="shared memory not available")
+def test_als_train_multiprocess():
+    "Test that multi-process implicit training matches in-process training."
+    ratings = lktu.ml_test.ratings
+
+    local = als.ImplicitMF(10, iterations=3, method="cg", rng_spec=42)
+    local.fit(ratings)
+
+    mp = als.ImplicitMF(10, iterations=3, method="cg", rng_spec=42, n_jobs=2)
+    for epoch, _algo in enumerate(mp.fit_iters(ratings)):
+        pass
+
+    assert epoch == 2
+    assert mp.user_features_ == approx(local.user_features_)
+    assert mp.item_features_ == approx(local.item_features_)
+
+
 @lktu.wantjit
 def test_als_train_large_noratings():
     algo = als.ImplicitMF(20, iterations=20)
@@ -318,6 +373,70 @@ def test_als_method_match():
     assert np.quantile(adiff, 0.9) < 0.5
 
 
+def test_als_bcd_full_block():
+    "With a single block, block coordinate descent is an exact solve."
+    ratings = lktu.ml_test.ratings
+    lu = als.ImplicitMF(8, iterations=3, method="lu", rng_spec=42)
+    lu.fit(ratings)
+    bcd = als.ImplicitMF(8, iterations=3, method="bcd", block_size=8, rng_spec=42)
+    bcd.fit(ratings)
+
+    assert bcd.user_features_ == approx(lu.user_features_, rel=1.0e-5, abs=1.0e-8)
+    assert bcd.item_features_ == approx(lu.item_features_, rel=1.0e-5, abs=1.0e-8)
+
+
+def _implicit_loss(algo, ratings):
+    "Compute the full implicit-feedback training loss of a model."
+    P = algo.user_features_
+    Q = algo.item_features_
+    uidx = algo.user_index_.get_indexer(ratings.user)
+    iidx = algo.item_index_.get_indexer(ratings.item)
+    # loss over all cells as if unobserved, then correct the observed cells
+    loss = np.sum((P.T @ P) * (Q.T @ Q))
+    scores = np.sum(P[uidx, :] * Q[iidx, :], axis=1)
+    conf = algo.weight + 1.0
+    loss += np.sum(conf * np.square(1.0 - scores) - np.square(scores))
+    loss += algo.reg * (np.sum(np.square(P)) + np.sum(np.square(Q)))
+    return loss
+
+
+@lktu.wantjit
+@mark.slow
+def test_als_bcd_time_to_loss():
+    "Compare the time for each solver to reach a fixed training loss at high dimension."
+    ratings = lktu.ml_test.ratings[["user", "item"]]
+    features = 256
+
+    # the target is the loss of two LU epochs
+    lu = als.ImplicitMF(features, iterations=2, method="lu", rng_spec=42)
+    lu.fit(ratings)
+    target = _implicit_loss(lu, ratings) * 1.01
+    _log.info("target loss: %.1f", target)
+
+    times = {}
+    for method in ["lu", "cg", "bcd"]:
+        algo = als.ImplicitMF(features, iterations=15, method=method, block_size=32, rng_spec=42)
+        # warm up the JIT
+        algo.fit(ratings.iloc[:500])
+        timer = Stopwatch()
+        for epoch, _a in enumerate(algo.fit_iters(ratings)):
+            loss = _implicit_loss(algo, ratings)
+            if loss <= target:
+                times[method] = timer.elapsed()
+                break
+        timer.stop()
+        _log.info(
+            "%s: loss %.1f after %d epochs in %s (target %s)",
+            method,
+            loss,
+            epoch + 1,
+            timer,
+            "reached" if method in times else "not reached",
+        )
+
+    assert "bcd" in times
+
+
 @mark.slow
 @mark.eval
 @mark.skipif(not lktu.ml100k.available, reason="ML100K data not present")
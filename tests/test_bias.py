@@ -174,6 +174,40 @@ def test_bias_predict_unknown_user():
     assert p.values == approx((algo.item_offsets_.loc[[1, 3]] + algo.mean_).values)
 
 
+@mark.parametrize("users,items", [(True, True), (True, False), (False, True)])
+def test_bias_predict_pairs(users, items):
+    ratings = ml_test.ratings
+    algo = Bias(users=users, items=items, damping=5).fit(ratings)
+    pairs = ratings.sample(500, random_state=42)[["user", "item"]]
+    pairs = pd.concat(
+        [pairs, pd.DataFrame({"user": [-1, 1, -5], "item": [1, -1, -5]})], ignore_index=True
+    )
+
+    expected = pd.Series(np.nan, index=pairs.index)
+    for u, upairs in pairs.groupby("user"):
+        expected[upairs.index] = algo.predict_for_user(u, upairs.item.values).values
+
+    preds = algo.predict_pairs(pairs.user.values, pairs.item.values)
+    assert preds == approx(expected.values)
+
+    series = algo.predict(pairs)
+    assert series.name == "prediction"
+    assert np.all(series.index == pairs.index)
+    assert series.values == approx(expected.values)
+
+    # replace two users' ratings, including a new user
+    new = ratings[ratings.user.isin([1, 2])].sample(frac=0.5, random_state=42)
+    new = pd.concat([new, pd.DataFrame({"user": [-1, -1], "item": [1, -7], "rating": [5.0, 1]})])
+    for u, upairs in pairs.groupby("user"):
+        if u in [-1, 1, 2]:
+            urates = new[new.user == u].set_index("item").rating
+            up = algo.predict_for_user(u, upairs.item.values, urates)
+            expected[upairs.index] = up.values
+
+    series = algo.predict(pairs, new)
+    assert series.values == approx(expected.values)
+
+
 def test_bias_train_ml_ratings():
     algo = Bias()
     ratings = ml_test.ratings
@@ -194,6 +228,97 @@ def test_bias_train_ml_ratings():
     assert p.iloc[2] == approx(ratings.rating.mean() + umean)
 
 
+def test_bias_damped_ml_ratings():
+    "Check the vectorized fit against grouped pandas computations."
+    ratings = ml_test.ratings.copy()
+    # a few missing ratings should be skipped
+    ratings.loc[ratings.index[:50], "rating"] = np.nan
+    algo = Bias(damping=(5, 3))
+    algo.fit(ratings)
+
+    mean = ratings.rating.mean()
+    nrates = ratings.assign(rating=ratings.rating - mean)
+    igroup = nrates.groupby("item").rating
+    ioff = igroup.sum() / (igroup.count() + 3)
+    assert algo.item_offsets_.index.name == "item"
+    assert np.all(algo.item_offsets_.index == ioff.index)
+    assert algo.item_offsets_.values == approx(ioff.values)
+
+    nrates = nrates.join(ioff.rename("i_off"), on="item")
+    ugroup = (nrates.rating - nrates.i_off).groupby(nrates.user)
+    uoff = ugroup.sum() / (ugroup.count() + 5)
+    assert algo.user_offsets_.index.name == "user"
+    assert np.all(algo.user_offsets_.index == uoff.index)
+    assert algo.user_offsets_.values == approx(uoff.values)
+
+
+def test_bias_partial_fit_single():
+    "A single chunk matches the batch fit exactly."
+    ratings = ml_test.ratings
+    algo = Bias(damping=(5, 3)).fit(ratings)
+    inc = Bias(damping=(5, 3)).partial_fit(ratings)
+
+    assert inc.mean_ == approx(algo.mean_)
+    assert inc.item_offsets_.index.name == "item"
+    assert np.all(inc.item_offsets_.index == algo.item_offsets_.index)
+    assert inc.item_offsets_.values == approx(algo.item_offsets_.values)
+    assert inc.user_offsets_.index.name == "user"
+    assert np.all(inc.user_offsets_.index == algo.user_offsets_.index)
+    assert inc.user_offsets_.values == approx(algo.user_offsets_.values)
+
+
+@mark.parametrize("items,users", [(True, True), (True, False), (False, True)])
+def test_bias_partial_fit_chunks(items, users):
+    ratings = ml_test.ratings.sample(frac=1, random_state=42)
+    algo = Bias(items=items, users=users, damping=5).fit(ratings)
+    inc = Bias(items=items, users=users, damping=5)
+    for chunk in np.array_split(ratings, 10):
+        inc.partial_fit(chunk)
+
+    # global mean and item offsets are exact
+    assert inc.mean_ == approx(algo.mean_)
+    if items:
+        assert np.all(inc.item_offsets_.index == algo.item_offsets_.index)
+        assert inc.item_offsets_.values == approx(algo.item_offsets_.values)
+    else:
+        assert inc.item_offsets_ is None
+
+    # user offsets use the item offsets as of each chunk
+    if not users:
+        assert inc.user_offsets_ is None
+    elif items:
+        assert np.all(inc.user_offsets_.index == algo.user_offsets_.index)
+        diff = np.abs(inc.user_offsets_.values - algo.user_offsets_.values)
+        _log.info("max user offset error: %.4f", np.max(diff))
+        assert np.mean(diff) < 0.05
+    else:
+        assert np.all(inc.user_offsets_.index == algo.user_offsets_.index)
+        assert inc.user_offsets_.values == approx(algo.user_offsets_.values)
+
+    # fit resets the statistics
+    inc.fit(simple_df)
+    inc.partial_fit(simple_df)
+    assert inc.mean_ == approx(3.5)
+
+
+def test_bias_partial_fit_empty_chunks():
+    "Empty and all-NaN chunks leave the statistics unchanged."
+    ratings = ml_test.ratings
+    algo = Bias(damping=5).fit(ratings)
+    missing = ratings.iloc[:10].assign(rating=np.nan)
+
+    inc = Bias(damping=5)
+    inc.partial_fit(ratings.iloc[:0])
+    inc.partial_fit(missing)
+    inc.partial_fit(ratings)
+    inc.partial_fit(missing)
+    inc.partial_fit(ratings.iloc[:0])
+
+    assert inc.mean_ == approx(algo.mean_)
+    assert inc.item_offsets_.values == approx(algo.item_offsets_.values)
+    assert inc.user_offsets_.values == approx(algo.user_offsets_.values)
+
+
 def test_bias_transform():
     algo = Bias()
     ratings = ml_test.ratings
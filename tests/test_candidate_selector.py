@@ -4,6 +4,8 @@ import lenskit.util.test as lktu
 import pandas as pd
 import numpy as np
 
+from pytest import raises
+
 simple_df = pd.DataFrame(
     {"item": [1, 1, 2, 3], "user": [10, 12, 10, 13], "rating": [4.0, 3.0, 5.0, 2.0]}
 )
@@ -59,3 +61,46 @@ def test_unrated_big():
         assert len(uis) + len(candidates) == len(items)
         assert candidates.nunique() == len(candidates)
         assert all(~candidates.isin(uis))
+
+
+def test_unrated_positions():
+    ratings = lktu.ml_test.ratings
+    sel = basic.UnratedItemCandidateSelector()
+    sel.fit(ratings)
+    user_items = ratings.set_index("user").item
+
+    for u in ratings.user.unique()[:20]:
+        rated = sel.rated_positions(u)
+        assert set(sel.items_[rated]) == set(user_items.loc[[u]])
+        pos = sel.candidate_positions(u)
+        assert np.all(np.diff(pos) > 0)
+        assert len(pos) + len(rated) == len(sel.items_)
+        assert np.all(sel.items_[pos] == sel.candidates(u))
+
+    # unknown users and override ratings
+    assert np.all(sel.candidate_positions(-1) == np.arange(len(sel.items_)))
+    assert len(sel.rated_positions(-1)) == 0
+    items = sel.items_[[0, 5, 7]]
+    pos = sel.candidate_positions(-1, pd.Series(1.0, index=items))
+    assert len(pos) == len(sel.items_) - 3
+    assert set(sel.items_[pos]).isdisjoint(items)
+    assert np.all(sel.candidate_positions(-1) == np.arange(len(sel.items_)))
+
+
+def test_unrated_positions_error(monkeypatch):
+    ratings = lktu.ml_test.ratings
+    sel = basic.UnratedItemCandidateSelector()
+    sel.fit(ratings)
+    user, other = ratings.user.unique()[:2]
+    expected = sel.candidate_positions(other)
+
+    def fail(mask):
+        raise MemoryError()
+
+    with monkeypatch.context() as m:
+        m.setattr(basic.np, "flatnonzero", fail)
+        with raises(MemoryError):
+            sel.candidate_positions(user)
+
+    # the failed call does not leave the first user's items excluded
+    assert np.all(sel.candidate_positions(other) == expected)
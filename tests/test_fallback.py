@@ -149,3 +149,34 @@ def test_fallback_save_load(tmp_path):
     assert preds.loc[1] == 4.0
     assert preds.loc[5] == approx(exp_val(10, 5))
     assert preds.loc[-23081] == approx(exp_val(10, None))
+
+
+def test_fallback_predict_pairs():
+    from lenskit.algorithms import als
+    from lenskit import batch
+
+    ratings = lktu.ml_test.ratings
+    train = ratings[ratings.user % 5 != 0]
+    known = ratings.sample(200, random_state=42)
+    algo = basic.Fallback(als.BiasedMF(5, iterations=2), basic.Memorized(known), Bias())
+    algo.fit(train)
+    # a predictor without predict_pairs in the middle
+    pop = basic.PopScore().fit(train[train.item % 2 == 0])
+    algo.algorithms.insert(2, pop)
+
+    pairs = ratings.sample(1000, random_state=7)[["user", "item"]]
+    pairs = pd.concat([pairs, known[["user", "item"]]], ignore_index=True)
+    pairs = pd.concat([pairs, pd.DataFrame({"user": [-1], "item": [-1]})], ignore_index=True)
+
+    expected = pd.Series(np.nan, index=pairs.index)
+    for u, upairs in pairs.groupby("user"):
+        up = algo.predict_for_user(u, upairs.item.values)
+        assert np.all(up.index == upairs.item.values)
+        expected[upairs.index] = up.values
+
+    preds = algo.predict_pairs(pairs.user.values, pairs.item.values)
+    assert not np.any(np.isnan(preds))
+    assert preds == approx(expected.values)
+
+    res = batch.predict(algo, pairs)
+    assert res.prediction.values == approx(expected.values)
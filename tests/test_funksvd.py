@@ -8,6 +8,7 @@ import pandas as pd
 import numpy as np
 
 from pytest import approx, mark
+from seedbank import numpy_rng
 
 import lenskit.util.test as lktu
 
@@ -161,6 +162,26 @@ def test_fsvd_train_binary():
     assert original.user_features_.shape == (ratings.user.nunique(), 20)
 
 
+def test_fsvd_prepare_data():
+    from lenskit.algorithms.bias import Bias
+
+    ratings = lktu.ml_test.ratings
+    bias = Bias(damping=5).fit(ratings)
+    rng = np.random.default_rng(42)
+    users, items, rvals, initial, uidx, iidx = svd._prepare_data(ratings, bias, rng)
+
+    assert len(users) == len(ratings)
+    assert len(uidx) == ratings.user.nunique()
+    assert len(iidx) == ratings.item.nunique()
+    # recover the shuffled ratings and check them against the original frame
+    shuffled = pd.DataFrame({"user": uidx[users], "item": iidx[items], "rating": rvals})
+    merged = shuffled.merge(ratings, on=["user", "item"], suffixes=("", "_orig"))
+    assert len(merged) == len(ratings)
+    assert np.all(merged.rating == merged.rating_orig)
+    expected = bias.predict(shuffled[["user", "item"]])
+    assert initial == approx(expected.values)
+
+
 @lktu.wantjit
 @mark.slow
 def test_fsvd_known_preds():
@@ -189,6 +210,162 @@ def test_fsvd_known_preds():
         raise e
 
 
+def test_fsvd_predict_new_user_ratings():
+    algo = svd.FunkSVD(10, iterations=50, method="joint", random_state=42)
+    ratings = lktu.ml_test.ratings
+    algo.fit(ratings)
+
+    urates = ratings[ratings.user == 10].set_index("item").rating
+    items = urates.index.values[:5]
+    preds = algo.predict_for_user(-1, items, urates)
+    assert np.all(preds.notna())
+    # a new user with the same ratings should get the same predictions
+    preds2 = algo.predict_for_user(10, items, urates)
+    assert preds.values == approx(preds2.values)
+
+    # and with no ratings, we cannot predict
+    preds = algo.predict_for_user(-1, items)
+    assert np.all(preds.isna())
+
+
+def test_fsvd_fold_in():
+    algo = svd.FunkSVD(10, iterations=50, method="joint", random_state=42)
+    ratings = lktu.ml_test.ratings
+    algo.fit(ratings)
+
+    users = [10, 50, 150]
+    fold = algo.fold_in(ratings[ratings.user.isin(users)])
+    assert len(fold.user_index) == 3
+    assert fold.user_features.shape == (3, 10)
+
+    for u in users:
+        urates = ratings[ratings.user == u].set_index("item").rating
+        rates, offset = algo.bias.transform_user(urates)
+        assert fold.user_offsets[fold.user_index.get_loc(u)] == approx(offset)
+
+        # check the normal equations
+        Q = algo.item_features_[algo.item_index_.get_indexer(rates.index), :]
+        uf = fold.user_features[fold.user_index.get_loc(u), :]
+        lhs = (Q.T @ Q + np.identity(10) * algo.reg * len(rates)) @ uf
+        assert lhs == approx(Q.T @ rates.values)
+
+        preds = algo.predict_for_user(u, rates.index.values[:10], urates)
+        scores = algo.item_features_[algo.item_index_.get_indexer(preds.index), :] @ uf
+        expected = algo.bias.inverse_transform_user(u, pd.Series(scores, index=preds.index), offset)
+        assert preds.values == approx(expected.values)
+
+
+def test_fsvd_fold_in_no_user_bias():
+    ratings = lktu.ml_test.ratings
+    bias = svd.Bias(users=False)
+    algo = svd.FunkSVD(5, iterations=10, method="joint", bias=bias, random_state=42)
+    algo.fit(ratings)
+    assert algo.bias.user_offsets_ is None
+
+    fold = algo.fold_in(ratings[ratings.user.isin([10, 50])])
+    assert np.all(fold.user_offsets == 0)
+
+    urates = ratings[ratings.user == 10].set_index("item").rating
+    rates = urates - algo.bias.mean_ - algo.bias.item_offsets_.reindex(urates.index, fill_value=0)
+    Q = algo.item_features_[algo.item_index_.get_indexer(rates.index), :]
+    uf = fold.user_features[fold.user_index.get_loc(10), :]
+    lhs = (Q.T @ Q + np.identity(5) * algo.reg * len(rates)) @ uf
+    assert lhs == approx(Q.T @ rates.values)
+
+
+def test_fsvd_parallel_build():
+    algo = svd.FunkSVD(20, iterations=20, parallel=True)
+    algo.fit(simple_df)
+
+    assert algo.bias.mean_ == approx(simple_df.rating.mean())
+    assert algo.item_features_.shape == (3, 20)
+    assert algo.user_features_.shape == (3, 20)
+
+
+def test_fsvd_joint_build():
+    algo = svd.FunkSVD(20, iterations=20, method="joint", random_state=42)
+    algo.fit(simple_df)
+
+    assert algo.bias.mean_ == approx(simple_df.rating.mean())
+    assert algo.item_features_.shape == (3, 20)
+    assert algo.user_features_.shape == (3, 20)
+    assert np.all(np.isfinite(algo.user_features_))
+
+
+def test_fsvd_joint_holdout_small():
+    "A small holdout fraction still holds out a rating, and it is not used for the bias."
+    ratings = pd.DataFrame(
+        {"user": [1, 1, 2, 2, 3], "item": [1, 2, 1, 3, 2], "rating": [4.0, 3.0, 5.0, 2.0, 1.0]}
+    )
+    algo = svd.FunkSVD(2, iterations=3, method="joint", holdout=0.1, random_state=42)
+    algo.fit(ratings)
+    assert np.all(np.isfinite(algo.user_features_))
+
+    # the model shuffles with its random state, and holds out the last shuffled rating
+    shuf = np.arange(len(ratings))
+    numpy_rng(42).shuffle(shuf)
+    assert algo.bias.mean_ == approx(ratings.rating.iloc[shuf[:-1]].mean())
+
+    # one rating cannot be split
+    algo = svd.FunkSVD(2, iterations=3, method="joint", holdout=0.5, random_state=42)
+    algo.fit(ratings.iloc[:1])
+    assert algo.bias.mean_ == approx(4.0)
+
+
+@lktu.wantjit
+@mark.slow
+def test_fsvd_joint_accuracy():
+    "Test that joint training with early stopping matches featurewise accuracy."
+    from lenskit.metrics.predict import rmse
+
+    ratings = lktu.ml_test.ratings
+    rng = np.random.default_rng(42)
+    test_mask = rng.random(len(ratings)) < 0.1
+    train = ratings[~test_mask]
+    test = ratings[test_mask]
+
+    feature = svd.FunkSVD(15, iterations=100, random_state=42)
+    feature.fit(train)
+    joint = svd.FunkSVD(
+        15,
+        iterations=100,
+        method="joint",
+        lrate=0.01,
+        lrate_decay=0.95,
+        holdout=0.1,
+        random_state=42,
+    )
+    joint.fit(train)
+
+    f_rmse = rmse(feature.predict(test), test.rating, missing="ignore")
+    j_rmse = rmse(joint.predict(test), test.rating, missing="ignore")
+    _log.info("featurewise RMSE %.4f, joint RMSE %.4f", f_rmse, j_rmse)
+    assert j_rmse == approx(f_rmse, abs=0.02)
+
+
+@lktu.wantjit
+@mark.slow
+def test_fsvd_parallel_parity():
+    "Test that parallel training converges to the same accuracy as serial training."
+    from lenskit.metrics.predict import rmse
+
+    ratings = lktu.ml_test.ratings
+    rng = np.random.default_rng(42)
+    test_mask = rng.random(len(ratings)) < 0.1
+    train = ratings[~test_mask]
+    test = ratings[test_mask]
+
+    serial = svd.FunkSVD(15, iterations=50, random_state=42)
+    serial.fit(train)
+    parallel = svd.FunkSVD(15, iterations=50, random_state=42, parallel=True)
+    parallel.fit(train)
+
+    s_rmse = rmse(serial.predict(test), test.rating, missing="ignore")
+    p_rmse = rmse(parallel.predict(test), test.rating, missing="ignore")
+    _log.info("serial RMSE %.4f, parallel RMSE %.4f", s_rmse, p_rmse)
+    assert p_rmse == approx(s_rmse, abs=0.01)
+
+
 @lktu.wantjit
 @mark.slow
 @mark.eval
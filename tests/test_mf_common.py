@@ -0,0 +1,217 @@
+import logging
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from pytest import approx, raises, fixture, mark, skip
+
+from lenskit.algorithms import als, funksvd
+from lenskit.sharing import persist, SHM_AVAILABLE
+import lenskit.util.test as lktu
+
+_log = logging.getLogger(__name__)
+
+
+@fixture(scope="module")
+def biased_mf():
+    return als.BiasedMF(20, iterations=10, rng_spec=42).fit(lktu.ml_test.ratings)
+
+
+@fixture(scope="module")
+def implicit_mf():
+    return als.ImplicitMF(20, iterations=10, rng_spec=42).fit(lktu.ml_test.ratings)
+
+
+def _brute_topk(algo, user, n, ratings):
+    rated = ratings[ratings.user == user].item
+    cands = np.setdiff1d(algo.item_index_.values, rated.values)
+    return algo.predict_for_user(user, cands).nlargest(n)
+
+
+def test_topk_exact_biased(biased_mf):
+    ratings = lktu.ml_test.ratings
+    users = ratings.user.unique()[:20]
+    recs = biased_mf.recommend_topk(users, 10, exclude=ratings, batch_size=7)
+
+    assert list(recs.user.unique()) == list(users)
+    for u in users:
+        expected = _brute_topk(biased_mf, u, 10, ratings)
+        urecs = recs[recs.user == u]
+        assert list(urecs["rank"]) == list(range(1, 11))
+        assert np.all(urecs.item.values == expected.index.values)
+        assert urecs.score.values == approx(expected.values)
+
+
+def test_topk_exact_implicit(implicit_mf):
+    ratings = lktu.ml_test.ratings
+    users = ratings.user.unique()[:10]
+    recs = implicit_mf.recommend_topk(users, 5)
+
+    for u in users:
+        expected = implicit_mf.predict_for_user(u, implicit_mf.item_index_.values).nlargest(5)
+        urecs = recs[recs.user == u]
+        assert np.all(urecs.item.values == expected.index.values)
+        assert urecs.score.values == approx(expected.values)
+
+
+def test_topk_clamp():
+    ratings = lktu.ml_test.ratings
+    algo = funksvd.FunkSVD(10, iterations=20, method="joint", range=(0.5, 5.0), random_state=42)
+    algo.fit(ratings)
+    recs = algo.recommend_topk(ratings.user.unique()[:10], 20)
+    assert recs.score.max() <= 5.0
+
+
+def test_topk_unknown_user(biased_mf):
+    recs = biased_mf.recommend_topk([-1, 1], 5)
+    assert list(recs.user.unique()) == [1]
+    assert len(recs) == 5
+
+
+def test_topk_exclude_all():
+    algo = als.BiasedMF(2, iterations=2).fit(
+        pd.DataFrame({"user": [1, 1, 2], "item": [10, 11, 10], "rating": [4.0, 3.0, 5.0]})
+    )
+    recs = algo.recommend_topk([1, 2], 5, exclude=pd.DataFrame({"user": [1, 1], "item": [10, 11]}))
+    assert len(recs[recs.user == 1]) == 0
+    assert len(recs[recs.user == 2]) == 2
+
+
+def test_topk_approx(biased_mf):
+    ratings = lktu.ml_test.ratings
+    users = ratings.user.unique()[:50]
+    exact = biased_mf.recommend_topk(users, 10, exclude=ratings)
+
+    with raises(ValueError):
+        biased_mf.recommend_topk(users, 10, approximate=True)
+
+    index = biased_mf.build_topk_index(rng_spec=42)
+    assert index.cluster_ptrs[-1] == biased_mf.n_items
+    assert np.all(np.sort(index.cluster_items) == np.arange(biased_mf.n_items))
+
+    # searching every cluster is exact
+    full = biased_mf.recommend_topk(
+        users, 10, exclude=ratings, approximate=True, probe=len(index.centroids)
+    )
+    assert np.all(full.item.values == exact.item.values)
+    assert full.score.values == approx(exact.score.values)
+
+    recs = biased_mf.recommend_topk(users, 10, exclude=ratings, approximate=True)
+    merged = recs.merge(exact, on=["user", "item"], suffixes=("", "_exact"))
+    recall = len(merged) / len(exact)
+    _log.info("approximate recall@10: %.3f", recall)
+    assert merged.score.values == approx(merged.score_exact.values)
+    assert recall >= 0.5
+
+    # an index from a model with a different item set is rejected
+    small = als.BiasedMF(20, iterations=2, rng_spec=42).fit(
+        ratings[ratings.item.isin(ratings.item.unique()[:200])]
+    )
+    biased_mf.topk_index_ = small.build_topk_index(rng_spec=42)
+    assert biased_mf.topk_index_.n_items == small.n_items
+    with raises(ValueError, match="rebuild"):
+        biased_mf.recommend_topk(users, 10, approximate=True)
+    del biased_mf.topk_index_
+
+
+@mark.parametrize("mode", ["int8", "float16"])
+def test_quantize_score(mode):
+    ratings = lktu.ml_test.ratings
+    algo = als.BiasedMF(20, iterations=5, rng_spec=42).fit(ratings)
+    items = ratings.item.unique()[:100]
+    users = ratings.user.unique()[:5]
+    full = [algo.predict_for_user(u, items) for u in users]
+    urates = ratings[ratings.user == users[0]].set_index("item").rating
+    folded = algo.predict_for_user(-1, items, urates)
+    Q = algo.item_features_.copy()
+    algo.build_topk_index(rng_spec=42)
+
+    algo.quantize_items(mode)
+    assert algo.item_features_ is None
+    assert algo.topk_index_ is None
+    assert algo.item_codes_.dtype == np.dtype(mode)
+    assert algo._item_matrix() == approx(Q, abs=np.max(np.abs(Q)) / 100)
+
+    for u, fp in zip(users, full):
+        qp = algo.predict_for_user(u, items)
+        assert qp.values == approx(fp.values, abs=0.05)
+
+    # fold-in still works
+    preds = algo.predict_for_user(-1, items, urates)
+    assert preds.values == approx(folded.values, abs=0.05)
+
+    with raises(ValueError):
+        algo.quantize_items(mode)
+
+
+@mark.parametrize("method", ["binpickle", "shm"])
+def test_quantize_persist(method):
+    if method == "shm" and not SHM_AVAILABLE:
+        skip("SHM backend not available")
+
+    ratings = lktu.ml_test.ratings
+    algo = als.ImplicitMF(20, iterations=5, rng_spec=42).fit(ratings)
+    algo.quantize_items("int8")
+    items = ratings.item.unique()[:50]
+    preds = algo.predict_for_user(10, items)
+
+    pm = persist(algo, method=method)
+    try:
+        a2 = pm.get()
+        assert a2.item_features_ is None
+        assert a2.item_codes_.dtype == np.int8
+        assert np.all(a2.item_codes_ == algo.item_codes_)
+        assert a2.predict_for_user(10, items).values == approx(preds.values)
+        del a2
+    finally:
+        pm.close()
+
+
+@lktu.wantjit
+@mark.slow
+@mark.parametrize("mode", ["int8", "float16"])
+def test_quantize_recall(mode):
+    "Measure the recall@k loss from quantizing item features."
+    ratings = lktu.ml_test.ratings
+    algo = als.ImplicitMF(50, iterations=20, rng_spec=42).fit(ratings)
+    users = ratings.user.unique()
+    exact = algo.recommend_topk(users, 10, exclude=ratings)
+
+    algo.quantize_items(mode)
+    recs = algo.recommend_topk(users, 10, exclude=ratings)
+    recall = len(recs.merge(exact, on=["user", "item"])) / len(exact)
+    _log.info("%s recall@10 against full precision: %.4f", mode, recall)
+    assert recall >= 0.9
+
+
+def _user_preds(algo, pairs):
+    preds = pd.Series(np.nan, index=pairs.index)
+    for u, upairs in pairs.groupby("user"):
+        up = algo.predict_for_user(u, upairs.item.values)
+        preds[upairs.index] = up.values
+    return preds
+
+
+@mark.parametrize("quantize", [False, True])
+def test_predict_pairs(biased_mf, implicit_mf, quantize):
+    ratings = lktu.ml_test.ratings
+    pairs = ratings.sample(500, random_state=42)[["user", "item"]]
+    pairs = pd.concat(
+        [pairs, pd.DataFrame({"user": [-1, 1, -5], "item": [1, -1, -5]})], ignore_index=True
+    )
+    fsvd = funksvd.FunkSVD(10, iterations=20, method="joint", range=(0.5, 5.0), random_state=42)
+    fsvd.fit(ratings)
+
+    for algo in [biased_mf, implicit_mf, fsvd]:
+        if quantize:
+            algo = pickle.loads(pickle.dumps(algo)).quantize_items("float16")
+        expected = _user_preds(algo, pairs)
+        preds = algo.predict_pairs(pairs.user.values, pairs.item.values)
+        assert np.all(np.isnan(preds[-3:]))
+        assert preds == approx(expected.values, nan_ok=True)
+
+        series = algo.predict(pairs)
+        assert series.name == "prediction"
+        assert np.all(series.index == pairs.index)
+        assert series.values == approx(expected.values, nan_ok=True)
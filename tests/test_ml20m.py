@@ -63,3 +63,58 @@ def test_als_isolate(ml20m, rng):
         assert len(preds) == len(pairs)
     finally:
         ares.close()
+
+
+@pytest.mark.realdata
+@pytest.mark.slow
+def test_fsvd_prepare_data(ml20m, rng):
+    "Benchmark FunkSVD data preparation."
+    import tracemalloc
+    from lenskit.algorithms.bias import Bias
+    from lenskit.algorithms.funksvd import _prepare_data
+    from lenskit.util import Stopwatch
+
+    bias = Bias(damping=5).fit(ml20m)
+    tracemalloc.start()
+    try:
+        timer = Stopwatch()
+        users, items, rvals, initial, uidx, iidx = _prepare_data(ml20m, bias, rng)
+        timer.stop()
+        _cur, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    out_size = users.nbytes + items.nbytes + rvals.nbytes + initial.nbytes
+    _log.info(
+        "prepared %d ratings in %s, peak memory %.1f MiB (%.1f MiB of output)",
+        len(users),
+        timer,
+        peak / (1024 * 1024),
+        out_size / (1024 * 1024),
+    )
+    assert len(users) == len(ml20m)
+
+
+@pytest.mark.realdata
+@pytest.mark.slow
+def test_bias_fit_transform(ml20m):
+    "Benchmark bias model fitting and transformation."
+    from lenskit.algorithms.bias import Bias
+    from lenskit.util import Stopwatch
+
+    algo = Bias(damping=5)
+    timer = Stopwatch()
+    algo.fit(ml20m)
+    timer.stop()
+    _log.info("fit bias on %d ratings in %s", len(ml20m), timer)
+
+    timer = Stopwatch()
+    normed = algo.transform(ml20m)
+    timer.stop()
+    _log.info("transformed %d ratings in %s", len(ml20m), timer)
+
+    timer = Stopwatch()
+    restored = algo.inverse_transform(normed)
+    timer.stop()
+    _log.info("inverse-transformed %d ratings in %s", len(ml20m), timer)
+    assert restored.rating.values == pytest.approx(ml20m.rating.values)
@@ -137,3 +137,50 @@ def test_popscore_save_load():
     algo = pickle.loads(mod)
 
     assert all(algo.item_scores_ == original.item_scores_)
+
+
+def test_popular_ranking_matches_candidates():
+    ratings = lktu.ml_test.ratings
+    algo = basic.Popular()
+    algo.fit(ratings)
+    assert all(np.diff(algo.ranking_.values) <= 0)
+
+    for u in ratings.user.unique()[:50]:
+        fast = algo.recommend(u, 20)
+        slow = algo.recommend(u, 20, algo.selector.candidates(u))
+        assert all(fast.columns == slow.columns)
+        assert all(fast.item == slow.item)
+        assert all(fast.score == slow.score)
+
+    # unknown users, override ratings, and unlimited lists
+    assert all(algo.recommend(-1, 10).item == algo.ranking_.index[:10])
+    urates = pd.Series(1.0, index=algo.ranking_.index[[0, 2]])
+    recs = algo.recommend(-1, 3, ratings=urates)
+    assert all(recs.item == algo.ranking_.index[[1, 3, 4]])
+    recs = algo.recommend(2038, None)
+    assert len(recs) == len(algo.selector.candidates(2038))
+
+
+def test_popular_batch():
+    from lenskit import batch
+
+    ratings = lktu.ml_test.ratings
+    algo = basic.Popular()
+    algo.fit(ratings)
+    users = np.append(ratings.user.unique()[:20], -1)
+
+    recs = algo.recommend_batch(users, 10)
+    assert np.all(recs.users == users)
+    assert np.all(np.diff(recs.offsets) == 10)
+    for i, u in enumerate(users):
+        urecs = algo.recommend(u, 10)
+        assert np.all(recs.items[recs.offsets[i] : recs.offsets[i + 1]] == urecs.item.values)
+        assert np.all(recs.scores[recs.offsets[i] : recs.offsets[i + 1]] == urecs.score.values)
+
+    frame = batch.recommend(algo, users, 10)
+    assert list(frame.columns) == ["item", "score", "user", "rank"]
+    assert len(frame) == 10 * len(users)
+    assert all(frame.groupby("user")["rank"].max() == 10)
+    u1 = frame[frame.user == users[1]]
+    assert all(u1.item.values == algo.recommend(users[1], 10).item.values)
+    assert all(u1["rank"] == np.arange(1, 11))
@@ -1,7 +1,20 @@
+import logging
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sps
+from csr import CSR
+
+from pytest import approx, mark, raises
+
 import lenskit.util.test as lktu
+from lenskit.algorithms import als, basic, item_knn
 from lenskit.algorithms.basic import PopScore
 from lenskit.algorithms.bias import Bias
-from lenskit.algorithms.ranking import PlackettLuce
+from lenskit.algorithms.ranking import PlackettLuce, MMR, mmr_positions
+from lenskit.util import Stopwatch
+
+_log = logging.getLogger(__name__)
 
 
 def test_plackett_luce_rec():
@@ -44,3 +57,198 @@ def test_plackett_luce_pred():
     recs_all = algo.recommend(2038)
     assert len(recs_all) == nitems
     assert set(items) == set(recs_all["item"])
+
+
+def test_plackett_luce_batch():
+    ratings = lktu.ml_test.ratings
+    algo = PlackettLuce(Bias(), rng_spec=(42, "user"))
+    algo.fit(ratings)
+    # small blocks, to test chunking
+    algo.BLOCK_VALUES = 50000
+
+    users = ratings.user.unique()[:20]
+    recs = algo.recommend_batch(users, 10)
+    assert np.all(recs.users == users)
+    assert np.all(np.diff(recs.offsets) == 10)
+
+    # each user's ranking does not depend on the batch
+    rev = algo.recommend_batch(users[::-1], 10).to_frame()
+    df = recs.to_frame()
+    for u in users:
+        one = algo.recommend(u, 10)
+        urecs = df[df.user == u]
+        assert np.all(urecs.item.values == one.item.values)
+        assert urecs.score.values == approx(one.score.values)
+        assert np.all(rev[rev.user == u].item.values == one.item.values)
+
+
+def test_plackett_luce_samples():
+    ratings = lktu.ml_test.ratings
+    algo = PlackettLuce(Bias(), rng_spec=(42, "user"))
+    algo.fit(ratings)
+
+    users = ratings.user.unique()[:5]
+    recs = algo.recommend_batch(users, 20, samples=3)
+    assert np.all(recs.users == np.repeat(users, 3))
+    rated = ratings.set_index("user").item
+
+    for r in range(len(recs.users)):
+        items = recs.items[recs.offsets[r] : recs.offsets[r + 1]]
+        scores = recs.scores[recs.offsets[r] : recs.offsets[r + 1]]
+        assert len(items) == 20
+        assert len(np.unique(items)) == 20
+        assert np.all(np.diff(scores) <= 0)
+        assert not np.any(np.isin(items, rated.loc[recs.users[r]].values))
+
+    # samples for the same user differ
+    lists = [tuple(recs.items[recs.offsets[r] : recs.offsets[r + 1]]) for r in range(15)]
+    assert len(set(lists)) == 15
+
+
+def test_plackett_luce_rerank_dist():
+    algo = PlackettLuce(Bias(), rng_spec=42)
+    algo.fit(lktu.ml_test.ratings)
+
+    # the first item is chosen with probability proportional to its score
+    scores = np.array([[1.0, 2.0, np.nan, 3.0, 4.0]])
+    recs = algo.rerank_batch([1], np.arange(5), scores, 1, samples=20000)
+    assert np.all(np.diff(recs.offsets) == 1)
+    freqs = pd.Series(recs.items).value_counts(normalize=True)
+    assert 2 not in freqs.index
+    assert freqs.reindex([0, 1, 3, 4]).values == approx([0.1, 0.2, 0.3, 0.4], abs=0.015)
+
+
+def _naive_mmr(scores, n, sim, lam):
+    "Naive MMR, recomputing each candidate's similarity to every selected item."
+    remaining = [i for i in range(len(scores)) if not np.isnan(scores[i])]
+    selected = []
+    for k in range(min(n, len(remaining))):
+        if selected:
+            maxsim = np.maximum(np.max(sim(remaining, selected), axis=1), 0)
+        else:
+            maxsim = np.zeros(len(remaining))
+        mmr = lam * scores[remaining] - (1 - lam) * maxsim
+        selected.append(remaining.pop(np.argmax(mmr)))
+    return np.array(selected, dtype=np.int64)
+
+
+@mark.parametrize("lam", [0.0, 0.3, 0.7, 1.0])
+def test_mmr_dense(rng, lam):
+    vecs = rng.standard_normal((200, 8))
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    rows = rng.permutation(200)[:150]
+    rows[:5] = -1
+    scores = rng.standard_normal(150)
+    scores[10:20] = np.nan
+
+    def sim(cands, sel):
+        V = np.where(rows.reshape(-1, 1) >= 0, vecs[rows], 0)
+        return V[cands] @ V[sel].T
+
+    expected = _naive_mmr(scores, 25, sim, lam)
+    assert np.all(mmr_positions(scores, 25, vecs, lam, rows) == expected)
+
+    full = mmr_positions(scores, None, vecs, lam, rows)
+    assert len(full) == 140
+    assert np.all(full[:25] == expected)
+
+
+def test_mmr_sparse(rng):
+    smat = sps.random(300, 300, density=0.05, format="csr", random_state=42)
+    scores = rng.random(300) * 2
+    dense = smat.toarray()
+
+    def sim(cands, sel):
+        return dense[np.ix_(sel, cands)].T
+
+    expected = _naive_mmr(scores, 30, sim, 0.6)
+    assert np.all(mmr_positions(scores, 30, CSR.from_scipy(smat), 0.6) == expected)
+
+
+def test_mmr_recommend():
+    ratings = lktu.ml_test.ratings
+    mf = als.BiasedMF(20, iterations=5, rng_spec=42)
+    algo = MMR(mf, lambda_=0.8)
+    algo.fit(ratings)
+    assert algo.item_vectors_.shape == (len(mf.item_index_), 20)
+    assert np.linalg.norm(algo.item_vectors_, axis=1) == approx(1.0)
+
+    topn = basic.TopN(mf, algo.selector)
+    rated = ratings.set_index("user").item
+    for u in ratings.user.unique()[:5]:
+        recs = algo.recommend(u, 20)
+        assert len(recs) == 20
+        assert len(recs.item.unique()) == 20
+        assert not np.any(recs.item.isin(rated.loc[u]))
+
+        # the first pick is the most relevant, and the rest are all scored by MF
+        top = topn.recommend(u, 20)
+        assert recs.item.iloc[0] == top.item.iloc[0]
+        assert recs.score.values == approx(mf.predict_for_user(u, recs.item).values)
+
+        cands = recs.item.values[::-1]
+        assert set(algo.recommend(u, 5, candidates=cands).item) <= set(cands)
+
+    # with all weight on relevance, MMR is top-N
+    algo.lambda_ = 1.0
+    recs = algo.recommend(ratings.user.iloc[0], 20)
+    top = topn.recommend(ratings.user.iloc[0], 20)
+    assert np.all(recs.item.values == top.item.values)
+
+
+@mark.parametrize("lam", [-0.1, 1.5])
+def test_mmr_bad_lambda(lam):
+    with raises(ValueError):
+        mmr_positions(np.ones(5), 2, np.identity(5), lam)
+    with raises(ValueError):
+        MMR(Bias(), lambda_=lam)
+
+
+def test_mmr_item_item():
+    ratings = lktu.ml_test.ratings
+    ratings = ratings[ratings.user.isin(ratings.user.unique()[:100])]
+    iknn = item_knn.ItemItem(20)
+    algo = MMR(iknn, lambda_=0.5)
+    algo.fit(ratings)
+    assert algo.item_vectors_ is iknn.sim_matrix_
+
+    user = ratings.user.iloc[0]
+    recs = algo.recommend(user, 10)
+    assert len(recs) == 10
+    assert len(recs.item.unique()) == 10
+
+    cands = algo.selector.candidates(user)
+    scores = iknn.predict_for_user(user, cands)
+    rows = iknn.item_index_.get_indexer(cands)
+    sel = mmr_positions(scores.values, 10, iknn.sim_matrix_, 0.5, rows)
+    assert np.all(recs.item.values == cands[sel])
+
+
+@lktu.wantjit
+@mark.slow
+def test_mmr_benchmark(rng):
+    "Measure MMR throughput selecting 100 of 10K candidates."
+    vecs = rng.standard_normal((10000, 50))
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    scores = rng.normal(3.5, 0.5, 10000)
+
+    def sim(cands, sel):
+        return vecs[cands] @ vecs[sel].T
+
+    for lam in [0.5, 0.8]:
+        # warm up the JIT
+        mmr_positions(scores, 100, vecs, lam)
+        timer = Stopwatch()
+        for i in range(10):
+            sel = mmr_positions(scores, 100, vecs, lam)
+        timer.stop()
+        n_timer = Stopwatch()
+        expected = _naive_mmr(scores, 100, sim, lam)
+        n_timer.stop()
+        _log.info(
+            "lambda=%.1f: %.1f lists/sec (naive: %.1f lists/sec)",
+            lam,
+            10 / timer.elapsed(),
+            1 / n_timer.elapsed(),
+        )
+        assert np.all(sel == expected)
@@ -6,7 +6,7 @@ from lenskit.algorithms import svd
 import pandas as pd
 import numpy as np
 
-from pytest import approx, mark
+from pytest import approx, mark, raises
 
 import lenskit.util.test as lktu
 from lenskit.util import clone
@@ -62,6 +62,151 @@ def test_svd_predict_bad_user():
     assert np.isnan(preds.loc[3])
 
 
+@need_skl
+def test_svd_item_features():
+    ratings = lktu.ml_test.ratings
+    algo = svd.BiasedSVD(10).fit(ratings)
+    assert algo.item_features_.shape == (algo.n_items, 10)
+    assert algo.user_components_ is algo.user_features_
+
+    # predictions match the full reconstruction
+    X = algo.factorization.inverse_transform(algo.user_components_[:5, :])
+    items = algo.item_index_.values[:50]
+    for uidx in range(5):
+        user = algo.user_index_[uidx]
+        preds = algo.predict_for_user(user, items)
+        bias = algo.bias.predict_for_user(user, items)
+        assert preds.values == approx(X[uidx, :50] + bias.values)
+
+    pairs = ratings.sample(200, random_state=42)
+    preds = algo.predict(pairs)
+    for u, upairs in pairs.groupby("user"):
+        up = algo.predict_for_user(u, upairs.item.values)
+        assert preds[upairs.index].values == approx(up.values)
+
+    recs = algo.recommend_topk([algo.user_index_[0]], 5)
+    expected = algo.predict_for_user(algo.user_index_[0], algo.item_index_.values).nlargest(5)
+    assert np.all(recs.item.values == expected.index.values)
+
+
+def test_svd_brand_update_exact():
+    "Appending rows to an exact low-rank SVD stays exact."
+    rng = np.random.default_rng(42)
+    X = rng.standard_normal((30, 5)) @ rng.standard_normal((5, 20))
+    U, S, Vt = np.linalg.svd(X[:25, :], full_matrices=False)
+    Xt = U[:, :5] * S[:5]
+    Xt, S, V = svd._brand_append_rows(Xt, S[:5], Vt[:5, :].T, X[25:, :])
+
+    assert Xt.shape == (30, 5)
+    assert V.T @ V == approx(np.identity(5), abs=1.0e-8)
+    assert Xt @ V.T == approx(X, abs=1.0e-8)
+    assert S == approx(np.linalg.svd(X, compute_uv=False)[:5])
+
+
+def test_svd_brand_update_many_rows():
+    "Appending more rows than there are columns still works."
+    rng = np.random.default_rng(42)
+    X = rng.standard_normal((400, 5)) @ rng.standard_normal((5, 50))
+    U, S, Vt = np.linalg.svd(X[:100, :], full_matrices=False)
+    Xt = U[:, :5] * S[:5]
+    Xt, S, V = svd._brand_append_rows(Xt, S[:5], Vt[:5, :].T, X[100:, :])
+
+    assert Xt.shape == (400, 5)
+    assert V.shape == (50, 5)
+    assert Xt @ V.T == approx(X, abs=1.0e-8)
+    assert S == approx(np.linalg.svd(X, compute_uv=False)[:5])
+
+
+@need_skl
+def test_svd_partial_fit_small_catalog():
+    rng = np.random.default_rng(42)
+    items = np.arange(50)
+    users = np.repeat(np.arange(400), 10)
+    ratings = pd.DataFrame(
+        {
+            "user": users,
+            "item": np.concatenate([rng.choice(items, 10, replace=False) for u in range(400)]),
+            "rating": rng.integers(1, 6, len(users)).astype(np.float64),
+        }
+    )
+    initial = ratings[ratings.user < 100]
+
+    algo = svd.BiasedSVD(5, algorithm="arpack").fit(initial)
+    algo.partial_fit(ratings[ratings.user >= 100])
+
+    assert algo.n_users == 400
+    assert algo.user_features_.shape == (400, 5)
+    preds = algo.predict_for_user(300, items)
+    assert np.all(np.isfinite(preds.values))
+
+
+@need_skl
+def test_svd_partial_fit():
+    ratings = lktu.ml_test.ratings
+    users = ratings.user.unique()
+    rng = np.random.default_rng(42)
+    new_users = rng.choice(users, len(users) // 5, replace=False)
+    new = ratings.user.isin(new_users)
+    # hold out some items entirely from the initial fit
+    new_items = ratings.item.unique()[:20]
+    initial = ratings[~new & ~ratings.item.isin(new_items)]
+
+    algo = svd.BiasedSVD(10, algorithm="arpack").fit(initial)
+    n_users = algo.n_users
+    algo.partial_fit(ratings[new])
+
+    assert algo.n_users == n_users + len(new_users)
+    assert algo.user_features_.shape == (algo.n_users, 10)
+    assert algo.item_features_.shape == (algo.n_items, 10)
+    assert np.all(algo.item_index_.get_indexer(new_items) >= 0)
+    assert len(algo.bias.user_offsets_) == algo.n_users
+    assert algo.item_features_.T @ algo.item_features_ == approx(np.identity(10), abs=1.0e-6)
+
+    with raises(ValueError):
+        algo.partial_fit(ratings[new])
+
+    # the updated model fits the new users about as well as a refit
+    refit = svd.BiasedSVD(10, algorithm="arpack").fit(ratings)
+    bias_err = ratings.rating - refit.bias.predict(ratings)
+    upd_err = ratings.rating - algo.predict(ratings)
+    refit_err = ratings.rating - refit.predict(ratings)
+    brmse, urmse, rrmse = [
+        np.sqrt(np.mean(np.square(e[new]))) for e in (bias_err, upd_err, refit_err)
+    ]
+    _log.info("new user RMSE: bias %.3f, update %.3f, refit %.3f", brmse, urmse, rrmse)
+    assert urmse < brmse
+    assert urmse < rrmse * 1.1
+
+
+@need_skl
+@mark.parametrize("items,users", [(True, False), (False, True)])
+def test_svd_partial_fit_partial_bias(items, users):
+    ratings = lktu.ml_test.ratings
+    new = ratings.user.isin(ratings.user.unique()[:50])
+    bias = svd.Bias(items=items, users=users)
+    algo = svd.BiasedSVD(10, bias=bias, algorithm="arpack").fit(ratings[~new])
+    algo.build_topk_index(rng_spec=42)
+    n_users = algo.n_users
+    algo.partial_fit(ratings[new])
+
+    assert algo.n_users == n_users + 50
+    assert algo.user_features_.shape == (algo.n_users, 10)
+    assert algo.item_features_.shape == (algo.n_items, 10)
+    assert np.all(algo.item_index_.get_indexer(ratings.item.unique()) >= 0)
+    assert algo.topk_index_ is None
+    if items:
+        assert len(algo.bias.item_offsets_) == algo.n_items
+    else:
+        assert algo.bias.item_offsets_ is None
+    if users:
+        assert len(algo.bias.user_offsets_) == algo.n_users
+    else:
+        assert algo.bias.user_offsets_ is None
+
+    preds = algo.predict(ratings[new])
+    assert np.all(np.isfinite(preds))
+
+
 @need_skl
 def test_svd_clone():
     algo = svd.BiasedSVD(5, damping=10)
@@ -90,6 +235,30 @@ def test_svd_save_load():
     assert np.all(algo.user_components_ == original.user_components_)
 
 
+@need_skl
+def test_svd_load_old_pickle():
+    ratings = lktu.ml_test.ratings
+    items = ratings.item.unique()[:50]
+    current = svd.BiasedSVD(10, algorithm="arpack").fit(ratings)
+
+    # the pre-MFPredictor layout only stored the transformed user rows
+    old = svd.BiasedSVD.__new__(svd.BiasedSVD)
+    old.__dict__.update(
+        bias=current.bias,
+        factorization=current.factorization,
+        user_components_=current.user_features_,
+    )
+    algo = pickle.loads(pickle.dumps(old))
+
+    assert "user_components_" not in algo.__dict__
+    assert np.all(algo.user_components_ == current.user_features_)
+    assert np.all(algo.user_index_ == current.user_index_)
+    assert np.all(algo.item_index_ == current.item_index_)
+    assert algo.item_features_ == approx(current.item_features_)
+    preds = algo.predict_for_user(ratings.user.iloc[0], items)
+    assert preds.values == approx(current.predict_for_user(ratings.user.iloc[0], items).values)
+
+
 @need_skl
 @mark.slow
 @mark.eval
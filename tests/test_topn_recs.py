@@ -1,11 +1,15 @@
 from lenskit.algorithms import basic
 from lenskit.algorithms import bias
+from lenskit.algorithms import als, funksvd, svd, item_knn, user_knn
+from lenskit.algorithms import map_positions
 
 import pandas as pd
 import numpy as np
 
 import lenskit.util.test as lktu
-from pytest import approx
+from pytest import approx, mark
+
+from lenskit.algorithms.ranking import top_n_positions
 
 simple_df = pd.DataFrame(
     {"item": [1, 1, 2, 3], "user": [10, 12, 10, 13], "rating": [4.0, 3.0, 5.0, 2.0]}
@@ -60,3 +64,102 @@ def test_topn_big():
         scores = algo.predictor.predict_for_user(u, unrated)
         top = scores.nlargest(100)
         assert top.values == approx(recs.score.values)
+
+
+@mark.parametrize("n", [None, 0, 1, 10, 100, 1000])
+def test_top_n_positions(rng, n):
+    # rounded scores give many ties
+    scores = np.round(rng.standard_normal(500), 1)
+    scores[rng.choice(500, 50, replace=False)] = np.nan
+    series = pd.Series(scores)
+
+    pos = top_n_positions(scores, n)
+    if n is None or n >= len(series):
+        # nlargest does not order ties stably when selecting everything
+        expected = series.dropna().sort_values(ascending=False, kind="stable")
+    else:
+        expected = series.dropna().nlargest(n)
+    assert np.all(pos == expected.index.values)
+
+
+def test_topn_arrays():
+    ratings = lktu.ml_test.ratings
+    algo = basic.TopN(bias.Bias())
+    algo.fit(ratings)
+
+    items, scores = algo.recommend_arrays(2038, 10)
+    recs = algo.recommend(2038, 10)
+    assert np.all(items == recs.item.values)
+    assert np.all(scores == recs.score.values)
+    assert list(recs.columns) == ["item", "score"]
+
+
+def _small_ratings():
+    ratings = lktu.ml_test.ratings
+    return ratings[ratings.user.isin(ratings.user.unique()[:200])]
+
+
+_position_algos = {
+    "bias": lambda: bias.Bias(damping=5),
+    "biased-mf": lambda: als.BiasedMF(10, iterations=5, rng_spec=42),
+    "implicit-mf": lambda: als.ImplicitMF(10, iterations=5, rng_spec=42),
+    "funksvd": lambda: funksvd.FunkSVD(10, iterations=10, range=(0.5, 5.0), random_state=42),
+    "biased-svd": lambda: svd.BiasedSVD(10),
+    "item-item": lambda: item_knn.ItemItem(20),
+    "user-user": lambda: user_knn.UserUser(20),
+    "fallback": lambda: basic.Fallback(item_knn.ItemItem(20), bias.Bias()),
+}
+
+
+@mark.parametrize("name", list(_position_algos.keys()))
+def test_predict_positions(rng, name):
+    ratings = _small_ratings()
+    algo = _position_algos[name]().fit(ratings)
+
+    # a shuffled vocabulary with some unknown items, so positions need mapping
+    items = ratings.item.unique()
+    vocab = pd.Index(np.concatenate([rng.permutation(items)[:500], [-1, -2]]), name="item")
+    positions = rng.choice(len(vocab), 200, replace=False)
+    positions[:3] = [len(vocab) - 1, -1, len(vocab) - 2]
+    known = positions >= 0
+
+    for user in [ratings.user.iloc[0], ratings.user.iloc[-1], -42]:
+        expected = algo.predict_for_user(user, vocab[positions[known]])
+        scores = algo.predict_positions(user, vocab, positions)
+        assert isinstance(scores, np.ndarray)
+        assert len(scores) == len(positions)
+        assert scores[known] == approx(expected.values, nan_ok=True)
+
+
+def test_map_positions():
+    index = pd.Index([10, 20, 30, 40])
+    vocab = pd.Index([40, 50, 10])
+
+    assert np.all(map_positions(index, vocab, [0, 1, 2, -1]) == [3, -1, 0, -1])
+    assert np.all(map_positions(index, vocab, [2, 2]) == [0, 0])
+    pos = np.array([3, 1])
+    assert map_positions(index, index, pos) is pos
+
+    # unknown positions do not index into an empty vocabulary
+    empty = pd.Index([], dtype=np.int64)
+    assert np.all(map_positions(index, empty, [-1, -1]) == [-1, -1])
+    assert len(map_positions(index, vocab, [])) == 0
+
+
+def test_topn_positions_match():
+    ratings = _small_ratings()
+    algo = basic.TopN(item_knn.ItemItem(20))
+    algo.fit(ratings)
+
+    for user in ratings.user.unique()[:10]:
+        items, scores = algo.recommend_arrays(user, 10)
+        cands = algo.selector.candidates(user)
+        expected = algo.predictor.predict_for_user(user, cands).dropna()
+        expected = expected.sort_values(ascending=False, kind="stable").iloc[:10]
+        assert np.all(items == expected.index.values)
+        assert scores == approx(expected.values)
+
+        urates = ratings[ratings.user == user].set_index("item").rating
+        r_items, r_scores = algo.recommend_arrays(-1, 10, ratings=urates)
+        assert np.all(r_items == items)
+        assert r_scores == approx(scores)
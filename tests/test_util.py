@@ -7,6 +7,8 @@ import pandas as pd
 
 from lenskit import util as lku
 
+from pytest import approx
+
 
 def test_stopwatch_instant():
     w = lku.Stopwatch()
@@ -74,3 +76,22 @@ def test_last_memo():
     assert len(history) == 1
     cache("bar")
     assert len(history) == 2
+
+
+def test_splitmix64():
+    from lenskit.util.random import splitmix64, splitmix64_uniform
+
+    # reference output of SplitMix64 seeded with 0
+    state, r = splitmix64(np.uint64(0))
+    assert state == np.uint64(0x9E3779B97F4A7C15)
+    assert r == 0xE220A8397B1DCDAF >> 1
+
+    state = np.uint64(42)
+    vals = []
+    for i in range(1000):
+        # Numba returns the state as a Python int
+        state, v = splitmix64_uniform(np.uint64(state))
+        vals.append(v)
+    assert min(vals) >= 0
+    assert max(vals) < 1
+    assert np.mean(vals) == approx(0.5, abs=0.05)
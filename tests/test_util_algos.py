@@ -4,6 +4,7 @@ import pandas as pd
 import numpy as np
 
 import lenskit.util.test as lktu
+from pytest import approx
 
 simple_df = pd.DataFrame(
     {"item": [1, 1, 2, 3], "user": [10, 12, 10, 13], "rating": [4.0, 3.0, 5.0, 2.0]}
@@ -139,3 +140,95 @@ def test_knownrating_batch_missing():
     assert set(preds.index) == set([0, 1, 2])
     assert all(preds.iloc[:2] == [4.0, 3.0])
     assert np.isnan(preds.iloc[2])
+
+
+def test_knownrating_pairs():
+    from lenskit import batch
+
+    ratings = lktu.ml_test.ratings
+    algo = basic.KnownRating()
+    algo.fit(ratings)
+
+    pairs = ratings.sample(500, random_state=42)[["user", "item"]]
+    # add some unrated and unknown pairs
+    unrated = pd.DataFrame({"user": pairs.user.values[:50], "item": pairs.item.values[50:100]})
+    unrated = unrated.merge(ratings, how="left", on=["user", "item"])
+    extra = pd.DataFrame({"user": [-1, pairs.user.iloc[0]], "item": [pairs.item.iloc[0], -1]})
+    pairs = pd.concat([pairs, unrated[["user", "item"]], extra], ignore_index=True)
+    expected = pairs.merge(ratings, how="left", on=["user", "item"]).rating.values
+
+    preds = algo.predict_pairs(pairs.user, pairs.item)
+    assert np.all(np.isnan(preds) == np.isnan(expected))
+    assert np.all(preds[~np.isnan(preds)] == expected[~np.isnan(expected)])
+
+    for u in pairs.user.unique()[:20]:
+        upairs = pairs[pairs.user == u]
+        up = algo.predict_for_user(u, upairs.item)
+        assert np.all(up.index == upairs.item.values)
+        assert up.values == approx(preds[upairs.index], nan_ok=True)
+
+    assert np.isnan(algo.predict_for_user(-1, [1, 2])).all()
+
+    res = batch.predict(algo, pairs)
+    assert list(res.columns) == ["user", "item", "prediction"]
+    assert res.prediction.values == approx(expected, nan_ok=True)
+
+    mem = basic.Memorized(ratings)
+    assert mem.predict_pairs(pairs.user, pairs.item) == approx(expected, nan_ok=True)
+
+
+def test_known_empty():
+    empty = pd.DataFrame({"user": [], "item": [], "rating": []})
+    users = np.array([1, 2])
+    items = np.array([10, 20])
+
+    for algo in [basic.Memorized(empty), basic.KnownRating().fit(empty)]:
+        assert np.all(np.isnan(algo.predict_pairs(users, items)))
+        assert np.all(algo.predict_for_user(1, items).isna())
+
+
+def test_random_batch():
+    ratings = lktu.ml_test.ratings
+    algo = basic.Random(rng_spec=(42, "user"))
+    algo.fit(ratings)
+    users = np.append(ratings.user.unique()[:50], -1)
+    user_items = ratings.groupby("user").item.apply(set)
+    nitems = ratings.item.nunique()
+
+    recs = algo.recommend_batch(users, 100)
+    assert recs.scores is None
+    assert np.all(np.diff(recs.offsets) == 100)
+    for i, u in enumerate(users):
+        items = recs.items[recs.offsets[i] : recs.offsets[i + 1]]
+        assert len(set(items)) == 100
+        if u in user_items.index:
+            assert user_items[u].isdisjoint(items)
+        # per-user streams are reproducible regardless of batch composition
+        assert np.all(algo.recommend(u, 100).item.values == items)
+
+    # sampling everything returns every candidate
+    recs = algo.recommend_batch(users[:3], None)
+    for i, u in enumerate(users[:3]):
+        items = recs.items[recs.offsets[i] : recs.offsets[i + 1]]
+        assert len(items) == nitems - len(user_items[u])
+        assert set(items) == set(algo.selector.candidates(u))
+
+    # override ratings
+    urates = pd.Series(1.0, index=algo.selector.items_[:1000])
+    recs = algo.recommend(-1, 500, ratings=urates)
+    assert len(recs) == 500
+    assert set(recs.item).isdisjoint(urates.index)
+
+
+def test_random_batch_uniform():
+    ratings = lktu.ml_test.ratings
+    algo = basic.Random(rng_spec=42)
+    algo.fit(ratings)
+    nitems = len(algo.selector.items_)
+
+    # sample from one unknown user many times
+    recs = algo.recommend_batch(np.arange(-2000, 0), 10)
+    counts = pd.Series(recs.items).value_counts().reindex(algo.selector.items_, fill_value=0)
+    expected = 2000 * 10 / nitems
+    assert counts.mean() == approx(expected)
+    assert counts.std() == approx(np.sqrt(expected), rel=0.2)